@@ -0,0 +1,540 @@
+# batch_eval.py – viele Parametersätze der Entry-Logik in EINEM Durchlauf über die Candles auswerten
+#
+# Statt pro Parametersatz einen eigenen Backtest zu fahren (Daten lesen, EMA/HMA neu rechnen,
+# evaluate_trend_signal Candle für Candle), läuft hier ein einziger Durchlauf:
+#   1) 1m-Candles einmal aus dem Tick-Archiv bauen (wie der Aggregator: Close = letzter Tick der Minute)
+#   2) EMA/HMA nur pro *verschiedener* Periode rechnen (EMA_FAST=5 teilen sich alle Sätze mit 5),
+#      Directionality pro verschiedenem EMA_SLOW
+#   3) die Zustandsmaschine WAIT_TREND → WAIT_PULLBACK → WAIT_CONFIRM für alle Sätze im Gleichschritt:
+#      Zustand/Richtung/armed sind Arrays über die Sätze, pro Candle ein paar Vektor-Operationen
+#   4) Entries → Exits über exit_resim (Lanes pro (Entry, Exit-Parametersatz)), danach pro Satz die
+#      Trades in Zeitreihenfolge ohne Überlappung (max. 1 Position pro Epic, wie live)
+#   5) Kennzahlen pro (Tick-Fenster, Satz) und die Indikator-Reihen landen in result_cache → ein
+#      wiederholter/erweiterter Sweep rechnet nur die neuen Sätze
+#
+# Abweichungen zum Live-Bot – Ergebnisse sind NICHT live-äquivalent, sondern "Zustandsmaschine nur am Close":
+#   - Größte Abweichung: live schreibt auch on_candle_forming die Zustandsmaschine fort (forming_trend,
+#     Pipeline-Stufe 2b: pro Zyklus auf der frischesten Quote, closes + laufender Mid). Zwischen zwei Closes
+#     kann sie dort schon WAIT_TREND → WAIT_PULLBACK → WAIT_CONFIRM wandern oder zurückgesetzt werden;
+#     wie oft, hängt an Tickrate und Konflation (siehe user-029). Hier läuft sie nur einmal pro Close.
+#     verify() vergleicht deshalb auch nur gegen einen Close-only-Replay von evaluate_trend_signal.
+#   - candle_history ist live auf 200 Werte begrenzt – die EMA startet dort am ältesten Wert im Fenster.
+#     Nach 200 Candles ist der Unterschied < 1e-8 relativ (Gewicht (1-k)^200).
+#   - INTRABAR_ENTRY wird nicht nachgebildet (Entry zum Candle-Close, Ask bei BUY / Bid bei SELL).
+#
+# Aufruf:
+#   python batch_eval.py --epic GOLD --axis EMA_FAST=3,4,5 --axis EMA_SLOW=7,9,11 --axis CONFIRM_MIN_CLOSE_DELTA_SPREADS=0.2:0.6:5
+#   python batch_eval.py --epic GOLD --axis EMA_FAST=3,5 --verify 4     → gegen evaluate_trend_signal prüfen + Zeitvergleich
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import result_cache
+import tradingbot_2 as bot
+from exit_resim import EXIT_KEYS, build_paths, simulate_pairs
+from tick_archive import load_ticks, tick_slice
+
+ENTRY_KEYS = [
+    "USE_HMA",
+    "EMA_FAST",
+    "EMA_SLOW",
+    "PULLBACK_NEAR_MA_MAX_DISTANCE_SPREADS",
+    "PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS",
+    "CONFIRM_MIN_CLOSE_DELTA_SPREADS",
+    "REGIME_MIN_DIRECTIONALITY",
+]
+PARAM_KEYS = ENTRY_KEYS + EXIT_KEYS
+
+BATCH_EVAL_MAX_HOLD_SEC = 6 * 3600   # Exit-Pfad max. so lang (offene Trades → "END" zum letzten Tick)
+BATCH_EVAL_CACHE = True              # Indikator-Reihen + Satz-Ergebnisse über result_cache wiederverwenden
+
+_WAIT_TREND, _WAIT_PULLBACK, _WAIT_CONFIRM = 0, 1, 2
+
+
+# ==============================
+# Parametersätze
+# ==============================
+def parse_axis(spec: str):
+    # "KEY=a:b:n" (linspace) oder "KEY=v1,v2,..." → (KEY, np.array)
+    key, _, vals = spec.partition("=")
+    key = key.strip()
+    if key not in PARAM_KEYS:
+        raise ValueError(f"{key} ist kein Strategie-Parameter ({', '.join(PARAM_KEYS)})")
+    if ":" in vals:
+        a, b, n = vals.split(":")
+        return key, np.linspace(float(a), float(b), int(n))
+    return key, np.array([float(v) for v in vals.split(",")])
+
+
+def make_sets(axes: dict = None, fixed: dict = None) -> dict:
+    # Kartesisches Produkt der Achsen → {KEY: np.array(P)}; nicht variierte Keys = aktuelle Bot-Werte
+    axes, fixed = axes or {}, fixed or {}
+    keys = list(axes)
+    combos = list(itertools.product(*(axes[k] for k in keys))) or [()]
+    sets = {}
+    for k in PARAM_KEYS:
+        if k in axes:
+            sets[k] = np.array([c[keys.index(k)] for c in combos], dtype=np.float64)
+        else:
+            sets[k] = np.full(len(combos), float(fixed.get(k, getattr(bot, k))))
+    return sets
+
+
+def sets_from_rows(rows: list) -> dict:
+    # Liste von Parameter-Dicts (z.B. aus dem Optimierer) → Array-Form
+    return {k: np.array([float(r.get(k, getattr(bot, k))) for r in rows]) for k in PARAM_KEYS}
+
+
+def set_row(sets: dict, i: int) -> dict:
+    # Satz i als Dict mit den Typen des Bots (int/bool/float)
+    out = {}
+    for k in PARAM_KEYS:
+        base = getattr(bot, k)
+        v = sets[k][i]
+        out[k] = bool(v) if isinstance(base, bool) else int(round(v)) if isinstance(base, int) else float(v)
+    return out
+
+
+# ==============================
+# Candles + Indikatoren
+# ==============================
+def build_candles(ticks: dict, t0_ms: int = None, t1_ms: int = None) -> dict:
+    # 1m-Candles wie der Aggregator (Minutengrenzen in UTC = Lokalzeit, Berlin hat nur volle Stunden Versatz)
+    sl = tick_slice(ticks, t0_ms if t0_ms is not None else -2**62, t1_ms if t1_ms is not None else 2**62)
+    ts = np.asarray(ticks["ts"][sl])
+    bid = np.asarray(ticks["bid"][sl])
+    ask = np.asarray(ticks["ask"][sl])
+    if not len(ts):
+        return {"epic": ticks.get("epic"), "minute": np.empty(0, dtype=np.int64), "close_bid": np.empty(0),
+                "close_ask": np.empty(0), "mid": np.empty(0), "spread": np.empty(0), "n": 0}
+    minute = ts // 60000
+    last = np.flatnonzero(np.diff(minute)).tolist() + [len(ts) - 1]
+    last = np.array(last)
+    close_bid, close_ask = bid[last], ask[last]
+    return {
+        "epic": ticks.get("epic"),
+        "minute": minute[last],
+        "close_ms": (minute[last] + 1) * 60000,    # Close zur Minutengrenze (CANDLE_CLOSE_MODE="TIMER")
+        "close_bid": close_bid,
+        "close_ask": close_ask,
+        "mid": (close_bid + close_ask) / 2.0,
+        "spread": close_ask - close_bid,
+        "n": len(last),
+    }
+
+
+def ema_series(values: np.ndarray, periods) -> dict:
+    # Alle EMA-Perioden gleichzeitig in einer Schleife (Rekursion, Start am ersten Wert wie ema())
+    periods = sorted({int(p) for p in periods})
+    if not periods:
+        return {}
+    n = len(values)
+    k = np.array([2.0 / (p + 1) for p in periods])
+    out = np.empty((len(periods), n))
+    cur = np.full(len(periods), values[0] if n else 0.0)
+    for t in range(n):
+        if t:
+            cur = values[t] * k + cur * (1 - k)
+        out[:, t] = cur
+    res = {}
+    for i, p in enumerate(periods):
+        out[i, :p - 1] = np.nan                     # ema() → None bei weniger als period Werten
+        res[p] = out[i]
+    return res
+
+
+def _wma_end(values: np.ndarray, period: int) -> np.ndarray:
+    # WMA mit Gewichten 1..period, Ergebnis am Fensterende (Index i = Fenster values[i-period+1..i])
+    out = np.full(len(values), np.nan)
+    if period < 1 or len(values) < period:
+        return out
+    w = np.arange(1, period + 1, dtype=np.float64)
+    out[period - 1:] = sliding_window_view(values, period) @ w / w.sum()
+    return out
+
+
+def hma_series(values: np.ndarray, period: int) -> np.ndarray:
+    # Wie hma(): raw = 2·WMA(half) − WMA(period) am Fensterende, dann WMA(sqrt) über raw
+    half, sq = period // 2, int(period ** 0.5)
+    raw = 2 * _wma_end(values, half) - _wma_end(values, period)
+    out = np.full(len(values), np.nan)
+    start = period - 1
+    if len(values) - start >= sq >= 1:
+        out[start:] = _wma_end(raw[start:], sq)
+    return out
+
+
+def directionality_series(values: np.ndarray, n: int) -> np.ndarray:
+    # |c[t] − c[t−N]| / Σ|Δc| über die letzten N Schritte (RegimeGate in evaluate_trend_signal)
+    out = np.full(len(values), np.nan)
+    if len(values) < n + 1:
+        return out
+    steps = np.abs(np.diff(values))
+    # Fenstersumme direkt (kein cumsum-Differenz → keine Rundungsdrift über lange Reihen)
+    total = np.lib.stride_tricks.sliding_window_view(steps, n).sum(axis=1)
+    net = np.abs(values[n:] - values[:-n])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[n:] = np.where(total > 0, net / total, 0.0)
+    return out
+
+
+def indicator_series(closes: np.ndarray, keys: list, use_cache: bool = None) -> dict:
+    # {(Typ, Periode): Reihe} mit E=EMA, H=HMA, D=Directionality – pro (Closes, Typ, Periode) im Disk-Cache
+    use_cache = BATCH_EVAL_CACHE if use_cache is None else use_cache
+    data_key = result_cache.digest(closes) if use_cache else None
+    out, todo = {}, []
+    for key in dict.fromkeys(keys):
+        v = result_cache.get(result_cache.make_key("series", data_key, *key)) if use_cache else None
+        if v is None:
+            todo.append(key)
+        else:
+            out[key] = v
+    emas = ema_series(closes, [p for kind, p in todo if kind == "E"])
+    for kind, p in todo:
+        if kind == "E":
+            v = emas[p]
+        elif kind == "H":
+            v = hma_series(closes, p)
+        else:
+            v = directionality_series(closes, p)
+        out[(kind, p)] = v
+        if use_cache:
+            result_cache.put(result_cache.make_key("series", data_key, kind, p), v)
+    return out
+
+
+# ==============================
+# Zustandsmaschine im Gleichschritt
+# ==============================
+def evaluate_signals(candles: dict, sets: dict, use_cache: bool = None) -> dict:
+    # Entries aller Sätze: {"t": Candle-Index, "set": Satz-Index, "dir": +1 BUY / −1 SELL}
+    closes = candles["mid"]
+    spread = candles["spread"]
+    n, P = candles["n"], len(sets["EMA_FAST"])
+    fast = sets["EMA_FAST"].astype(int)
+    slow = sets["EMA_SLOW"].astype(int)
+    use_hma = sets["USE_HMA"] != 0
+
+    # Indikator-Tabelle: eine Zeile pro verschiedener (Typ, Periode) – geteilt über alle Sätze
+    rows, index = [], {}
+
+    def _row(kind, period):
+        key = (kind, period)
+        if key not in index:
+            index[key] = len(rows)
+            rows.append(None)
+        return index[key]
+
+    fast_row = np.array([_row("H" if h else "E", f) for h, f in zip(use_hma, fast)])
+    slow_row = np.array([_row("H" if h else "E", s) for h, s in zip(use_hma, slow)])
+    slow_vals = sorted(set(slow.tolist()))
+    series = indicator_series(closes, list(index) + [("D", N) for N in slow_vals], use_cache)
+    for key, i in index.items():
+        rows[i] = series[key]
+    MA = np.vstack(rows) if rows else np.empty((0, n))
+
+    DIR = np.vstack([series[("D", N)] for N in slow_vals])
+    dir_row = np.searchsorted(slow_vals, slow)
+
+    near_m = sets["PULLBACK_NEAR_MA_MAX_DISTANCE_SPREADS"]
+    far_m = sets["PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS"]
+    conf_m = sets["CONFIRM_MIN_CLOSE_DELTA_SPREADS"]
+    min_dir = sets["REGIME_MIN_DIRECTIONALITY"]
+
+    state = np.zeros(P, dtype=np.int8)
+    sdir = np.zeros(P, dtype=np.int8)
+    armed = np.zeros(P, dtype=bool)
+    out_t, out_set, out_dir = [], [], []
+
+    for t in range(1, n):
+        sp = spread[t]
+        if not (sp > 0):
+            continue  # HOLD (Spread ungültig) für alle Sätze
+        ma_f = MA[fast_row, t]
+        ma_s = MA[slow_row, t]
+        ok = ~(np.isnan(ma_f) | np.isnan(ma_s))
+        d = DIR[dir_row, t]
+        ok &= ~np.isnan(d)                          # zu wenig Daten für das RegimeGate → HOLD
+        if not ok.any():
+            continue
+
+        chop = ok & (d < min_dir)
+        trend = np.where(ma_f > ma_s, 1, np.where(ma_f < ma_s, -1, 0)).astype(np.int8)
+        reset = chop | (ok & (trend == 0))
+        act = ok & ~reset
+
+        # Richtungswechsel → Reset
+        flip = act & (sdir != 0) & (sdir != trend)
+        reset |= flip
+        state[reset] = _WAIT_TREND
+        sdir[reset] = 0
+        armed[reset] = False
+        act_state = state.copy()
+
+        last_close, prev_close = closes[t], closes[t - 1]
+        distance = np.abs(last_close - ma_f)
+        near, far = sp * near_m, sp * far_m
+
+        m0 = act & (act_state == _WAIT_TREND)
+        m1 = act & (act_state == _WAIT_PULLBACK)
+        m2 = act & (act_state == _WAIT_CONFIRM)
+
+        # WAIT_TREND → WAIT_PULLBACK
+        state[m0] = _WAIT_PULLBACK
+        sdir[m0] = trend[m0]
+        armed[m0] = False
+
+        # WAIT_PULLBACK: armed bei Impuls, Pullback nahe MA → WAIT_CONFIRM
+        armed |= m1 & (distance >= far)
+        state[m1 & armed & (distance <= near)] = _WAIT_CONFIRM
+
+        # WAIT_CONFIRM: Bewegung in Trendrichtung ≥ Δ·Spread → Entry
+        delta = (last_close - prev_close) * trend
+        confirm = m2 & (delta >= conf_m * sp)
+        if confirm.any():
+            hit = np.flatnonzero(confirm)
+            out_t.append(np.full(len(hit), t))
+            out_set.append(hit)
+            out_dir.append(trend[hit])
+        state[confirm] = _WAIT_TREND
+        sdir[confirm] = 0
+        armed[confirm] = False
+        away = m2 & ~confirm & (distance > far)
+        state[away] = _WAIT_PULLBACK
+        armed[away] = True
+
+    cat = (lambda xs, dt: np.concatenate(xs).astype(dt) if xs else np.empty(0, dtype=dt))
+    return {"t": cat(out_t, np.int64), "set": cat(out_set, np.int64), "dir": cat(out_dir, np.int8)}
+
+
+# ==============================
+# Trades + Kennzahlen
+# ==============================
+def evaluate(ticks: dict, sets: dict, t0_ms: int = None, t1_ms: int = None,
+             max_hold_sec: float = BATCH_EVAL_MAX_HOLD_SEC, candles: dict = None, use_cache: bool = None,
+             exit_cap_ms: int = None, entry_min_ms: int = None) -> dict:
+    # Kompletter Backtest aller Sätze: Entries (Gleichschritt) → Exits (Lanes) → Trades ohne Überlappung.
+    # exit_cap_ms → Exit-Pfade enden davor (offen → "END" am letzten Tick); ohne Cap laufen sie bis
+    # max_hold_sec über t1_ms hinaus (Test-Fenster: Trades dürfen ausklingen)
+    # entry_min_ms → Signale davor sind reiner Indikator-Vorlauf: kein Pfad, kein Trade, keine belegte Position
+    if candles is None:
+        candles = build_candles(ticks, t0_ms, t1_ms)
+    P = len(sets["EMA_FAST"])
+    sig = evaluate_signals(candles, sets, use_cache)
+
+    # Exit-Parameter-Kombinationen deduplizieren (viele Sätze unterscheiden sich nur im Entry)
+    exit_mat = np.column_stack([sets[k] for k in EXIT_KEYS])
+    exit_u, exit_of_set = np.unique(exit_mat, axis=0, return_inverse=True)
+    exit_of_set = exit_of_set.ravel()
+    exit_grid = {k: exit_u[:, i] for i, k in enumerate(EXIT_KEYS)}
+
+    # Entry-Pfade deduplizieren: (Candle, Richtung)
+    ekey = sig["t"] * 2 + (sig["dir"] > 0)
+    ent_u, ent_of_sig = np.unique(ekey, return_inverse=True)
+    ent_t, ent_buy = ent_u // 2, (ent_u % 2) == 1
+    epic = candles["epic"]
+    trades = [{
+        "epic": epic,
+        "direction": "BUY" if b else "SELL",
+        "open_ms": int(candles["close_ms"][t]),
+        "entry": float(candles["close_ask"][t] if b else candles["close_bid"][t]),
+        "size": float(bot.MANUAL_TRADE_SIZE),
+    } for t, b in zip(ent_t.tolist(), ent_buy.tolist())]
+    live = trades if entry_min_ms is None else [t for t in trades if t["open_ms"] >= entry_min_ms]
+    paths = build_paths(live, max_hold_sec, tick_cache={epic: ticks}, end_ms=exit_cap_ms)
+    path_of_ent = np.full(len(trades), -1)
+    pi = 0
+    for k, t in enumerate(trades):
+        if pi < len(paths) and paths[pi]["trade"] is t:
+            path_of_ent[k] = pi
+            pi += 1
+
+    # benötigte Paare (Entry-Pfad, Exit-Kombi)
+    sig_path = path_of_ent[ent_of_sig.ravel()] if len(sig["t"]) else np.empty(0, dtype=np.int64)
+    sig_exit = exit_of_set[sig["set"]]
+    have = sig_path >= 0
+    pair_key = sig_path[have] * len(exit_u) + sig_exit[have]
+    pair_u, pair_of_sig = np.unique(pair_key, return_inverse=True)
+    res = simulate_pairs(paths, exit_grid, pair_u // len(exit_u), pair_u % len(exit_u)) if len(pair_u) else None
+
+    sig_exit_ms = np.full(len(sig["t"]), np.nan)
+    sig_pnl = np.full(len(sig["t"]), np.nan)
+    if res is not None:
+        sig_exit_ms[have] = res["exit_ms"][pair_of_sig.ravel()]
+        sig_pnl[have] = res["pnl"][pair_of_sig.ravel()]
+    sig_open_ms = candles["close_ms"][sig["t"]] if len(sig["t"]) else np.empty(0)
+
+    # pro Satz: Trades in Zeitreihenfolge, neuer Entry erst nach dem Exit des vorherigen
+    order = np.lexsort((sig["t"], sig["set"]))
+    trades_of = [[] for _ in range(P)]
+    busy_until = np.full(P, -np.inf)
+    for i in order.tolist():
+        if not have[i]:
+            continue
+        p = sig["set"][i]
+        if sig_open_ms[i] < busy_until[p]:
+            continue  # Position offen → Signal ignoriert (decide_and_trade)
+        busy_until[p] = sig_exit_ms[i]
+        trades_of[p].append(i)
+
+    n_trades = np.zeros(P, dtype=np.int64)
+    pnl = np.zeros(P)
+    wins = np.zeros(P)
+    max_dd = np.zeros(P)
+    for p in range(P):
+        idx = trades_of[p]
+        if not idx:
+            continue
+        x = sig_pnl[idx]
+        eq = np.cumsum(x)
+        n_trades[p] = len(x)
+        pnl[p] = eq[-1]
+        wins[p] = (x > 0).sum()
+        max_dd[p] = np.max(np.maximum.accumulate(np.concatenate(([0.0], eq))) - np.concatenate(([0.0], eq)))
+
+    return {
+        "n_trades": n_trades,
+        "pnl": pnl,
+        "win_rate": np.divide(wins, n_trades, out=np.zeros(P), where=n_trades > 0),
+        "max_dd": max_dd,
+        "signals": len(sig["t"]),
+        "trades": {
+            "set": sig["set"], "open_ms": sig_open_ms, "exit_ms": sig_exit_ms, "pnl": sig_pnl,
+            "dir": sig["dir"], "taken": [np.array(t, dtype=np.int64) for t in trades_of],
+        },
+    }
+
+
+_SUMMARY_KEYS = ("n_trades", "pnl", "win_rate", "max_dd")
+
+
+def evaluate_summary(ticks: dict, sets: dict, t0_ms: int = None, t1_ms: int = None,
+                     max_hold_sec: float = BATCH_EVAL_MAX_HOLD_SEC, candles: dict = None,
+                     use_cache: bool = None, exit_cap_ms: int = None) -> dict:
+    # Nur Kennzahlen pro Satz – bereits gerechnete (Tick-Fenster, Satz) kommen aus dem Disk-Cache,
+    # evaluate() läuft nur noch für die fehlenden Sätze
+    use_cache = BATCH_EVAL_CACHE if use_cache is None else use_cache
+    P = len(sets["EMA_FAST"])
+    out = {k: np.zeros(P, dtype=np.int64 if k == "n_trades" else np.float64) for k in _SUMMARY_KEYS}
+    todo = list(range(P))
+    keys = []
+    if use_cache:
+        # Schlüssel = alle Ticks, die das Ergebnis tatsächlich lesen kann: Regime-Range vor dem ersten Entry
+        # bis zum Ende der Exit-Pfade (Cap bzw. t1 + max_hold) – wächst das Archiv über t1 hinaus, ändern
+        # sich "END"-Trades und damit der Schlüssel. Dazu die Candle-Grenze (Ticks in [t0, t1)).
+        lo = t0_ms if t0_ms is not None else -2**62
+        hi = t1_ms if t1_ms is not None else 2**62
+        end = exit_cap_ms if exit_cap_ms is not None else min(hi + int(max_hold_sec * 1000), 2**62)
+        candle_sl = tick_slice(ticks, lo, hi)
+        sl = tick_slice(ticks, lo - bot.REGIME_RANGE_WINDOW_MS, end)
+        data_key = result_cache.digest(ticks["ts"][sl], ticks["bid"][sl], ticks["ask"][sl])
+        mat = np.column_stack([sets[k] for k in PARAM_KEYS])
+        keys = [result_cache.make_key("summary", data_key, candle_sl.start - sl.start, candle_sl.stop - sl.start,
+                                      float(max_hold_sec), float(bot.MANUAL_TRADE_SIZE),
+                                      int(bot.REGIME_RANGE_WINDOW_MS), mat[i]) for i in range(P)]
+        todo = []
+        for i, key in enumerate(keys):
+            hit = result_cache.get(key)
+            if hit is None:
+                todo.append(i)
+                continue
+            for k in _SUMMARY_KEYS:
+                out[k][i] = hit[k]
+    if todo:
+        sub = {k: sets[k][todo] for k in PARAM_KEYS}
+        res = evaluate(ticks, sub, t0_ms, t1_ms, max_hold_sec, candles, use_cache, exit_cap_ms)
+        for j, i in enumerate(todo):
+            for k in _SUMMARY_KEYS:
+                out[k][i] = res[k][j]
+            if use_cache:
+                result_cache.put(keys[i], {k: out[k][i].item() for k in _SUMMARY_KEYS})
+    out["cached"] = P - len(todo)
+    return out
+
+
+# ==============================
+# Abgleich mit evaluate_trend_signal (Einzel-Lauf pro Satz)
+# ==============================
+def verify(candles: dict, sets: dict, n_sets: int) -> None:
+    # Referenz: Live-Funktion Candle für Candle, je Satz ein eigener Lauf – nur an den Closes
+    # (ohne die Forming-Updates des Live-Bots, siehe Kopf) → prüft den Gleichschritt, nicht Live-Äquivalenz
+    from collections import deque
+    t0 = time.perf_counter()
+    sig = evaluate_signals(candles, sets, use_cache=False)
+    t_batch = time.perf_counter() - t0
+    P = len(sets["EMA_FAST"])
+
+    t0 = time.perf_counter()
+    ok = 0
+    mids = candles["mid"].tolist()
+    spreads = candles["spread"].tolist()
+    saved = {k: getattr(bot, k) for k in ENTRY_KEYS}
+    try:
+        for p in range(min(n_sets, P)):
+            for k, v in set_row(sets, p).items():
+                if k in ENTRY_KEYS:
+                    setattr(bot, k, v)
+            bot._TREND_STATE.pop("_verify", None)
+            hist = deque(maxlen=200)
+            ref = []
+            for t in range(candles["n"]):
+                hist.append(mids[t])
+                s = bot.evaluate_trend_signal("_verify", list(hist), spreads[t])
+                if s.startswith("BEREIT: BUY"):
+                    ref.append((t, 1))
+                elif s.startswith("BEREIT: SELL"):
+                    ref.append((t, -1))
+            mine = [(int(t), int(d)) for t, s_, d in zip(sig["t"], sig["set"], sig["dir"]) if s_ == p]
+            if sorted(mine) == ref:
+                ok += 1
+            else:
+                diff = set(mine) ^ set(ref)
+                print(f"⚠️ Satz {p}: {len(diff)} abweichende Entries (batch={len(mine)}, live={len(ref)}) z.B. {sorted(diff)[:3]}")
+    finally:
+        for k, v in saved.items():
+            setattr(bot, k, v)
+    t_ref = time.perf_counter() - t0
+    n_ref = min(n_sets, P)
+    print(f"🔎 Abgleich (Close-only-Replay, ohne Forming-Updates): {ok}/{n_ref} Sätze identisch | Batch {P} Sätze {t_batch:.2f}s "
+          f"| Einzel-Läufe {n_ref} Sätze {t_ref:.2f}s → hochgerechnet {t_ref / max(1, n_ref) * P:.1f}s für {P}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Viele Parametersätze in einem Durchlauf backtesten")
+    ap.add_argument("--epic", required=True)
+    ap.add_argument("--axis", action="append", default=[], help="KEY=a:b:n oder KEY=v1,v2,... (mehrfach)")
+    ap.add_argument("--set", action="append", default=[], help="Parameter fest setzen: KEY=v")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--max-hold", type=float, default=BATCH_EVAL_MAX_HOLD_SEC)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--verify", type=int, default=0, help="die ersten N Sätze gegen evaluate_trend_signal prüfen")
+    ap.add_argument("--no-cache", action="store_true", help="result_cache nicht benutzen")
+    args = ap.parse_args()
+
+    axes = dict(parse_axis(a) for a in args.axis)
+    fixed = {k.strip(): float(v) for k, _, v in (s.partition("=") for s in args.set)}
+    sets = make_sets(axes, fixed)
+    P = len(sets["EMA_FAST"])
+
+    t0 = time.perf_counter()
+    ticks = load_ticks(args.epic, tick_dir=args.dir)
+    candles = build_candles(ticks)
+    t1 = time.perf_counter()
+    print(f"🕯️ [{args.epic}] {len(ticks['ts'])} Ticks → {candles['n']} Candles ({t1 - t0:.2f}s)")
+
+    if args.verify:
+        verify(candles, sets, args.verify)
+        t1 = time.perf_counter()
+
+    res = evaluate_summary(ticks, sets, max_hold_sec=args.max_hold, candles=candles, use_cache=not args.no_cache)
+    t2 = time.perf_counter()
+    print(f"🧪 {P} Sätze ({res['cached']} aus Cache) → {res['n_trades'].sum()} Trades ({t2 - t1:.2f}s)")
+    varied = [k for k in PARAM_KEYS if k in axes]
+    for p in np.argsort(-res["pnl"])[:args.top]:
+        desc = " ".join(f"{k}={sets[k][p]:.6g}" for k in varied)
+        print(f"  PnL={res['pnl'][p]:10.2f} Trades={res['n_trades'][p]:4d} Win={res['win_rate'][p] * 100:5.1f}% "
+              f"MaxDD={res['max_dd'][p]:8.2f}  {desc}")
@@ -0,0 +1,148 @@
+# bench_ws_recv.py – Micro-Benchmark WebSocket-Empfang gegen lokalen Stand-in
+#
+# Vergleicht den alten Empfangspfad (wait_for(ws.recv()) pro Nachricht + Ping-Check inline)
+# mit dem Batch-Empfang aus tradingbot_2 (_ws_buffered + _decode_quotes).
+#
+# Aufruf:
+#   python bench_ws_recv.py                      → Benchmark (Default 50.000 Quotes)
+#   python bench_ws_recv.py --count 200000
+#   python bench_ws_recv.py --serve --rate 200   → nur Stand-in starten, Bot dagegen laufen lassen:
+#       CAPITAL_STREAM_URL=ws://127.0.0.1:8765/connect python tradingbot_2.py
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+import websockets
+
+from tradingbot_2 import INSTRUMENTS, PING_INTERVAL, RECV_TIMEOUT, FEED_MAX_BATCH, FEED_MAX_QUEUE, _decode_quotes, _ws_buffered
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+# ==============================
+# Lokaler Stand-in für den Capital-Stream
+#   rate > 0  → gleichmäßig rate Quotes/s pro Epic (für den Bot)
+#   rate == 0 → count Quotes so schnell wie möglich, dann Close (für den Benchmark)
+# ==============================
+def _quote_msg(epic, px, ts_ms):
+    return json.dumps({
+        "status": "OK",
+        "destination": "quote",
+        "payload": {"epic": epic, "bid": round(px, 2), "ofr": round(px + 0.5, 2),
+                    "bidQty": 1.0, "ofrQty": 1.0, "timestamp": ts_ms},
+    })
+
+
+async def _serve(rate: float, count: int):
+    async def handler(ws):
+        sub = json.loads(await ws.recv())
+        epics = sub.get("payload", {}).get("epics") or INSTRUMENTS
+        px = 3000.0
+        try:
+            if rate > 0:
+                while True:
+                    for epic in epics:
+                        px += random.uniform(-1, 1)
+                        await ws.send(_quote_msg(epic, px, int(time.time() * 1000)))
+                    await asyncio.sleep(1.0 / rate)
+            else:
+                for i in range(count):
+                    px += random.uniform(-1, 1)
+                    await ws.send(_quote_msg(epics[i % len(epics)], px, int(time.time() * 1000)))
+                await ws.close()
+        except websockets.ConnectionClosed:
+            pass
+
+    async with websockets.serve(handler, HOST, PORT, max_queue=None):
+        print(f"🧪 Stand-in läuft auf ws://{HOST}:{PORT}/connect (rate={rate or 'burst'})")
+        await asyncio.Future()
+
+
+def _serve_process(rate: float, count: int):
+    asyncio.run(_serve(rate, count))
+
+
+# ==============================
+# Empfangsvarianten
+# ==============================
+async def _recv_legacy(url: str, count: int) -> tuple:
+    # Nachbau des alten Loops: Ping-Check + wait_for pro Nachricht + Parse
+    got = 0
+    async with websockets.connect(url, ping_interval=None, max_queue=FEED_MAX_QUEUE) as ws:
+        await ws.send(json.dumps({"destination": "marketData.subscribe", "payload": {"epics": INSTRUMENTS}}))
+        last_ping = time.time()
+        t0 = time.perf_counter()
+        while got < count:
+            now = time.time()
+            if now - last_ping > PING_INTERVAL:
+                await ws.ping()
+                last_ping = now
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=RECV_TIMEOUT)
+                msg = json.loads(raw)
+            except Exception:
+                break
+            if msg.get("destination") != "quote":
+                continue
+            p = msg.get("payload", {})
+            try:
+                float(p["bid"]); float(p["ofr"]); int(p["timestamp"])
+            except Exception:
+                continue
+            got += 1
+        return got, time.perf_counter() - t0, got
+
+
+async def _recv_batch(url: str, count: int) -> tuple:
+    # Neuer Pfad: 1 recv abwarten, gepufferte Frames am Stück abholen, Batch dekodieren
+    got = 0
+    batches = 0
+    async with websockets.connect(url, ping_interval=None, max_queue=FEED_MAX_QUEUE) as ws:
+        await ws.send(json.dumps({"destination": "marketData.subscribe", "payload": {"epics": INSTRUMENTS}}))
+        t0 = time.perf_counter()
+        try:
+            while got < count:
+                raws = [await ws.recv()]
+                while len(raws) < FEED_MAX_BATCH and _ws_buffered(ws):
+                    raws.append(await ws.recv())
+                got += len(_decode_quotes(raws))
+                batches += 1
+        except websockets.ConnectionClosed:
+            pass
+        return got, time.perf_counter() - t0, batches
+
+
+def _run_variant(name: str, fn, count: int) -> None:
+    proc = multiprocessing.Process(target=_serve_process, args=(0.0, count), daemon=True)
+    proc.start()
+    time.sleep(1.0)  # Server hochfahren lassen
+    try:
+        got, secs, calls = asyncio.run(fn(f"ws://{HOST}:{PORT}/connect", count))
+    finally:
+        proc.terminate()
+        proc.join()
+    per_msg_us = (secs / got * 1e6) if got else float("nan")
+    print(f"{name:<8} quotes={got:>8}  zeit={secs:7.3f}s  {per_msg_us:7.2f} µs/Quote  "
+          f"{got / secs if secs else 0:10.0f} Quotes/s  Aufwachen={calls}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="WebSocket-Empfang: alt (wait_for pro Nachricht) vs. Batch-Drain")
+    ap.add_argument("--count", type=int, default=50000, help="Anzahl Quotes pro Variante")
+    ap.add_argument("--serve", action="store_true", help="nur den Stand-in starten (für den Bot)")
+    ap.add_argument("--rate", type=float, default=50.0, help="Quotes/s pro Epic im --serve-Modus")
+    args = ap.parse_args()
+
+    if args.serve:
+        try:
+            asyncio.run(_serve(args.rate, 0))
+        except KeyboardInterrupt:
+            pass
+    else:
+        _run_variant("legacy", _recv_legacy, args.count)
+        _run_variant("batch", _recv_batch, args.count)
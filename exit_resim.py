@@ -0,0 +1,385 @@
+# exit_resim.py – Exit-Logik vektorisiert auf historischen Trade-Pfaden neu simulieren
+#
+# Für jeden Trade (bot_log.csv oder Backtest) wird der Tick-Pfad ab dem Entry einmal aus dem
+# Tick-Archiv geschnitten. Danach läuft check_protection_rules (SL/TP, Trailing mit Calm-Down,
+# Break-Even, Regime + TS-Tightening) für alle Parameter-Kombinationen gleichzeitig:
+#   Zustand = Arrays (Trades × Kombinationen), eine Schleife über den Tick-Index.
+# Ergebnis: Exit-Preis/-Grund/PnL pro Trade und Kombination → Heatmap pro Parameterpaar.
+#
+# Nachgebildet wird die Live-Reihenfolge pro Tick (inkl. ihrer Eigenheiten):
+#   Regime (1×/s, nur im Gewinn) → TS-Tightening → Break-Even → Trailing → BE-Schutz
+#   → Stop-Prüfung gegen den Trailing-Stop vom Anfang des Ticks (siehe TODO TS-Tightening im Bot).
+# Ausgeführt wird zum Trigger-Preis (Bid bei LONG, Ask bei SHORT), ohne Slippage.
+# REGIME_RANGE_WINDOW_MS ist pro Lauf fest (Range wird einmal pro Pfad vorberechnet).
+#
+# Aufruf:
+#   python exit_resim.py --x STOP_LOSS_PCT=0.001:0.01:10 --y TRAILING_STOP_PCT=0.0005:0.005:10
+#   python exit_resim.py --x TAKE_PROFIT_PCT=0.002,0.004,0.008 --y TIGHTEN_FACTOR=0.3:0.9:7 --epic GOLD --out tp_tight.png
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+import tradingbot_2 as bot
+from tick_archive import load_ticks, load_trades, rolling_range, tick_slice
+
+EXIT_KEYS = [
+    "STOP_LOSS_PCT",
+    "TAKE_PROFIT_PCT",
+    "TRAILING_STOP_PCT",
+    "TRAILING_SET_CALM_DOWN",
+    "BREAK_EVEN_STOP_PCT",
+    "BREAK_EVEN_BUFFER_PCT",
+    "ACTIVATE_TIGHTENING",
+    "REGIME_PROFIT_GATE_SPREADS",
+    "REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME",
+    "REGIME_FLAT_MIN_SECS_SINCE_EXTREME",
+    "REGIME_FLAT_MAX_RANGE_SPREADS",
+    "TIGHTEN_PROFIT_GATE_TS_MULT",
+    "TIGHTEN_COOLDOWN_MS",
+    "TIGHTEN_MAX_STAGES",
+    "TIGHTEN_FACTOR",
+]
+
+EXIT_RESIM_MAX_HOLD_SEC = 6 * 3600   # so weit nach dem Entry wird der Pfad geschnitten (offene Kombis → "END")
+EXIT_RESIM_BATCH        = 64         # Trades pro Batch (nach Pfadlänge sortiert → wenig Padding)
+
+REASON_STOP, REASON_TP, REASON_END = 1, 2, 3
+REASON_NAMES = {REASON_STOP: "STOP_LOSS", REASON_TP: "TAKE_PROFIT", REASON_END: "END"}
+
+_STATE_NONE, _STATE_IMPULSE, _STATE_RUN, _STATE_FLAT = 0, 1, 2, 3
+
+
+# ==============================
+# Parameter-Grid
+# ==============================
+def parse_axis(spec: str):
+    # "KEY=a:b:n" (linspace) oder "KEY=v1,v2,..." → (KEY, np.array)
+    key, _, vals = spec.partition("=")
+    key = key.strip()
+    if key not in EXIT_KEYS:
+        raise ValueError(f"{key} ist kein Exit-Parameter ({', '.join(EXIT_KEYS)})")
+    if ":" in vals:
+        a, b, n = vals.split(":")
+        return key, np.linspace(float(a), float(b), int(n))
+    return key, np.array([float(v) for v in vals.split(",")])
+
+
+def make_grid(axes: dict, fixed: dict = None) -> dict:
+    # Kartesisches Produkt der Achsen; alle anderen Exit-Parameter = aktuelle Bot-Werte (bzw. fixed)
+    fixed = fixed or {}
+    keys = list(axes)
+    combos = list(itertools.product(*(axes[k] for k in keys))) or [()]
+    grid = {}
+    for k in EXIT_KEYS:
+        if k in axes:
+            grid[k] = np.array([c[keys.index(k)] for c in combos], dtype=np.float64)
+        else:
+            grid[k] = np.full(len(combos), float(fixed.get(k, getattr(bot, k))))
+    return grid
+
+
+# ==============================
+# Trade-Pfade aus dem Tick-Archiv
+# ==============================
+def build_paths(trades: list, max_hold_sec: float = EXIT_RESIM_MAX_HOLD_SEC,
+                range_window_ms: int = None, tick_cache: dict = None, tick_dir: str = None,
+                end_ms: int = None) -> list:
+    # Pro Trade: Ticks ab Entry (max. max_hold_sec) + Regime-Range (Mid, Fenster rückwärts) je Tick.
+    # end_ms → Pfad endet spätestens davor (noch offene Kombis → "END" am letzten Tick davor),
+    # z.B. In-Sample-Bewertung ohne Ticks aus dem folgenden Test-Fenster
+    window = bot.REGIME_RANGE_WINDOW_MS if range_window_ms is None else range_window_ms
+    tick_cache = {} if tick_cache is None else tick_cache
+    paths = []
+    for t in trades:
+        ticks = tick_cache.get(t["epic"])
+        if ticks is None:
+            ticks = tick_cache[t["epic"]] = load_ticks(t["epic"], tick_dir=tick_dir)
+        stop_ms = t["open_ms"] + int(max_hold_sec * 1000)
+        sl = tick_slice(ticks, t["open_ms"], stop_ms if end_ms is None else min(stop_ms, end_ms))
+        if sl.stop - sl.start < 1:
+            continue
+        pre = tick_slice(ticks, t["open_ms"] - window, t["open_ms"])
+        ts = np.asarray(ticks["ts"][pre.start:sl.stop])
+        bid = np.asarray(ticks["bid"][pre.start:sl.stop])
+        ask = np.asarray(ticks["ask"][pre.start:sl.stop])
+        rmin, rmax = rolling_range(ts, (bid + ask) / 2.0, window)
+        k = sl.start - pre.start
+        paths.append({
+            "trade": t,
+            "ts": ts[k:],
+            "bid": bid[k:],
+            "ask": ask[k:],
+            "range": (rmax - rmin)[k:],
+        })
+    return paths
+
+
+def _pad(paths: list, key: str, fill=np.nan) -> np.ndarray:
+    L = max(len(p["ts"]) for p in paths)
+    out = np.full((len(paths), L), fill, dtype=np.float64)
+    for i, p in enumerate(paths):
+        out[i, :len(p[key])] = p[key]
+    return out
+
+
+# ==============================
+# Simulation
+# ==============================
+def _simulate_lanes(paths: list, grid: dict, r: np.ndarray, c: np.ndarray, initial_trailing: bool) -> dict:
+    # Zustand flach über "Lanes" (Pfad r × Kombination c); geschlossene Lanes werden regelmäßig
+    # herauskompaktiert → die Tick-Schleife rechnet nur noch auf offenen Kombinationen
+    n_lanes = len(r)
+    lens = np.array([len(p["ts"]) for p in paths])
+    TS, BID, ASK, RNG = _pad(paths, "ts"), _pad(paths, "bid"), _pad(paths, "ask"), _pad(paths, "range")
+
+    # Richtung in "x-Koordinaten": x = s·Preis → SHORT wird formal zu LONG (Stops steigen, TP oben)
+    s_t = np.array([1.0 if p["trade"]["direction"] == "BUY" else -1.0 for p in paths])
+    entry_t = np.array([float(p["trade"]["entry"]) for p in paths])
+    size_t = np.array([float(p["trade"].get("size") or bot.MANUAL_TRADE_SIZE) for p in paths])
+
+    lane = np.arange(n_lanes)
+    L = {"lane": lane, "r": r}
+    s, entry = s_t[r], entry_t[r]
+    e = s * entry
+    g = {k: v[c] for k, v in grid.items()}
+    ts_pct = g["TRAILING_STOP_PCT"]
+    L.update({
+        "s": s, "entry": entry, "e": e, "end": lens[r],
+        "sl_x": e - entry * g["STOP_LOSS_PCT"],
+        "tp_x": e + entry * g["TAKE_PROFIT_PCT"],
+        "be_trig_x": e + entry * (g["BREAK_EVEN_STOP_PCT"] + g["BREAK_EVEN_BUFFER_PCT"]),
+        "be_x": e + entry * g["BREAK_EVEN_STOP_PCT"],
+        "ts_pct": ts_pct,
+        "calm": g["TRAILING_SET_CALM_DOWN"],
+        "tight_on": (g["ACTIVATE_TIGHTENING"] != 0) & (ts_pct > 0),
+        "tight_gate": g["TIGHTEN_PROFIT_GATE_TS_MULT"] * entry * ts_pct,
+        "tight_cd": g["TIGHTEN_COOLDOWN_MS"],
+        "tight_max": g["TIGHTEN_MAX_STAGES"],
+        "tight_f": g["TIGHTEN_FACTOR"],
+        "rg_gate": g["REGIME_PROFIT_GATE_SPREADS"],
+        "rg_imp": g["REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME"],
+        "rg_flat": g["REGIME_FLAT_MIN_SECS_SINCE_EXTREME"],
+        "rg_rng": g["REGIME_FLAT_MAX_RANGE_SPREADS"],
+        # Zustand
+        # OPTIMISTIC_OPEN: Trailing startet bei entry·(1∓TS), sonst ohne Trailing
+        "stop_x": e - entry * ts_pct if initial_trailing else np.zeros(n_lanes),
+        "has_stop": np.full(n_lanes, bool(initial_trailing)),
+        "be_active": np.zeros(n_lanes, dtype=bool),
+        "peak_x": np.full(n_lanes, -np.inf),
+        "last_extreme": np.zeros(n_lanes),
+        "regime": np.zeros(n_lanes, dtype=np.int8),
+        "stage": np.zeros(n_lanes),
+        "tight_last": np.zeros(n_lanes),
+        "last_sec": np.full(n_lanes, -1.0),
+    })
+
+    exit_idx = lens[r] - 1                         # Default: Pfadende ("END")
+    reason = np.full(n_lanes, REASON_END, dtype=np.int8)
+
+    for j in range(int(lens.max())):
+        if j and j % 64 == 0:
+            keep = L["end"] > j
+            if keep.sum() < 0.75 * len(keep):
+                L = {k: v[keep] for k, v in L.items()}
+        if not len(L["lane"]):
+            break
+        valid = L["end"] > j
+        rr = L["r"]
+        bid, ask, ts = BID[rr, j], ASK[rr, j], TS[rr, j]
+        s, e = L["s"], L["e"]
+        price = np.where(s > 0, bid, ask)
+        x = s * price
+        spread = ask - bid
+        profit = x - e
+
+        # 🧭 Regime (log_trade_regime): 1×/Sekunde, nur wenn Gewinn > Gate·Spread
+        sec = np.floor(ts / 1000.0)
+        eval_t = valid & (spread > 0) & (sec != L["last_sec"])
+        L["last_sec"] = np.where(eval_t, sec, L["last_sec"])
+        upd = eval_t & (profit > L["rg_gate"] * spread)
+        new_peak = upd & (x > L["peak_x"])
+        L["peak_x"] = np.where(new_peak, x, L["peak_x"])
+        L["last_extreme"] = np.where(new_peak, ts, L["last_extreme"])
+        if upd.any():
+            since = (ts - L["last_extreme"]) / 1000.0
+            rs = RNG[rr, j] / np.where(spread > 0, spread, np.nan)
+            st = np.where(
+                since <= L["rg_imp"], _STATE_IMPULSE,
+                np.where((since >= L["rg_flat"]) & (rs <= L["rg_rng"]), _STATE_FLAT, _STATE_RUN),
+            )
+            L["regime"] = np.where(upd, st, L["regime"])
+
+        stop_old, has_old = L["stop_x"], L["has_stop"]
+        new_stop, new_has = stop_old.copy(), has_old.copy()
+
+        # 🧷 TS-Tightening (nur FLAT im Gewinn, Cooldown, max. Stufen)
+        tcan = (L["tight_on"] & (L["regime"] == _STATE_FLAT) & (profit >= L["tight_gate"])
+                & (ts - L["tight_last"] >= L["tight_cd"]) & (L["stage"] < L["tight_max"]))
+        if tcan.any():
+            cand = x - price * L["ts_pct"] * L["tight_f"] ** (L["stage"] + 1)
+            tdo = tcan & (~has_old | (cand > stop_old))
+            new_stop = np.where(tdo, cand, new_stop)
+            new_has |= tdo
+            L["stage"] = np.where(tdo, L["stage"] + 1, L["stage"])
+            L["tight_last"] = np.where(tdo, ts, L["tight_last"])
+
+        # 🧭 Break-Even (Bedingung gegen den Stop vom Tick-Anfang, wie live)
+        be_x = L["be_x"]
+        bdo = (x >= L["be_trig_x"]) & (~has_old | (stop_old < be_x))
+        new_stop = np.where(bdo, be_x, new_stop)
+        new_has |= bdo
+        L["be_active"] = L["be_active"] | bdo
+
+        # 🔧 Trailing (nur bei Fortschritt über Calm-Down hinaus)
+        trail = x - price * L["ts_pct"]
+        tdo = (x > e) & (~has_old | (trail > stop_old + spread * L["calm"]))
+        new_stop = np.where(tdo, trail, new_stop)
+        new_has |= tdo
+
+        # 🛡️ Break-Even-Schutz
+        new_stop = np.where(L["be_active"] & has_old & (new_stop < be_x), be_x, new_stop)
+
+        # Stops prüfen (Stop vom Tick-Anfang)
+        hit_sl = valid & ((x <= L["sl_x"]) | (has_old & (x <= stop_old)))
+        hit_tp = valid & ~hit_sl & (x >= L["tp_x"])
+        hit = hit_sl | hit_tp
+        if hit.any():
+            ids = L["lane"][hit]
+            exit_idx[ids] = j
+            reason[ids] = np.where(hit_sl[hit], REASON_STOP, REASON_TP)
+            L["end"] = np.where(hit, j, L["end"])   # Lane ist fertig → fliegt bei der nächsten Kompaktierung raus
+
+        L["stop_x"] = np.where(valid, new_stop, stop_old)
+        L["has_stop"] = np.where(valid, new_has, has_old)
+
+    s_l = s_t[r]
+    exit_price = np.where(s_l > 0, BID[r, exit_idx], ASK[r, exit_idx])
+    exit_ts = TS[r, exit_idx]
+    return {
+        "pnl": s_l * (exit_price - entry_t[r]) * size_t[r],
+        "exit_price": exit_price,
+        "exit_ms": exit_ts,
+        "hold_sec": (exit_ts - TS[r, 0]) / 1000.0,
+        "reason": reason,
+    }
+
+
+def simulate_pairs(paths: list, grid: dict, path_idx, combo_idx, initial_trailing: bool = None,
+                   batch: int = EXIT_RESIM_BATCH) -> dict:
+    # Nur ausgewählte (Pfad, Kombination)-Paare simulieren – flache Ergebnis-Arrays in Paar-Reihenfolge.
+    # Pfade werden nach Länge sortiert in Batches gepolstert (Speicher ~ batch × längster Pfad).
+    if initial_trailing is None:
+        initial_trailing = bool(bot.OPTIMISTIC_OPEN)
+    path_idx = np.asarray(path_idx, dtype=np.int64)
+    combo_idx = np.asarray(combo_idx, dtype=np.int64)
+    out = {
+        "pnl": np.zeros(len(path_idx)),
+        "exit_price": np.zeros(len(path_idx)),
+        "exit_ms": np.zeros(len(path_idx)),
+        "hold_sec": np.zeros(len(path_idx)),
+        "reason": np.zeros(len(path_idx), dtype=np.int8),
+    }
+    used = np.unique(path_idx)
+    used = used[np.argsort([len(paths[i]["ts"]) for i in used], kind="stable")]
+    for b0 in range(0, len(used), batch):
+        chunk = used[b0:b0 + batch]
+        local = np.full(len(paths), -1, dtype=np.int64)
+        local[chunk] = np.arange(len(chunk))
+        sel = np.flatnonzero(local[path_idx] >= 0)
+        res = _simulate_lanes([paths[i] for i in chunk], grid, local[path_idx[sel]], combo_idx[sel], initial_trailing)
+        for k, v in res.items():
+            out[k][sel] = v
+    return out
+
+
+def simulate_exits(paths: list, grid: dict, initial_trailing: bool = None, batch: int = EXIT_RESIM_BATCH) -> dict:
+    # Ergebnis-Arrays (Trades × Kombinationen) in der Reihenfolge von paths
+    N, P = len(paths), len(next(iter(grid.values())))
+    path_idx, combo_idx = np.divmod(np.arange(N * P), P)
+    res = simulate_pairs(paths, grid, path_idx, combo_idx, initial_trailing, batch)
+    return {k: v.reshape(N, P) for k, v in res.items()}
+
+
+def heatmap(result: dict, grid: dict, x_key: str, y_key: str, stat: str = "mean"):
+    # PnL je Parameterpaar: "mean" = Erwartungswert pro Trade, "sum" = Summe über alle Trades.
+    # Weitere variierte Parameter werden über den Mittelwert zusammengefasst.
+    xs, ys = np.unique(grid[x_key]), np.unique(grid[y_key])
+    per_combo = result["pnl"].mean(axis=0) if stat == "mean" else result["pnl"].sum(axis=0)
+    hm = np.full((len(ys), len(xs)), np.nan)
+    xi = np.searchsorted(xs, grid[x_key])
+    yi = np.searchsorted(ys, grid[y_key])
+    acc = np.zeros_like(hm)
+    cnt = np.zeros_like(hm)
+    np.add.at(acc, (yi, xi), per_combo)
+    np.add.at(cnt, (yi, xi), 1)
+    np.divide(acc, cnt, out=hm, where=cnt > 0)
+    return xs, ys, hm
+
+
+def plot_heatmap(xs, ys, hm, x_key: str, y_key: str, path: str, title: str = "") -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(max(6, len(xs) * 0.6), max(4, len(ys) * 0.45)))
+    lim = np.nanmax(np.abs(hm)) if np.isfinite(hm).any() else 1.0
+    im = ax.imshow(hm, origin="lower", aspect="auto", cmap="RdYlGn", vmin=-lim, vmax=lim)
+    ax.set_xticks(range(len(xs)), [f"{v:.4g}" for v in xs], rotation=45, ha="right")
+    ax.set_yticks(range(len(ys)), [f"{v:.4g}" for v in ys])
+    ax.set_xlabel(x_key)
+    ax.set_ylabel(y_key)
+    if len(xs) * len(ys) <= 400:
+        for (r, c), v in np.ndenumerate(hm):
+            if np.isfinite(v):
+                ax.text(c, r, f"{v:.2f}", ha="center", va="center", fontsize=7)
+    fig.colorbar(im, ax=ax, label="PnL / Trade")
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Exit-Parameter vektorisiert auf historischen Trades neu simulieren")
+    ap.add_argument("--x", required=True, help="KEY=a:b:n oder KEY=v1,v2,...")
+    ap.add_argument("--y", required=True, help="KEY=a:b:n oder KEY=v1,v2,...")
+    ap.add_argument("--set", action="append", default=[], help="weitere Exit-Parameter fest setzen: KEY=v")
+    ap.add_argument("--epic", action="append", help="nur Trades dieser Epics")
+    ap.add_argument("--log", default=bot.LOG_CSV, help="bot_log.csv")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--max-hold", type=float, default=EXIT_RESIM_MAX_HOLD_SEC, help="Pfadlänge nach Entry (s)")
+    ap.add_argument("--stat", default="mean", choices=["mean", "sum"])
+    ap.add_argument("--out", default="exit_heatmap.png")
+    args = ap.parse_args()
+
+    x_key, x_vals = parse_axis(args.x)
+    y_key, y_vals = parse_axis(args.y)
+    fixed = {}
+    for spec in args.set:
+        k, _, v = spec.partition("=")
+        fixed[k.strip()] = float(v)
+    grid = make_grid({x_key: x_vals, y_key: y_vals}, fixed)
+
+    t0 = time.perf_counter()
+    trades = load_trades(args.log, epics=args.epic)
+    paths = build_paths(trades, args.max_hold, tick_dir=args.dir)
+    t1 = time.perf_counter()
+    if not paths:
+        raise SystemExit(f"⚠️ Keine Trades mit Tick-Pfad gefunden ({len(trades)} Trades in {args.log})")
+    res = simulate_exits(paths, grid)
+    t2 = time.perf_counter()
+
+    xs, ys, hm = heatmap(res, grid, x_key, y_key, args.stat)
+    n_ticks = sum(len(p["ts"]) for p in paths)
+    print(f"🧪 {len(paths)} Trades, {n_ticks} Ticks, {len(x_vals) * len(y_vals)} Kombinationen → "
+          f"Pfade {t1 - t0:.2f}s, Simulation {t2 - t1:.2f}s")
+    best = np.unravel_index(np.nanargmax(hm), hm.shape)
+    print(f"🏆 bestes Paar: {x_key}={xs[best[1]]:.6g} {y_key}={ys[best[0]]:.6g} → PnL/{args.stat}={hm[best]:.4f}")
+    reasons = np.bincount(res["reason"].ravel(), minlength=4)
+    print("   Exit-Gründe: " + "  ".join(f"{REASON_NAMES[i]}={reasons[i]}" for i in (REASON_STOP, REASON_TP, REASON_END)))
+    plot_heatmap(xs, ys, hm, x_key, y_key, args.out,
+                 title=f"Exit-Resimulation: {len(paths)} Trades, PnL {args.stat}")
+    print(f"🖼️ Heatmap → {args.out}")
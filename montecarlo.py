@@ -0,0 +1,215 @@
+# montecarlo.py – Monte-Carlo-Robustheit einer Trade-Folge (Drawdown-/Ruin-Verteilung statt Einzelpfad)
+#
+# Ein realisierter PnL-Pfad (bot_log.csv) oder ein Backtest-Pfad ist nur EINE Reihenfolge mit EINEN Fills.
+# Hier werden daraus MC_PATHS Pfade erzeugt:
+#   1) Bootstrap: Trades mit Zurücklegen neu ziehen (gleiche Anzahl wie das Original)
+#   2) Fills: pro Fill (Entry + Exit) Slippage |N(0, MC_SLIP_SPREADS·Spread)| gegen uns, Spread aus dem Tick-Archiv
+#   3) Entry-Latenz: Verzögerung ~ Exponential(MC_LATENCY_MEAN_MS), Entry-Preis dann aus dem Tick-Pfad
+#      (Ask bei BUY / Bid bei SELL zum Zeitpunkt open + Latenz). Der Exit bleibt wie im Original.
+# Alles als Matrix (Pfade × Trades) in Blöcken zu MC_CHUNK Pfaden – zehntausende Pfade in Sekunden.
+# Ruin = Equity fällt irgendwann auf (1 − MC_RUIN_PCT) · MC_START_CAPITAL.
+#
+# Aufruf:
+#   python montecarlo.py                                   → Trades aus bot_log.csv
+#   python montecarlo.py --epic GOLD --backtest            → Backtest mit den aktuellen Bot-Parametern
+#   python montecarlo.py --epic GOLD --backtest --params parameter_GOLD.csv --paths 50000 --out mc.png
+
+import argparse
+import time
+
+import numpy as np
+
+import batch_eval
+import tradingbot_2 as bot
+from optimizer import read_parameter_csv
+from tick_archive import load_ticks, load_trades
+
+MC_PATHS = 20_000
+MC_CHUNK = 2_000                     # Pfade pro Matrix-Block (Speicher: CHUNK × Trades × 8 Byte)
+MC_SLIP_SPREADS = 0.25               # Slippage-Streuung pro Fill in Spreads (Halbnormal, immer gegen uns)
+MC_LATENCY_MEAN_MS = 300.0           # mittlere zusätzliche Entry-Verzögerung
+MC_LATENCY_MAX_MS = 3_000            # Obergrenze der Latenz (und des vorberechneten Preis-Rasters)
+MC_LATENCY_STEP_MS = 50              # Raster für Entry-Preis(Latenz)
+MC_START_CAPITAL = 1000.0            # ~ MANUAL_TRADE_SIZE-Kommentar: 0.3 ETH ≈ 1000 €
+MC_RUIN_PCT = 0.5                    # Ruin: 50 % des Startkapitals verloren
+
+
+# ==============================
+# Trade-Folge (Log oder Backtest) + Tick-Kontext
+# ==============================
+def trades_from_log(path: str = bot.LOG_CSV, epics=None) -> list:
+    out = []
+    for t in load_trades(path, epics):
+        if t["close_ms"] is None or not isinstance(t["exit"], float):
+            continue
+        s = 1.0 if t["direction"] == "BUY" else -1.0
+        size = t["size"] if isinstance(t["size"], float) else float(bot.MANUAL_TRADE_SIZE)
+        pnl = t["pnl"] if isinstance(t["pnl"], float) else s * (t["exit"] - t["entry"]) * size
+        out.append({"epic": t["epic"], "dir": s, "open_ms": t["open_ms"], "entry": t["entry"],
+                    "size": size, "pnl": pnl})
+    return out
+
+
+def trades_from_backtest(epic: str, params: dict = None, tick_dir: str = None, t0_ms: int = None,
+                         t1_ms: int = None, ticks: dict = None) -> list:
+    ticks = ticks if ticks is not None else load_ticks(epic, tick_dir=tick_dir)
+    res = batch_eval.evaluate(ticks, batch_eval.sets_from_rows([params or {}]), t0_ms, t1_ms)
+    tr = res["trades"]
+    out = []
+    for i in tr["taken"][0].tolist():
+        s = float(tr["dir"][i])
+        o = int(tr["open_ms"][i])
+        j = min(int(np.searchsorted(ticks["ts"], o, side="right")) - 1, len(ticks["ts"]) - 1)
+        entry = float(ticks["ask"][j] if s > 0 else ticks["bid"][j])
+        out.append({"epic": epic, "dir": s, "open_ms": o, "entry": entry,
+                    "size": float(bot.MANUAL_TRADE_SIZE), "pnl": float(tr["pnl"][i])})
+    return out
+
+
+def tick_context(trades: list, tick_dir: str = None, tick_cache: dict = None) -> dict:
+    # pro Trade: Spread beim Entry + Entry-Preis auf dem Latenz-Raster (NaN/0 ohne Ticks)
+    lat = np.arange(0, MC_LATENCY_MAX_MS + 1, MC_LATENCY_STEP_MS)
+    n = len(trades)
+    spread = np.zeros(n)
+    entry_at = np.tile(np.array([t["entry"] for t in trades], dtype=np.float64)[:, None], (1, len(lat)))
+    cache = dict(tick_cache or {})
+    for epic in sorted({t["epic"] for t in trades}):
+        if epic not in cache:
+            try:
+                cache[epic] = load_ticks(epic, update=False, tick_dir=tick_dir)
+            except FileNotFoundError:
+                cache[epic] = None
+        ticks = cache[epic]
+        if ticks is None or not len(ticks["ts"]):
+            continue
+        idx = np.array([i for i, t in enumerate(trades) if t["epic"] == epic])
+        o = np.array([trades[i]["open_ms"] for i in idx], dtype=np.int64)
+        s = np.array([trades[i]["dir"] for i in idx])
+        ts = ticks["ts"]
+        # letzter Tick ≤ Zeitpunkt (Quote, die zu dem Moment gilt)
+        j = np.searchsorted(ts, o[:, None] + lat[None, :], side="right") - 1
+        ok = (j >= 0) & (o[:, None] >= ts[0]) & (o[:, None] <= ts[-1])
+        j = np.clip(j, 0, len(ts) - 1)
+        bid, ask = np.asarray(ticks["bid"])[j], np.asarray(ticks["ask"])[j]
+        px = np.where(s[:, None] > 0, ask, bid)
+        base = px[:, :1]
+        # Latenz verschiebt den Entry relativ zum Original-Entry um die Preisänderung im Tick-Pfad
+        shifted = entry_at[idx] + (px - base)
+        entry_at[idx] = np.where(ok, shifted, entry_at[idx])
+        spread[idx] = np.where(ok[:, 0], (ask - bid)[:, 0], 0.0)
+    return {"latency_ms": lat, "spread": spread, "entry_at": entry_at}
+
+
+# ==============================
+# Simulation
+# ==============================
+def simulate(trades: list, ctx: dict, n_paths: int = MC_PATHS, seed: int = 0,
+             slip_spreads: float = MC_SLIP_SPREADS, latency_mean_ms: float = MC_LATENCY_MEAN_MS,
+             capital: float = MC_START_CAPITAL, ruin_pct: float = MC_RUIN_PCT, chunk: int = MC_CHUNK) -> dict:
+    # → pro Pfad: End-PnL, MaxDD (absolut), Ruin ja/nein
+    n = len(trades)
+    if not n:
+        raise ValueError("keine Trades")
+    pnl0 = np.array([t["pnl"] for t in trades])
+    sgn = np.array([t["dir"] for t in trades])
+    size = np.array([t["size"] for t in trades])
+    entry0 = ctx["entry_at"][:, 0]
+    spread = ctx["spread"]
+    rng = np.random.default_rng(seed)
+    ruin_level = -capital * ruin_pct
+    final = np.empty(n_paths)
+    max_dd = np.empty(n_paths)
+    ruin = np.empty(n_paths, dtype=bool)
+    step = ctx["latency_ms"][1] - ctx["latency_ms"][0] if len(ctx["latency_ms"]) > 1 else 1
+
+    for a in range(0, n_paths, chunk):
+        m = min(chunk, n_paths - a)
+        pick = rng.integers(0, n, size=(m, n))                                   # 1) Bootstrap
+        slip = np.abs(rng.standard_normal((m, n, 2))).sum(axis=2) * slip_spreads  # 2) Entry + Exit
+        pnl = pnl0[pick] - slip * spread[pick] * size[pick]
+        if latency_mean_ms > 0:                                                  # 3) Entry-Latenz
+            li = np.minimum(np.rint(rng.exponential(latency_mean_ms, (m, n)) / step).astype(np.int64),
+                            ctx["entry_at"].shape[1] - 1)
+            pnl -= sgn[pick] * (ctx["entry_at"][pick, li] - entry0[pick]) * size[pick]
+        eq = np.cumsum(pnl, axis=1)
+        peak = np.maximum.accumulate(np.maximum(eq, 0.0), axis=1)
+        final[a:a + m] = eq[:, -1]
+        max_dd[a:a + m] = (peak - eq).max(axis=1)
+        ruin[a:a + m] = eq.min(axis=1) <= ruin_level
+
+    return {"final": final, "max_dd": max_dd, "ruin": ruin, "n_trades": n, "capital": capital, "ruin_pct": ruin_pct}
+
+
+def summary(res: dict, original_pnl: float = None) -> str:
+    q = (5, 50, 95, 99)
+    f, dd = np.percentile(res["final"], q), np.percentile(res["max_dd"], q)
+    lines = [
+        f"🎲 {len(res['final'])} Pfade × {res['n_trades']} Trades"
+        + (f" | Original-PnL={original_pnl:.2f}" if original_pnl is not None else ""),
+        "   End-PnL  " + "  ".join(f"p{p}={v:9.2f}" for p, v in zip(q, f)),
+        "   MaxDD    " + "  ".join(f"p{p}={v:9.2f}" for p, v in zip(q, dd))
+        + f"  (p95 = {dd[2] / res['capital'] * 100:.1f}% vom Kapital)",
+        f"   P(End-PnL < 0) = {np.mean(res['final'] < 0) * 100:.2f}%   "
+        f"P(Ruin) = {np.mean(res['ruin']) * 100:.2f}%",
+    ]
+    return "\n".join(lines)
+
+
+def plot_distributions(res: dict, path: str, title: str = "") -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (a1, a2) = plt.subplots(1, 2, figsize=(11, 4))
+    a1.hist(res["final"], bins=80, color="tab:blue", alpha=0.8)
+    a1.axvline(0, color="black", lw=0.8)
+    a1.set_title("End-PnL")
+    a2.hist(res["max_dd"], bins=80, color="tab:red", alpha=0.8)
+    a2.axvline(res["capital"] * res["ruin_pct"], color="black", lw=0.8, ls="--")
+    a2.set_title("Max. Drawdown")
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=110)
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Monte-Carlo: Bootstrap + Fill-/Latenz-Störungen einer Trade-Folge")
+    ap.add_argument("--epic", action="append", help="Epic(s); bei --backtest genau eins")
+    ap.add_argument("--log", default=bot.LOG_CSV, help="bot_log.csv")
+    ap.add_argument("--backtest", action="store_true", help="Trades aus batch_eval statt aus bot_log.csv")
+    ap.add_argument("--params", default=None, help="parameter.csv für --backtest (Default: aktuelle Bot-Werte)")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--paths", type=int, default=MC_PATHS)
+    ap.add_argument("--slip", type=float, default=MC_SLIP_SPREADS, help="Slippage-Streuung pro Fill in Spreads")
+    ap.add_argument("--latency", type=float, default=MC_LATENCY_MEAN_MS, help="mittlere Entry-Latenz (ms)")
+    ap.add_argument("--capital", type=float, default=MC_START_CAPITAL)
+    ap.add_argument("--ruin", type=float, default=MC_RUIN_PCT, help="Ruin-Schwelle als Anteil des Kapitals")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="PNG mit den Verteilungen")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    tick_cache = {}
+    if args.backtest:
+        if not args.epic or len(args.epic) != 1:
+            raise SystemExit("⚠️ --backtest braucht genau ein --epic")
+        epic = args.epic[0]
+        tick_cache[epic] = load_ticks(epic, tick_dir=args.dir)
+        params = read_parameter_csv(args.params) if args.params else None
+        trades = trades_from_backtest(epic, params, ticks=tick_cache[epic])
+        src = f"Backtest {epic}" + (f" ({args.params})" if args.params else "")
+    else:
+        trades = trades_from_log(args.log, args.epic)
+        src = args.log
+    if not trades:
+        raise SystemExit(f"⚠️ Keine abgeschlossenen Trades ({src})")
+    ctx = tick_context(trades, args.dir, tick_cache)
+    t1 = time.perf_counter()
+    res = simulate(trades, ctx, args.paths, args.seed, args.slip, args.latency, args.capital, args.ruin)
+    t2 = time.perf_counter()
+    print(f"📥 {src}: {len(trades)} Trades ({t1 - t0:.2f}s) → Simulation {t2 - t1:.2f}s")
+    print(summary(res, sum(t["pnl"] for t in trades)))
+    if args.out:
+        plot_distributions(res, args.out, title=f"Monte Carlo: {src}, {args.paths} Pfade")
+        print(f"🖼️ Verteilungen → {args.out}")
@@ -0,0 +1,339 @@
+# optimizer.py – Parametersuche mit Successive Halving (kurze Zeitfenster zuerst, nur Gute kommen weiter)
+#
+# Ein volles Gitter über die _PARAM_KEYS ist unmöglich (13 Achsen à 5 Werte ≈ 10⁹ Sätze). Stattdessen:
+#   1) N Kandidaten zufällig aus SEARCH_SPACE ziehen
+#   2) Stufe 0: alle auf den jüngsten (≥ OPT_MIN_DAYS) Tagen backtesten (batch_eval, viele Sätze pro Durchlauf)
+#   3) die besten 1/OPT_ETA kommen eine Stufe weiter, das Zeitfenster wird OPT_ETA-mal länger
+#      (bei kurzem Archiv weniger Stufen, dafür schärfer gesiebt)
+#   4) letzte Stufe = voller Zeitraum → bester Kandidat → parameter.csv (Format wie load_parameters)
+# Die Sätze einer Stufe werden in Pakete zerlegt und in Worker-Prozessen gerechnet; jeder Worker öffnet
+# den Tick-Store einmal per memmap (read-only, geteilte Seiten). Nach jedem Paket wird der Stand in
+# eine JSON-Datei geschrieben → nach Abbruch einfach denselben Befehl nochmal starten (Resume).
+# Der Stand merkt sich den Datenbereich (t_first/t_last) – neue Ticks im Archiv ändern beim Resume nichts;
+# andere Einstellungen (Suchraum, eta, max_hold, …) verwerfen ihn mit Hinweis, welche.
+# Bewertung pro Stufe: PnL − OPT_DD_WEIGHT · MaxDD, Sätze mit zu wenig Trades fliegen raus.
+#
+# Aufruf:
+#   python optimizer.py --epic GOLD                                → 243 Kandidaten, alle Kerne
+#   python optimizer.py --epic GOLD -n 729 --eta 3 --workers 8 --out parameter_gold.csv
+#   python optimizer.py --epic GOLD --space EMA_FAST=3:8 --space USE_HMA=1    → Bereich/fester Wert
+
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+import batch_eval
+import tradingbot_2 as bot
+from tick_archive import load_ticks
+
+OPT_CANDIDATES = 243                 # Kandidaten in Stufe 0 (Potenz von OPT_ETA → sauberes Halbieren)
+OPT_ETA = 3                          # pro Stufe bleibt 1/ETA übrig, Zeitfenster ×ETA
+OPT_MIN_DAYS = 2.0                   # Zeitfenster der ersten Stufe (jüngste Daten)
+OPT_DD_WEIGHT = 0.5                  # Score = PnL − DD_WEIGHT · MaxDD
+OPT_MIN_TRADES_PER_DAY = 0.5         # darunter zählt der Satz nicht (zu wenig Evidenz)
+OPT_CHUNK = 32                       # Sätze pro Worker-Paket (im Paket läuft batch_eval im Gleichschritt)
+OPT_STATE_FILE = "optimizer_state_{epic}.json"
+OPT_OUT_FILE = "parameter_{epic}.csv"
+
+# (Art, von, bis) – "int"/"float" gleichverteilt, "log" log-gleichverteilt, "bool" 0/1
+SEARCH_SPACE = {
+    "USE_HMA": ("bool", 0, 1),
+    "EMA_FAST": ("int", 3, 20),
+    "EMA_SLOW": ("int", 6, 40),
+    "PULLBACK_NEAR_MA_MAX_DISTANCE_SPREADS": ("float", 0.5, 10.0),
+    "PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS": ("float", 0.0, 12.0),
+    "CONFIRM_MIN_CLOSE_DELTA_SPREADS": ("float", 0.0, 2.0),
+    "REGIME_MIN_DIRECTIONALITY": ("float", 0.0, 0.5),
+    "STOP_LOSS_PCT": ("log", 0.001, 0.01),
+    "TRAILING_STOP_PCT": ("log", 0.001, 0.015),
+    "TAKE_PROFIT_PCT": ("log", 0.002, 0.02),
+    "BREAK_EVEN_STOP_PCT": ("log", 0.001, 0.01),
+    "BREAK_EVEN_BUFFER_PCT": ("float", 0.0, 0.001),
+    "TRAILING_SET_CALM_DOWN": ("float", 0.0, 2.0),
+}
+# TRADE_RISK_PCT / MANUAL_TRADE_SIZE skalieren nur die Größe → nicht optimiert, bleiben wie im Bot
+
+
+# ==============================
+# Suchraum + Kandidaten
+# ==============================
+def parse_space(specs: list, space: dict = None) -> dict:
+    # "KEY=a:b" → Bereich (Art bleibt), "KEY=v" → fester Wert
+    space = dict(space or SEARCH_SPACE)
+    for spec in specs:
+        key, _, vals = spec.partition("=")
+        key = key.strip()
+        if key not in batch_eval.PARAM_KEYS:
+            raise ValueError(f"{key} ist kein Strategie-Parameter")
+        kind = space.get(key, ("float",))[0]
+        if ":" in vals:
+            a, b = vals.split(":")
+            space[key] = (kind, float(a), float(b))
+        else:
+            space[key] = ("fixed", float(vals), float(vals))
+    return space
+
+
+def sample_candidates(space: dict, n: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    cols = {}
+    for key, (kind, lo, hi) in space.items():
+        if kind == "bool":
+            cols[key] = rng.integers(0, 2, n).astype(float)
+        elif kind == "int":
+            cols[key] = rng.integers(int(lo), int(hi) + 1, n).astype(float)
+        elif kind == "log":
+            cols[key] = np.exp(rng.uniform(math.log(lo), math.log(hi), n))
+        elif kind == "fixed":
+            cols[key] = np.full(n, lo)
+        else:
+            cols[key] = rng.uniform(lo, hi, n)
+    if "EMA_FAST" in cols and "EMA_SLOW" in cols:
+        cols["EMA_SLOW"] = np.maximum(cols["EMA_SLOW"], cols["EMA_FAST"] + 1)   # langsam > schnell
+    return [{k: float(cols[k][i]) for k in cols} for i in range(n)]
+
+
+def score(summary: dict, days: float) -> np.ndarray:
+    s = summary["pnl"] - OPT_DD_WEIGHT * summary["max_dd"]
+    return np.where(summary["n_trades"] >= OPT_MIN_TRADES_PER_DAY * days, s, -np.inf)
+
+
+def rung_windows(t_first: int, t_last: int, n: int, eta: int, min_days: float) -> list:
+    # [(t0, t1, Tage)] pro Stufe – Fenster enden alle am Archiv-Ende, die letzte Stufe nimmt alles.
+    # Reicht das Archiv nicht für log_eta(n) Verlängerungen ab min_days, gibt es weniger Stufen
+    # (dafür wird pro Stufe stärker gesiebt, siehe _keep)
+    total_days = (t_last - t_first) / 86_400_000
+    by_n = int(math.floor(math.log(max(n, 1), eta) + 1e-9)) + 1
+    by_data = int(math.floor(math.log(max(total_days / min_days, 1.0), eta) + 1e-9)) + 1
+    n_rungs = max(1, min(by_n, by_data))
+    out = []
+    for r in range(n_rungs):
+        days = total_days / eta ** (n_rungs - 1 - r)
+        out.append((int(t_last - days * 86_400_000), int(t_last) + 1, days))
+    return out
+
+
+def _keep(n_alive: int, n: int, n_rungs: int) -> int:
+    # so viele kommen weiter, dass nach n_rungs-1 Siebungen genau einer übrig ist
+    if n_rungs <= 1:
+        return 1
+    return max(1, int(round(n_alive / n ** (1.0 / (n_rungs - 1)))))
+
+
+# ==============================
+# Worker (ein Tick-Store pro Prozess, memmap)
+# ==============================
+_WORKER = {"ticks": None}
+
+
+def _init_worker(epic: str, tick_dir: str) -> None:
+    _WORKER["ticks"] = load_ticks(epic, update=False, tick_dir=tick_dir)
+
+
+def _eval_chunk(idx: list, rows: list, t0_ms: int, t1_ms: int, max_hold_sec: float) -> tuple:
+    # Exits enden am Fensterende (offen → "END") – keine Ticks nach t1_ms in der Bewertung
+    sets = batch_eval.sets_from_rows(rows)
+    res = batch_eval.evaluate_summary(_WORKER["ticks"], sets, t0_ms, t1_ms, max_hold_sec, exit_cap_ms=t1_ms)
+    return idx, {k: res[k].tolist() for k in batch_eval._SUMMARY_KEYS}
+
+
+# ==============================
+# Stand (Resume)
+# ==============================
+def _load_state(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_state(path: str, state: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _settings(epic: str, space: dict, n: int, eta: int, min_days: float, seed: int, max_hold_sec: float,
+              t0_ms: int, t1_ms: int) -> dict:
+    # alles, was Kandidaten/Fenster/Bewertungen bestimmt – JSON-normalisiert (Tupel → Listen) für den Vergleich
+    return json.loads(json.dumps({
+        "epic": epic, "space": space, "n": n, "eta": eta, "min_days": float(min_days), "seed": seed,
+        "max_hold_sec": float(max_hold_sec), "t0_ms": t0_ms, "t1_ms": t1_ms,
+    }))
+
+
+def _new_state(settings: dict, t_first: int, t_last: int, windows: list) -> dict:
+    return {
+        **settings,
+        "t_first": t_first,
+        "t_last": t_last,
+        "candidates": sample_candidates(settings["space"], settings["n"], settings["seed"]),
+        "rungs": [{"t0": t0, "t1": t1, "days": days, "alive": None, "results": {}} for t0, t1, days in windows],
+    }
+
+
+# ==============================
+# Successive Halving
+# ==============================
+def optimize(epic: str, tick_dir: str = None, t0_ms: int = None, t1_ms: int = None,
+             n: int = OPT_CANDIDATES, eta: int = OPT_ETA, min_days: float = OPT_MIN_DAYS,
+             workers: int = None, state_path: str = None, seed: int = 0, space: dict = None,
+             max_hold_sec: float = batch_eval.BATCH_EVAL_MAX_HOLD_SEC, verbose: bool = True,
+             update: bool = True) -> dict:
+    # Bester Satz im Fenster [t0_ms, t1_ms) (Default: ganzes Archiv); workers=1 → alles im eigenen Prozess
+    # update=False → Tick-Store nur lesen (wenn mehrere Prozesse parallel optimieren)
+    space = space or SEARCH_SPACE
+    workers = workers or os.cpu_count() or 1
+    ticks = load_ticks(epic, update=update, tick_dir=tick_dir)
+    ts = ticks["ts"]
+    if not len(ts):
+        raise ValueError(f"[{epic}] keine Ticks im Archiv")
+    settings = _settings(epic, space, n, eta, min_days, seed, max_hold_sec, t0_ms, t1_ms)
+
+    state = _load_state(state_path) if state_path else None
+    if state is not None:
+        # Resume mit dem gespeicherten Datenbereich (das Archiv wächst weiter, die Fenster nicht)
+        diff = [k for k, v in settings.items() if state.get(k) != v]
+        if not diff and not (int(ts[0]) <= state["t_first"] and state["t_last"] <= int(ts[-1])):
+            diff = ["Archiv (kürzer als beim Start)"]
+        if diff:
+            if verbose:
+                print(f"⚠️ Stand in {state_path} passt nicht ({', '.join(diff)}) → neu")
+            state = None
+    if state is None:
+        t_first = max(int(ts[0]), t0_ms) if t0_ms is not None else int(ts[0])
+        t_last = min(int(ts[-1]), t1_ms - 1) if t1_ms is not None else int(ts[-1])
+        state = _new_state(settings, t_first, t_last, rung_windows(t_first, t_last, n, eta, min_days))
+    elif verbose:
+        done = sum(len(r["results"]) for r in state["rungs"])
+        print(f"↩️ Resume aus {state_path}: {done} Bewertungen vorhanden")
+
+    cands = state["candidates"]
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(epic, tick_dir)) if workers > 1 else None
+    if pool is None:
+        _init_worker(epic, tick_dir)
+    try:
+        alive = list(range(n))
+        for r, rung in enumerate(state["rungs"]):
+            if rung["alive"] is None:
+                rung["alive"] = alive
+            alive = rung["alive"]
+            todo = [i for i in alive if str(i) not in rung["results"]]
+            t_start = time.perf_counter()
+            chunks = [todo[k:k + OPT_CHUNK] for k in range(0, len(todo), OPT_CHUNK)]
+            if pool is not None:
+                # kleinere Pakete, wenn sonst Kerne leer laufen
+                size = max(1, min(OPT_CHUNK, math.ceil(len(todo) / workers)))
+                chunks = [todo[k:k + size] for k in range(0, len(todo), size)]
+                futures = [pool.submit(_eval_chunk, c, [cands[i] for i in c], rung["t0"], rung["t1"], max_hold_sec)
+                           for c in chunks]
+                results = (f.result() for f in as_completed(futures))
+            else:
+                results = (_eval_chunk(c, [cands[i] for i in c], rung["t0"], rung["t1"], max_hold_sec) for c in chunks)
+            for idx, summ in results:
+                for j, i in enumerate(idx):
+                    rung["results"][str(i)] = {k: summ[k][j] for k in batch_eval._SUMMARY_KEYS}
+                if state_path:
+                    _save_state(state_path, state)
+
+            summ = {k: np.array([rung["results"][str(i)][k] for i in alive]) for k in batch_eval._SUMMARY_KEYS}
+            sc = score(summ, rung["days"])
+            order = np.argsort(-sc, kind="stable")
+            keep = _keep(len(alive), n, len(state["rungs"])) if r < len(state["rungs"]) - 1 else 1
+            best = alive[order[0]]
+            if verbose:
+                b = rung["results"][str(best)]
+                print(f"🪜 Stufe {r}: {len(alive)} Sätze × {rung['days']:.1f} Tage ({time.perf_counter() - t_start:.1f}s) "
+                      f"→ weiter {keep} | best #{best} PnL={b['pnl']:.2f} DD={b['max_dd']:.2f} Trades={b['n_trades']}")
+            alive = [alive[j] for j in order[:keep] if np.isfinite(sc[j])] or [best]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best = alive[0]
+    last = state["rungs"][-1]
+    return {
+        "epic": epic,
+        "best": dict(batch_eval.set_row(batch_eval.sets_from_rows([cands[best]]), 0)),
+        "best_index": best,
+        "metrics": last["results"][str(best)],
+        "t0": last["t0"],
+        "t1": last["t1"],
+        "state": state,
+    }
+
+
+# ==============================
+# parameter.csv
+# ==============================
+def _fmt(v) -> str:
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, int):
+        return str(v)
+    return f"{v:.6g}"
+
+
+def write_parameter_csv(params: dict, path: str, comment: str = None) -> None:
+    # Alle _PARAM_KEYS als "KEY;Wert" – nicht optimierte Keys mit dem aktuellen Bot-Wert
+    lines = [f"# {comment}"] if comment else []
+    for k in bot._PARAM_KEYS:
+        lines.append(f"{k};{_fmt(params.get(k, getattr(bot, k)))}")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def read_parameter_csv(path: str) -> dict:
+    # Gegenstück: "KEY;Wert" wie load_parameters (Kommentare/Header/unbekannte Keys ignoriert, letzte Zeile gewinnt)
+    out = {}
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line.startswith("#") or ";" not in line:
+                continue
+            key, value = [p.strip() for p in line.split(";", 1)]
+            if key in bot._PARAM_KEYS:
+                out[key] = bot._cast_like_existing(key, value)
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Parametersuche (Successive Halving) → parameter.csv")
+    ap.add_argument("--epic", required=True)
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("-n", type=int, default=OPT_CANDIDATES, help="Kandidaten in Stufe 0")
+    ap.add_argument("--eta", type=int, default=OPT_ETA)
+    ap.add_argument("--min-days", type=float, default=OPT_MIN_DAYS)
+    ap.add_argument("--workers", type=int, default=None, help="Prozesse (Default: alle Kerne)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--space", action="append", default=[], help="KEY=a:b (Bereich) oder KEY=v (fest)")
+    ap.add_argument("--max-hold", type=float, default=batch_eval.BATCH_EVAL_MAX_HOLD_SEC)
+    ap.add_argument("--state", default=None, help=f"Resume-Datei (Default: {OPT_STATE_FILE})")
+    ap.add_argument("--out", default=None, help=f"Ziel (Default: {OPT_OUT_FILE}; live: {bot.PARAMETER_CSV})")
+    args = ap.parse_args()
+
+    base = args.dir or bot.BASE_DIR
+    state_path = args.state or os.path.join(base, OPT_STATE_FILE.format(epic=args.epic))
+    out_path = args.out or os.path.join(base, OPT_OUT_FILE.format(epic=args.epic))
+    t_start = time.perf_counter()
+    res = optimize(args.epic, args.dir, n=args.n, eta=args.eta, min_days=args.min_days, workers=args.workers,
+                   state_path=state_path, seed=args.seed, space=parse_space(args.space), max_hold_sec=args.max_hold)
+    m = res["metrics"]
+    comment = (f"optimizer.py {args.epic} {datetime.now(bot.LOCAL_TZ):%d.%m.%Y %H:%M} | "
+               f"{(res['t1'] - res['t0']) / 86_400_000:.1f} Tage | PnL={m['pnl']:.2f} MaxDD={m['max_dd']:.2f} "
+               f"Trades={m['n_trades']} Win={m['win_rate'] * 100:.1f}%")
+    write_parameter_csv(res["best"], out_path, comment)
+    print(f"✅ {comment} ({time.perf_counter() - t_start:.1f}s)")
+    print(f"📝 {out_path}")
+    for k in bot._PARAM_KEYS:
+        print(f"  {k} = {_fmt(res['best'].get(k, getattr(bot, k)))}")
@@ -0,0 +1,187 @@
+# regime_labels.py – Regime-Labels (IMPULSE/RUN/FLAT) für JEDEN Tick des Archivs, vektorisiert
+#
+# log_trade_regime klassifiziert nur während eines offenen Trades im Gewinn und druckt das Ergebnis.
+# Hier dieselbe Klassifikation über das ganze Archiv, getrennt für beide Richtungen:
+#   LONG:  Trigger-Preis Bid, Extrem = Hoch   SHORT: Trigger-Preis Ask, Extrem = Tief
+#   secs_since_extreme = Zeit seit dem (ersten) Erreichen des Extrems im Fenster [ts − REGIME_LABEL_LOOKBACK_MS, ts]
+#                        → das, was ein Trade sieht, der vor LOOKBACK eröffnet wurde (trade-lokal: seit Entry)
+#   range_spreads      = Range(Mid) über REGIME_RANGE_WINDOW_MS / Spread (tick_archive.rolling_range, wie _tickring_range)
+#   IMPULSE: since ≤ REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME
+#   FLAT:    since ≥ REGIME_FLAT_MIN_SECS_SINCE_EXTREME und range_spreads ≤ REGIME_FLAT_MAX_RANGE_SPREADS
+#   sonst RUN   (kein Gewinn-Gate – es gibt keinen Entry; 0 = nicht bewertbar, Spread ≤ 0)
+# Gespeichert neben den Ticks (tick_store/{epic}/), gleiche Zeilen wie ts.i8:
+#   since_high.f4, since_low.f4, range_spreads.f4   (teurer Teil, hängt nur an Fenster/Lookback)
+#   regime_long.i1, regime_short.i1                  (billig, wird bei geänderten Schwellen neu abgeleitet)
+#   regime_meta.json                                 (Zeilen, Fenster, Schwellen)
+# Neue Ticks werden inkrementell angehängt (mit Vorlauf für die Fenster). Für Was-wäre-wenn mit anderen
+# Schwellen im Notebook: classify(r["since_high"], r["range_spreads"], imp=5, flat_min=30, flat_range=4).
+#
+# Aufruf:
+#   python regime_labels.py                   → alle Epics im Tick-Archiv labeln/aktualisieren
+#   python regime_labels.py --epic GOLD --full
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import tradingbot_2 as bot
+from tick_archive import list_epics, load_ticks, rolling_argmax, rolling_range, store_path
+
+REGIME_LABEL_LOOKBACK_MS = 300_000   # Fenster für "seit Extrem" (Obergrenze der gemessenen Sekunden)
+REGIME_LABEL_BLOCK = 1 << 22         # neue Ticks pro Rechenblock (Speicher)
+
+_STATE_NONE, _STATE_IMPULSE, _STATE_RUN, _STATE_FLAT = 0, 1, 2, 3
+STATE_NAMES = ("-", "IMPULSE", "RUN", "FLAT")
+_FEATURES = (("since_high", np.float32, "f4"), ("since_low", np.float32, "f4"), ("range_spreads", np.float32, "f4"))
+_LABELS = (("regime_long", np.int8, "i1"), ("regime_short", np.int8, "i1"))
+
+
+# ==============================
+# Klassifikation
+# ==============================
+def classify(since: np.ndarray, range_spreads: np.ndarray, imp: float = None, flat_min: float = None,
+             flat_range: float = None) -> np.ndarray:
+    # Zustandslogik aus log_trade_regime; Schwellen Default = aktuelle Bot-Werte
+    imp = bot.REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME if imp is None else imp
+    flat_min = bot.REGIME_FLAT_MIN_SECS_SINCE_EXTREME if flat_min is None else flat_min
+    flat_range = bot.REGIME_FLAT_MAX_RANGE_SPREADS if flat_range is None else flat_range
+    st = np.where(since <= imp, _STATE_IMPULSE,
+                  np.where((since >= flat_min) & (range_spreads <= flat_range), _STATE_FLAT, _STATE_RUN))
+    return np.where(np.isfinite(range_spreads), st, _STATE_NONE).astype(np.int8)
+
+
+def features(ts: np.ndarray, bid: np.ndarray, ask: np.ndarray, window_ms: int, lookback_ms: int) -> dict:
+    # since_high/since_low (s) + range_spreads für jeden Index
+    ts = np.asarray(ts)
+    bid = np.asarray(bid, dtype=np.float64)
+    ask = np.asarray(ask, dtype=np.float64)
+    i_hi = rolling_argmax(ts, bid, lookback_ms)
+    i_lo = rolling_argmax(ts, -ask, lookback_ms)
+    rmin, rmax = rolling_range(ts, (bid + ask) / 2.0, window_ms)
+    spread = ask - bid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.where(spread > 0, (rmax - rmin) / spread, np.nan)
+    return {
+        "since_high": ((ts - ts[i_hi]) / 1000.0).astype(np.float32),
+        "since_low": ((ts - ts[i_lo]) / 1000.0).astype(np.float32),
+        "range_spreads": rs.astype(np.float32),
+    }
+
+
+# ==============================
+# Store (neben den Ticks)
+# ==============================
+def _thresholds() -> dict:
+    return {
+        "imp": bot.REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME,
+        "flat_min": bot.REGIME_FLAT_MIN_SECS_SINCE_EXTREME,
+        "flat_range": bot.REGIME_FLAT_MAX_RANGE_SPREADS,
+    }
+
+
+def _read_meta(path: str) -> dict:
+    try:
+        with open(os.path.join(path, "regime_meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"rows": 0}
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp = os.path.join(path, "regime_meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "regime_meta.json"))
+
+
+def _append(path: str, cols: tuple, data: dict, truncate_to: int) -> None:
+    for name, dtype, ext in cols:
+        fn = os.path.join(path, f"{name}.{ext}")
+        with open(fn, "r+b" if os.path.exists(fn) else "wb") as f:
+            f.truncate(truncate_to * np.dtype(dtype).itemsize)
+            f.seek(0, os.SEEK_END)
+            np.ascontiguousarray(data[name], dtype=dtype).tofile(f)
+
+
+def update_labels(epic: str, tick_dir: str = None, store_dir: str = None, full: bool = False,
+                  lookback_ms: int = REGIME_LABEL_LOOKBACK_MS) -> int:
+    # Labels für alle noch nicht gelabelten Ticks (mit Vorlauf) → Rückgabe: neu gelabelte Zeilen
+    ticks = load_ticks(epic, tick_dir=tick_dir, store_dir=store_dir)
+    path = store_path(epic, store_dir, tick_dir)
+    n = len(ticks["ts"])
+    window = bot.REGIME_RANGE_WINDOW_MS
+    meta = _read_meta(path)
+    if (full or meta.get("window_ms") != window or meta.get("lookback_ms") != lookback_ms or meta["rows"] > n
+            or (meta["rows"] and int(ticks["ts"][meta["rows"] - 1]) != meta.get("last_ts"))):
+        # neues Fenster / Store neu aufgebaut oder umsortiert → alles neu
+        meta = {"rows": 0}
+    done = meta["rows"]
+    thr = _thresholds()
+
+    for b0 in range(done, n, REGIME_LABEL_BLOCK):
+        # blockweise, mit Vorlauf: alles, was noch in eines der Fenster des ersten Ticks im Block fällt
+        b1 = min(n, b0 + REGIME_LABEL_BLOCK)
+        ctx = int(np.searchsorted(ticks["ts"], int(ticks["ts"][b0]) - max(window, lookback_ms), "left"))
+        f = features(ticks["ts"][ctx:b1], ticks["bid"][ctx:b1], ticks["ask"][ctx:b1], window, lookback_ms)
+        f = {k: v[b0 - ctx:] for k, v in f.items()}
+        _append(path, _FEATURES, f, b0)
+        _append(path, _LABELS, {
+            "regime_long": classify(f["since_high"], f["range_spreads"], **thr),
+            "regime_short": classify(f["since_low"], f["range_spreads"], **thr),
+        }, b0)
+
+    if done and meta.get("thresholds") != thr:
+        # nur Schwellen geändert → Zustände aus den gespeicherten Features neu ableiten
+        r = load_labels(epic, tick_dir, store_dir, rows=n, labels=False)
+        lab = {
+            "regime_long": classify(r["since_high"], r["range_spreads"], **thr),
+            "regime_short": classify(r["since_low"], r["range_spreads"], **thr),
+        }
+        del r                                                  # memmaps zu, bevor die Dateien neu geschrieben werden
+        _append(path, _LABELS, lab, 0)
+
+    _write_meta(path, {"rows": n, "window_ms": window, "lookback_ms": lookback_ms, "thresholds": thr,
+                       "last_ts": int(ticks["ts"][n - 1]) if n else None})
+    return n - done
+
+
+def load_labels(epic: str, tick_dir: str = None, store_dir: str = None, rows: int = None,
+                labels: bool = True) -> dict:
+    # Features (+ Labels) als read-only memmaps, zeilengleich mit load_ticks()
+    path = store_path(epic, store_dir, tick_dir)
+    rows = _read_meta(path)["rows"] if rows is None else rows
+    out = {"epic": epic}
+    for name, dtype, ext in _FEATURES + (_LABELS if labels else ()):
+        fn = os.path.join(path, f"{name}.{ext}")
+        if rows and os.path.isfile(fn):
+            out[name] = np.memmap(fn, dtype=dtype, mode="r", shape=(rows,))
+        else:
+            out[name] = np.empty(0, dtype=dtype)
+    return out
+
+
+def summary(epic: str, lab: dict) -> str:
+    lines = [f"🏷️ [{epic}] {len(lab['regime_long'])} Ticks"]
+    for key, name in (("regime_long", "LONG "), ("regime_short", "SHORT")):
+        c = np.bincount(np.asarray(lab[key]), minlength=4) / max(len(lab[key]), 1) * 100
+        lines.append(f"   {name} " + "  ".join(f"{STATE_NAMES[i]}={c[i]:5.1f}%" for i in (1, 2, 3))
+                     + (f"  (nicht bewertbar {c[0]:.1f}%)" if c[0] else ""))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Regime-Labels für alle Ticks im Archiv")
+    ap.add_argument("--epic", action="append", help="nur diese Epics (Default: alle ticks_*.csv)")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--lookback", type=float, default=REGIME_LABEL_LOOKBACK_MS / 1000, help="Fenster 'seit Extrem' (s)")
+    ap.add_argument("--full", action="store_true", help="alles neu labeln")
+    args = ap.parse_args()
+
+    for epic in args.epic or list_epics(args.dir):
+        t0 = time.perf_counter()
+        added = update_labels(epic, args.dir, full=args.full, lookback_ms=int(args.lookback * 1000))
+        print(f"⏱️ [{epic}] {added} Ticks gelabelt ({time.perf_counter() - t0:.2f}s)")
+        print(summary(epic, load_labels(epic, args.dir)))
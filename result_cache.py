@@ -0,0 +1,227 @@
+# result_cache.py – Disk-Cache für Indikator-Reihen und Backtest-Ergebnisse (inhaltsadressiert)
+#
+# Schlüssel = Hash aus Eingabedaten (Bytes der Arrays) + Parametern + Code-Version. Gleiche Daten und
+# gleiche Parameter → gleicher Schlüssel → Ergebnis kommt von der Platte statt neu gerechnet zu werden,
+# egal ob im selben Lauf, im nächsten Sweep oder nach einem Notebook-Neustart.
+#   result_cache/{version}/{ab}/{schlüssel}.pkl
+# {version} ist ein Hash über den Quelltext der Strategie-Module (CODE_FILES). Ändert sich der Code,
+# ändert sich die Version → alte Einträge werden nie mehr getroffen und beim ersten Zugriff gelöscht.
+# Größenlimit: CACHE_MAX_BYTES, darüber fliegen die am längsten nicht benutzten Einträge raus (LRU über mtime).
+#
+# Aufruf:
+#   python result_cache.py            → Version, Anzahl Einträge, Größe
+#   python result_cache.py --clear    → Cache komplett löschen
+
+import argparse
+import hashlib
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+from tradingbot_2 import BASE_DIR
+
+CACHE_DIR = os.path.join(BASE_DIR, "result_cache")
+CACHE_MAX_BYTES = 2 * 1024 ** 3                       # 2 GB, danach LRU-Eviction
+CACHE_EVICT_TO = 0.8                                  # bei Überlauf auf 80 % des Limits herunter
+CODE_FILES = ("tradingbot_2.py", "tick_archive.py", "exit_resim.py", "batch_eval.py")
+
+_STATE = {
+    "version": None,
+    "bytes": None,          # aktuelle Größe des Versions-Ordners (lazy gezählt)
+    "hits": 0,
+    "misses": 0,
+}
+
+
+# ==============================
+# Code-Version + Schlüssel
+# ==============================
+def code_version() -> str:
+    # Hash über den Quelltext der Strategie-Module – einmal pro Prozess
+    if _STATE["version"] is None:
+        h = hashlib.blake2b(digest_size=8)
+        for name in CODE_FILES:
+            try:
+                with open(os.path.join(BASE_DIR, name), "rb") as f:
+                    h.update(name.encode() + b"\0" + f.read())
+            except FileNotFoundError:
+                h.update(name.encode() + b"\0-")
+        _STATE["version"] = h.hexdigest()
+    return _STATE["version"]
+
+
+def _feed(h, obj) -> None:
+    # stabile Serialisierung für den Hash (Arrays über ihre Bytes, nicht über repr)
+    if isinstance(obj, np.ndarray):
+        a = np.ascontiguousarray(obj)
+        h.update(f"A{a.dtype.str}{a.shape}".encode())
+        h.update(a.data if a.size else b"")
+    elif isinstance(obj, dict):
+        h.update(b"D")
+        for k in sorted(obj):
+            _feed(h, k)
+            _feed(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"L%d" % len(obj))
+        for x in obj:
+            _feed(h, x)
+    elif isinstance(obj, (float, np.floating)):
+        h.update(b"F" + repr(float(obj)).encode())
+    elif isinstance(obj, (bool, np.bool_, int, np.integer)):
+        h.update(b"I" + repr(int(obj)).encode())
+    else:
+        h.update(b"S" + repr(obj).encode())
+
+
+def digest(*parts) -> str:
+    # Inhalts-Hash beliebiger Teile (Arrays, Zahlen, Strings, Listen, Dicts)
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        _feed(h, p)
+    return h.hexdigest()
+
+
+def make_key(kind: str, *parts) -> str:
+    return digest(kind, *parts)
+
+
+# ==============================
+# Lesen / Schreiben
+# ==============================
+def _version_dir(cache_dir: str = None) -> str:
+    return os.path.join(cache_dir or CACHE_DIR, code_version())
+
+
+def _path(key: str, cache_dir: str = None) -> str:
+    return os.path.join(_version_dir(cache_dir), key[:2], key + ".pkl")
+
+
+def _drop_old_versions(cache_dir: str = None) -> None:
+    root = cache_dir or CACHE_DIR
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name != code_version() and os.path.isdir(os.path.join(root, name)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            print(f"🧹 Cache: alte Code-Version {name} gelöscht")
+
+
+def _entries(cache_dir: str = None) -> list:
+    out = []
+    vdir = _version_dir(cache_dir)
+    if not os.path.isdir(vdir):
+        return out
+    for sub in os.scandir(vdir):
+        if not sub.is_dir():
+            continue
+        for e in os.scandir(sub.path):
+            if e.name.endswith(".pkl"):
+                st = e.stat()
+                out.append((st.st_mtime, st.st_size, e.path))
+    return out
+
+
+def _used_bytes(cache_dir: str = None) -> int:
+    if _STATE["bytes"] is None:
+        _drop_old_versions(cache_dir)
+        _STATE["bytes"] = sum(size for _, size, _ in _entries(cache_dir))
+    return _STATE["bytes"]
+
+
+def _evict(cache_dir: str = None, max_bytes: int = None) -> None:
+    limit = max_bytes or CACHE_MAX_BYTES
+    entries = sorted(_entries(cache_dir))                  # älteste Nutzung zuerst
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= limit * CACHE_EVICT_TO:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except FileNotFoundError:
+            pass
+    _STATE["bytes"] = total
+    if removed:
+        print(f"🧹 Cache: {removed} Einträge verdrängt → {total / 1024 ** 2:.1f} MB")
+
+
+_MISS = object()
+
+
+def get(key: str, default=None, cache_dir: str = None):
+    path = _path(key, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        _STATE["misses"] += 1
+        return default
+    except (pickle.UnpicklingError, EOFError, ValueError):
+        # halb geschriebener/kaputter Eintrag → wie nicht vorhanden
+        _STATE["misses"] += 1
+        return default
+    try:
+        os.utime(path)                                     # LRU: zuletzt benutzt = jetzt
+    except OSError:
+        pass
+    _STATE["hits"] += 1
+    return value
+
+
+def put(key: str, value, cache_dir: str = None, max_bytes: int = None) -> None:
+    path = _path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    used = _used_bytes(cache_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)                                  # atomar: Leser sehen nie halbe Dateien
+    _STATE["bytes"] = used + os.path.getsize(path)
+    if _STATE["bytes"] > (max_bytes or CACHE_MAX_BYTES):
+        _evict(cache_dir, max_bytes)
+
+
+def cached(kind: str, parts: tuple, compute, cache_dir: str = None):
+    # Ergebnis von compute() unter Hash(kind, parts, Code-Version) – im Notebook: cached("x", (arr, p), lambda: f(arr, p))
+    key = make_key(kind, *parts)
+    value = get(key, _MISS, cache_dir)
+    if value is _MISS:
+        value = compute()
+        put(key, value, cache_dir)
+    return value
+
+
+def clear(cache_dir: str = None) -> None:
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
+    _STATE["bytes"] = None
+
+
+def stats(cache_dir: str = None) -> dict:
+    entries = _entries(cache_dir)
+    return {
+        "version": code_version(),
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "hits": _STATE["hits"],
+        "misses": _STATE["misses"],
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Disk-Cache für Indikatoren/Backtests")
+    ap.add_argument("--dir", default=None, help="Cache-Ordner (Default: result_cache/ im Bot-Ordner)")
+    ap.add_argument("--clear", action="store_true")
+    args = ap.parse_args()
+
+    if args.clear:
+        clear(args.dir)
+        print(f"🧹 Cache gelöscht: {args.dir or CACHE_DIR}")
+    else:
+        _used_bytes(args.dir)
+        s = stats(args.dir)
+        print(f"📦 Cache {args.dir or CACHE_DIR} | Version {s['version']} | {s['entries']} Einträge | "
+              f"{s['bytes'] / 1024 ** 2:.1f} MB / {CACHE_MAX_BYTES / 1024 ** 2:.0f} MB")
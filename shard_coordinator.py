@@ -0,0 +1,326 @@
+# shard_coordinator.py – verteilt Instrumente (Epics) auf mehrere Bot-Worker (Prozesse / Rechner)
+#
+# Ein Coordinator, N Worker (tradingbot_2 mit SHARD_COORDINATOR=host:port).
+# Protokoll: TCP, eine JSON-Zeile pro Nachricht.
+#
+#   Worker → Coordinator
+#     {"type": "hello", "worker": "w1"}
+#     {"type": "heartbeat", "positions": {epic: {"direction", "dealId"} | null}}
+#     {"type": "risk_acquire", "req": 7, "epic": "ETHUSD"}
+#     {"type": "risk_release", "epic": "ETHUSD"}
+#   Coordinator → Worker
+#     {"type": "assign", "epics": [...], "all_epics": [...]}
+#     {"type": "state", "positions": {...}, "risk": {"open": n, "limit": m}}   (Antwort auf heartbeat)
+#     {"type": "risk_reply", "req": 7, "granted": true|false, "open": n, "limit": m}
+#
+# Risiko-Slot: global höchstens --max-open Positionen über alle Worker. Ein Slot gehört einem Epic,
+# nicht einem Worker → wandert bei Rebalancing mit. Freigabe, sobald der Besitzer das Epic per
+# Heartbeat flat meldet (nach RISK_GRANT_GRACE_SEC, damit Orders im Flug nicht zu früh freigeben).
+#
+# Rebalancing:
+#   - Worker weg (Verbindung zu / kein Heartbeat) → seine Epics gehen an die am wenigsten belasteten Worker
+#   - neuer Worker → flat Epics der am stärksten belasteten Worker werden abgegeben (offene Trades bleiben)
+#
+# Start (lokal, Test):
+#   python shard_coordinator.py --port 8790 --epics ETHUSD,BTCUSD,XRPUSD --max-open 2
+#   SHARD_COORDINATOR=127.0.0.1:8790 SHARD_WORKER_ID=w1 python tradingbot_2.py
+#   SHARD_COORDINATOR=127.0.0.1:8790 SHARD_WORKER_ID=w2 python tradingbot_2.py
+
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import socket
+import threading
+import time
+
+HEARTBEAT_SEC = 1.0          # Worker senden so oft ihren Positionsstand
+DEAD_AFTER_SEC = 5.0         # ohne Heartbeat so lange → Worker gilt als tot
+RISK_GRANT_GRACE_SEC = 10.0  # frisch vergebener Slot bleibt so lange reserviert, auch wenn noch flat gemeldet
+
+
+# ==============================
+# COORDINATOR
+# ==============================
+class ShardCoordinator:
+
+    def __init__(self, epics, max_open: int):
+        self.epics = list(epics)
+        self.max_open = max_open
+        self.workers = {}       # worker_id -> {"writer", "epics": set, "last_seen"}
+        self.owner = {}         # epic -> worker_id
+        self.positions = {}     # epic -> {"direction", "dealId", "worker"} (offene Positionen laut Heartbeat)
+        self.risk_slots = {}    # epic -> Zeitpunkt der Vergabe (time.monotonic())
+
+    # --- Versand
+    def _send(self, worker_id, msg) -> None:
+        w = self.workers.get(worker_id)
+        if not w:
+            return
+        try:
+            w["writer"].write((json.dumps(msg) + "\n").encode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ [COORD] Senden an {worker_id} fehlgeschlagen: {e}")
+
+    def _send_assign(self, worker_id) -> None:
+        epics = sorted(self.workers[worker_id]["epics"])
+        self._send(worker_id, {"type": "assign", "epics": epics, "all_epics": self.epics})
+        print(f"📦 [COORD] {worker_id} ← {epics}")
+
+    # --- Zuteilung
+    def _least_loaded(self):
+        return min(self.workers, key=lambda w: (len(self.workers[w]["epics"]), w))
+
+    def _assign_orphans(self) -> set:
+        changed = set()
+        for epic in self.epics:
+            if self.owner.get(epic) in self.workers:
+                continue
+            if not self.workers:
+                self.owner.pop(epic, None)
+                continue
+            w = self._least_loaded()
+            self.workers[w]["epics"].add(epic)
+            self.owner[epic] = w
+            changed.add(w)
+        return changed
+
+    def _rebalance_for(self, new_worker) -> set:
+        # Neuer Worker: von den vollsten Workern flat Epics abziehen, bis die Last ausgeglichen ist
+        changed = set()
+        while True:
+            donor = max(self.workers, key=lambda w: (len(self.workers[w]["epics"]), w))
+            if len(self.workers[donor]["epics"]) - len(self.workers[new_worker]["epics"]) <= 1:
+                break
+            movable = sorted(e for e in self.workers[donor]["epics"] if e not in self.positions and e not in self.risk_slots)
+            if not movable:
+                break
+            epic = movable[0]
+            self.workers[donor]["epics"].discard(epic)
+            self.workers[new_worker]["epics"].add(epic)
+            self.owner[epic] = new_worker
+            changed.update((donor, new_worker))
+        return changed
+
+    def _drop_worker(self, worker_id, why: str) -> None:
+        w = self.workers.pop(worker_id, None)
+        if not w:
+            return
+        print(f"💀 [COORD] Worker {worker_id} weg ({why}) → verteile {sorted(w['epics'])} neu")
+        try:
+            w["writer"].close()
+        except Exception:
+            pass
+        for wid in self._assign_orphans():
+            self._send_assign(wid)
+
+    # --- Risiko
+    def _open_count(self) -> int:
+        return len(set(self.positions) | set(self.risk_slots))
+
+    def _risk_acquire(self, worker_id, epic) -> bool:
+        if self.owner.get(epic) != worker_id:
+            return False
+        if epic in self.positions or epic in self.risk_slots:
+            return True  # Slot gehört dem Epic schon
+        if self._open_count() >= self.max_open:
+            return False
+        self.risk_slots[epic] = time.monotonic()
+        return True
+
+    def _apply_heartbeat(self, worker_id, positions: dict) -> None:
+        now = time.monotonic()
+        for epic in self.workers[worker_id]["epics"]:
+            pos = positions.get(epic)
+            if pos:
+                self.positions[epic] = {**pos, "worker": worker_id}
+                self.risk_slots.pop(epic, None)   # Position ist bestätigt → Slot = Position
+            else:
+                self.positions.pop(epic, None)
+                granted = self.risk_slots.get(epic)
+                if granted is not None and now - granted > RISK_GRANT_GRACE_SEC:
+                    self.risk_slots.pop(epic, None)
+
+    def _risk_view(self) -> dict:
+        return {"open": self._open_count(), "limit": self.max_open}
+
+    # --- Verbindung pro Worker
+    async def handle(self, reader, writer) -> None:
+        worker_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                kind = msg.get("type")
+
+                if kind == "hello":
+                    worker_id = str(msg.get("worker"))
+                    if worker_id in self.workers:
+                        self._drop_worker(worker_id, "neu verbunden")
+                    self.workers[worker_id] = {"writer": writer, "epics": set(), "last_seen": time.monotonic()}
+                    print(f"👋 [COORD] Worker {worker_id} verbunden ({len(self.workers)} aktiv)")
+                    changed = self._assign_orphans() | self._rebalance_for(worker_id) | {worker_id}
+                    for wid in changed:
+                        self._send_assign(wid)
+                    continue
+
+                if worker_id not in self.workers:
+                    continue
+                self.workers[worker_id]["last_seen"] = time.monotonic()
+
+                if kind == "heartbeat":
+                    self._apply_heartbeat(worker_id, msg.get("positions") or {})
+                    self._send(worker_id, {"type": "state", "positions": self.positions, "risk": self._risk_view()})
+                elif kind == "risk_acquire":
+                    granted = self._risk_acquire(worker_id, msg.get("epic"))
+                    self._send(worker_id, {"type": "risk_reply", "req": msg.get("req"), "granted": granted, **self._risk_view()})
+                    print(f"🎟️ [COORD] Risk-Slot {msg.get('epic')} für {worker_id}: {'OK' if granted else 'abgelehnt'} ({self._open_count()}/{self.max_open})")
+                elif kind == "risk_release":
+                    epic = msg.get("epic")
+                    if self.owner.get(epic) == worker_id and epic not in self.positions:
+                        self.risk_slots.pop(epic, None)
+        except (ConnectionError, json.JSONDecodeError) as e:
+            print(f"⚠️ [COORD] Verbindung {worker_id}: {e}")
+        finally:
+            if worker_id is not None and self.workers.get(worker_id, {}).get("writer") is writer:
+                self._drop_worker(worker_id, "Verbindung beendet")
+
+    async def reaper(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SEC)
+            now = time.monotonic()
+            for wid, w in list(self.workers.items()):
+                if now - w["last_seen"] > DEAD_AFTER_SEC:
+                    self._drop_worker(wid, f"kein Heartbeat seit {now - w['last_seen']:.1f}s")
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🧭 [COORD] auf {host}:{port} | Epics={self.epics} | global max. {self.max_open} offene Positionen")
+        asyncio.create_task(self.reaper())
+        async with server:
+            await server.serve_forever()
+
+
+# ==============================
+# WORKER-CLIENT (läuft im Bot als Thread, blockierende Sockets wie die REST-Aufrufe;
+# Risk-Anfragen liefern Futures → der Event-Loop wartet nie blockierend)
+# ==============================
+class ShardClient:
+
+    def __init__(self, address: str, worker_id: str, on_assign, get_positions):
+        host, _, port = address.rpartition(":")
+        self.addr = (host or "127.0.0.1", int(port))
+        self.worker_id = worker_id
+        self.on_assign = on_assign          # callback(epics, all_epics) – aus dem Client-Thread
+        self.get_positions = get_positions  # callback() -> {epic: {...} | None}
+        self.global_positions = {}
+        self.risk = {"open": None, "limit": None}
+        self.connected = False
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._req_ids = itertools.count(1)
+        self._pending = {}                  # req -> concurrent.futures.Future (→ bool granted)
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="shard-client", daemon=True).start()
+
+    def _send(self, msg) -> None:
+        with self._send_lock:
+            self._sock.sendall((json.dumps(msg) + "\n").encode("utf-8"))
+
+    def _run(self) -> None:
+        delay = 0.5
+        while True:
+            try:
+                self._sock = socket.create_connection(self.addr, timeout=DEAD_AFTER_SEC)
+                self._sock.settimeout(None)
+                self._send({"type": "hello", "worker": self.worker_id})
+                self.connected = True
+                delay = 0.5
+                print(f"🧭 [SHARD] verbunden mit Coordinator {self.addr[0]}:{self.addr[1]} als {self.worker_id}")
+                threading.Thread(target=self._heartbeat_loop, args=(self._sock,), daemon=True).start()
+                for line in self._sock.makefile("r", encoding="utf-8"):
+                    self._handle(json.loads(line))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [SHARD] Coordinator-Verbindung: {e}")
+            self.connected = False
+            for req in list(self._pending):
+                self._resolve(req, None)  # wartende Risk-Anfragen → abgelehnt
+            time.sleep(delay)
+            delay = min(10.0, delay * 2)
+
+    def _heartbeat_loop(self, sock) -> None:
+        while self.connected and self._sock is sock:
+            try:
+                self._send({"type": "heartbeat", "positions": self.get_positions()})
+            except OSError:
+                return
+            time.sleep(HEARTBEAT_SEC)
+
+    def _handle(self, msg) -> None:
+        kind = msg.get("type")
+        if kind == "assign":
+            self.on_assign(msg.get("epics") or [], msg.get("all_epics") or [])
+        elif kind == "state":
+            self.global_positions = msg.get("positions") or {}
+            self.risk = msg.get("risk") or self.risk
+        elif kind == "risk_reply":
+            self._resolve(msg.get("req"), msg)
+
+    def _resolve(self, req, reply) -> None:
+        fut = self._pending.pop(req, None)
+        if reply:
+            self.risk = {"open": reply.get("open"), "limit": reply.get("limit")}
+        if fut is not None and not fut.done():   # abgelaufene/abgebrochene Anfragen ignorieren
+            fut.set_result(bool((reply or {}).get("granted")))
+
+    def risk_request(self, epic: str) -> concurrent.futures.Future:
+        # Nicht blockierend: Future → True/False, sobald der Coordinator antwortet (Verbindungsabbruch → False).
+        # Im Event-Loop: await asyncio.wrap_future(client.risk_request(epic)) mit eigenem Timeout.
+        fut = concurrent.futures.Future()
+        if not self.connected:
+            fut.set_result(False)
+            return fut
+        req = next(self._req_ids)
+        self._pending[req] = fut
+        fut.add_done_callback(lambda _f: self._pending.pop(req, None))
+        try:
+            self._send({"type": "risk_acquire", "req": req, "epic": epic})
+        except OSError:
+            self._resolve(req, None)
+        return fut
+
+    def risk_acquire(self, epic: str, timeout: float = 1.0) -> bool:
+        # Blockierend (nur außerhalb des Event-Loops); ohne Coordinator oder bei Timeout → False
+        # (lieber kein Trade als Limit-Verletzung)
+        fut = self.risk_request(epic)
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            return False
+
+    def risk_release(self, epic: str) -> None:
+        try:
+            if self.connected:
+                self._send({"type": "risk_release", "epic": epic})
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Shard-Coordinator: Epics auf Bot-Worker verteilen, globales Risiko-Limit")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--epics", required=True, help="kommagetrennt, z. B. ETHUSD,BTCUSD,XRPUSD")
+    ap.add_argument("--max-open", type=int, default=1, help="global max. gleichzeitig offene Positionen")
+    args = ap.parse_args()
+
+    coord = ShardCoordinator([e.strip() for e in args.epics.split(",") if e.strip()], args.max_open)
+    try:
+        asyncio.run(coord.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,61 @@
+# conftest.py – gemeinsame Fixtures für die Paritätstests der Offline-Werkzeuge
+#
+# Die Offline-Tools (exit_resim, trade_excursions, regime_labels, tick_archive) bilden Live-Logik aus
+# tradingbot_2 vektorisiert nach. Die Tests vergleichen beide Seiten auf einem synthetischen Tick-Archiv,
+# damit Strategie-Änderungen im Bot nicht unbemerkt an den Offline-Werkzeugen vorbeilaufen.
+#
+# Aufruf:
+#   python -m pytest -q
+
+import os
+import sys
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+TEST_EPIC = "TEST"
+TEST_TICKS = 60_000
+TEST_T0_MS = 1_760_000_000_000
+
+
+def make_ticks(n: int = TEST_TICKS, seed: int = 1):
+    # Random Walk mit unregelmäßigen Abständen (50–400 ms) und wechselndem Spread → (ts, bid, ask)
+    rng = np.random.default_rng(seed)
+    ts = TEST_T0_MS + np.cumsum(rng.integers(50, 400, n))
+    bid = np.round(3000 + np.cumsum(rng.normal(0, 0.25, n)), 2)
+    ask = np.round(bid + rng.choice([0.3, 0.5, 0.6], n), 2)
+    return ts, bid, ask
+
+
+def write_csv(path: str, ts, bid, ask, mode: str = "w") -> None:
+    # Format wie der Bot: "ts_ms;bid;ask" pro Zeile
+    with open(path, mode) as f:
+        f.writelines(f"{a};{b:.2f};{c:.2f}\n" for a, b, c in zip(ts, bid, ask))
+
+
+@pytest.fixture(scope="session")
+def tick_dir(tmp_path_factory):
+    # Ordner mit ticks_TEST.csv (Store wird beim ersten load_ticks daneben angelegt)
+    d = tmp_path_factory.mktemp("ticks")
+    write_csv(os.path.join(d, f"ticks_{TEST_EPIC}.csv"), *make_ticks())
+    return str(d)
+
+
+@pytest.fixture(scope="session")
+def ticks(tick_dir):
+    from tick_archive import load_ticks
+    return load_ticks(TEST_EPIC, tick_dir=tick_dir)
+
+
+@pytest.fixture
+def quiet_bot(monkeypatch):
+    # Bot-Modul ohne Konsolen-Ausgabe und mit leerem Positions-/Tick-Zustand
+    import tradingbot_2 as bot
+    monkeypatch.setattr(bot, "print", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(bot, "open_positions", {})
+    monkeypatch.setattr(bot, "TICK_RING", {})
+    monkeypatch.setattr(bot, "_last_close_ts", {})
+    return bot
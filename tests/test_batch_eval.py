@@ -0,0 +1,57 @@
+# Parität: batch_eval.evaluate_signals (alle Sätze im Gleichschritt) gegen evaluate_trend_signal (Close-only-Replay)
+
+from collections import deque
+
+import numpy as np
+
+import batch_eval as be
+
+_AXES = {
+    "USE_HMA": np.array([0.0, 1.0]),
+    "EMA_FAST": np.array([3.0, 5.0]),
+    "EMA_SLOW": np.array([7.0, 12.0]),
+    "CONFIRM_MIN_CLOSE_DELTA_SPREADS": np.array([0.1, 0.6]),
+    "PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS": np.array([0.5, 2.0]),
+}
+
+
+def _replay(bot, candles, row, monkeypatch):
+    # Live-Funktion Candle für Candle mit den Entry-Parametern eines Satzes
+    for k, v in row.items():
+        if k in be.ENTRY_KEYS:
+            monkeypatch.setattr(bot, k, v)
+    bot._TREND_STATE.pop("_test", None)
+    hist = deque(maxlen=200)
+    out = []
+    for t, (mid, spread) in enumerate(zip(candles["mid"].tolist(), candles["spread"].tolist())):
+        hist.append(mid)
+        s = bot.evaluate_trend_signal("_test", list(hist), spread)
+        if s.startswith("BEREIT: BUY"):
+            out.append((t, 1))
+        elif s.startswith("BEREIT: SELL"):
+            out.append((t, -1))
+    return out
+
+
+def test_evaluate_signals_matches_evaluate_trend_signal(quiet_bot, ticks, monkeypatch):
+    bot = quiet_bot
+    monkeypatch.setattr(bot, "_TREND_STATE", {})
+    candles = be.build_candles(ticks)
+    sets = be.make_sets(_AXES)
+    sig = be.evaluate_signals(candles, sets, use_cache=False)
+    total = 0
+    for p in range(len(sets["EMA_FAST"])):
+        ref = _replay(bot, candles, be.set_row(sets, p), monkeypatch)
+        mine = sorted((int(t), int(d)) for t, s, d in zip(sig["t"], sig["set"], sig["dir"]) if s == p)
+        assert mine == ref, p
+        total += len(ref)
+    assert total > 0 and set(sig["dir"].tolist()) == {-1, 1}
+
+
+def test_build_candles_close_is_last_tick_of_minute(ticks):
+    c = be.build_candles(ticks)
+    ts = np.asarray(ticks["ts"])
+    for i in (0, c["n"] // 2, c["n"] - 1):
+        k = np.searchsorted(ts, c["close_ms"][i], "left") - 1     # letzter Tick vor der Minutengrenze
+        assert c["close_bid"][i] == ticks["bid"][k] and c["close_ask"][i] == ticks["ask"][k]
+        assert c["close_ms"][i] - 60_000 <= ts[k] < c["close_ms"][i]
@@ -0,0 +1,122 @@
+# REST-Schicht: Single-Flight, Kurz-Cache, Generation bei Schreibzugriffen, Token-Bucket (Thread vs. Event-Loop)
+
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+URL = "https://example.invalid/api/v1"
+
+
+class _Resp:
+    status_code = 200
+
+
+@pytest.fixture
+def rest(quiet_bot, monkeypatch):
+    bot = quiet_bot
+    calls = []
+    fake = {"delay": 0.0, "exc": None}
+
+    def _send(method):
+        def _call(url, **kwargs):
+            calls.append((method, url))
+            time.sleep(fake["delay"])
+            if fake["exc"] is not None:
+                raise fake["exc"]
+            return _Resp()
+        return _call
+
+    monkeypatch.setattr(bot, "requests", types.SimpleNamespace(get=_send("GET"), post=_send("POST"),
+                                                               delete=_send("DELETE")))
+    monkeypatch.setattr(bot, "_REST", dict(bot._REST, buckets={}, inflight={}, cache={}, gen=0, by_endpoint={},
+                                           stats=dict.fromkeys(bot._REST["stats"], 0)))
+    monkeypatch.setattr(bot, "REST_BUDGETS", {"*": (1000.0, 1000)})
+    monkeypatch.setattr(bot, "REST_CACHE_TTL", {"GET /positions": 0.5})
+    return bot, calls, fake
+
+
+def test_endpoint_names():
+    import tradingbot_2 as bot
+    assert bot._rest_endpoint("GET", f"{URL}/positions") == "GET /positions"
+    assert bot._rest_endpoint("DELETE", f"{URL}/positions/DEAL1") == "DELETE /positions/*"
+    assert bot._rest_endpoint("GET", f"{URL}/markets/ETHUSD?x=1") == "GET /markets/*"
+
+
+def _parallel(n, fn):
+    out, errs = [], []
+    barrier = threading.Barrier(n)
+
+    def run():
+        barrier.wait()
+        try:
+            out.append(fn())
+        except Exception as e:
+            errs.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return out, errs
+
+
+def test_identical_gets_share_one_request(rest):
+    bot, calls, fake = rest
+    fake["delay"] = 0.2
+    out, errs = _parallel(5, lambda: bot.broker_request("GET", f"{URL}/markets/ETHUSD", headers={"CST": "c"}))
+    assert not errs and len(calls) == 1 and len({id(r) for r in out}) == 1
+    assert bot.rest_stats()["saved_singleflight"] == 4
+
+
+def test_single_flight_shares_the_error(rest):
+    bot, calls, fake = rest
+    fake["delay"], fake["exc"] = 0.2, ConnectionError("reset")
+    out, errs = _parallel(3, lambda: bot.broker_request("GET", f"{URL}/markets/ETHUSD", headers={"CST": "c"}))
+    assert len(calls) == 1 and len(errs) == 3 and all(isinstance(e, ConnectionError) for e in errs)
+    assert not bot._REST["inflight"]
+
+
+def test_cache_ttl_and_write_invalidates(rest):
+    bot, calls, fake = rest
+    get = lambda: bot.broker_request("GET", f"{URL}/positions", headers={"CST": "c"})
+    r1 = get()
+    assert get() is r1 and len(calls) == 1                     # innerhalb der TTL aus dem Cache
+    bot.broker_request("DELETE", f"{URL}/positions/D1", headers={"CST": "c"})
+    assert get() is not r1 and len(calls) == 3                 # Schreibzugriff → Cache veraltet
+    bot.broker_request("GET", f"{URL}/markets/ETHUSD", headers={"CST": "c"})
+    bot.broker_request("GET", f"{URL}/markets/ETHUSD", headers={"CST": "c"})
+    assert len(calls) == 5                                      # ohne TTL kein Cache
+    assert bot.rest_stats()["saved_cache"] == 1
+
+
+def test_worker_thread_waits_for_budget(rest, monkeypatch):
+    bot, calls, fake = rest
+    monkeypatch.setattr(bot, "REST_BUDGETS", {"*": (20.0, 2)})
+    t0 = time.monotonic()
+    for k in range(4):
+        bot.broker_request("POST", f"{URL}/positions", headers={"CST": "c"})
+    assert time.monotonic() - t0 >= 0.09                        # 2 Burst + 2 × 1/20 s
+    st = bot.rest_stats()
+    assert st["sent"] == 4 and st["throttled"] == 2
+
+
+def test_event_loop_never_sleeps_for_budget(rest, monkeypatch):
+    bot, calls, fake = rest
+    monkeypatch.setattr(bot, "REST_BUDGETS", {"*": (0.01, 1)})
+    monkeypatch.setattr(bot, "REST_LOOP_OVERDRAFT", 2.0)
+
+    async def main():
+        t0 = time.monotonic()
+        for k in range(3):                                      # 1 Burst + 2 vorgezogen
+            bot.broker_request("DELETE", f"{URL}/positions/D{k}", headers={"CST": "c"})
+        with pytest.raises(bot.RestThrottled):
+            bot.broker_request("DELETE", f"{URL}/positions/D9", headers={"CST": "c"})
+        return time.monotonic() - t0
+
+    assert asyncio.run(main()) < 0.05
+    st = bot.rest_stats()
+    assert st["sent"] == 3 and st["loop_overdraft"] == 2 and st["loop_rejected"] == 1
@@ -0,0 +1,85 @@
+# Parität: exit_resim.simulate_exits gegen check_protection_rules, Tick für Tick
+
+from collections import deque
+
+import numpy as np
+
+import exit_resim as er
+from conftest import TEST_EPIC
+from tick_archive import tick_slice
+
+_AXES = {
+    "STOP_LOSS_PCT": np.array([0.001, 0.006]),
+    "TAKE_PROFIT_PCT": np.array([0.0008, 0.05]),
+    "TRAILING_STOP_PCT": np.array([0.0003, 0.01]),
+    "TIGHTEN_FACTOR": np.array([0.5]),
+    "REGIME_FLAT_MAX_RANGE_SPREADS": np.array([6.0, 30.0]),
+}
+
+
+def _trades(ticks, n=16, seed=5):
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in rng.integers(1000, len(ticks["ts"]) - 10_000, n):
+        direction = str(rng.choice(["BUY", "SELL"]))
+        entry = float(ticks["ask"][i] if direction == "BUY" else ticks["bid"][i])
+        out.append({"epic": TEST_EPIC, "direction": direction, "open_ms": int(ticks["ts"][i]), "entry": entry,
+                    "size": 1.0})
+    return out
+
+
+def _live_exit(bot, ticks, path, closed):
+    # Live-Pfad: Position anlegen, Tick-Ring mit Vorlauf füllen, check_protection_rules pro Tick
+    t = path["trade"]
+    pos = {"direction": t["direction"], "dealId": "X", "entry_price": t["entry"], "size": 1.0,
+           "trailing_stop": bot._initial_trailing(t["direction"], t["entry"]) if bot.OPTIMISTIC_OPEN else None}
+    bot.open_positions[TEST_EPIC] = pos
+    ring = bot.TICK_RING[TEST_EPIC] = deque(maxlen=10 ** 6)
+    pre = tick_slice(ticks, t["open_ms"] - bot.REGIME_RANGE_WINDOW_MS, t["open_ms"])
+    for a in range(pre.start, pre.stop):
+        ring.append((int(ticks["ts"][a]), (ticks["bid"][a] + ticks["ask"][a]) / 2))
+    bot._last_close_ts.clear()
+    closed.clear()
+    for j in range(len(path["ts"])):
+        b, a, tt = float(path["bid"][j]), float(path["ask"][j]), int(path["ts"][j])
+        pos["last_tick_ms"] = tt
+        ring.append((tt, (b + a) / 2))
+        bot.check_protection_rules(TEST_EPIC, b, a, a - b, None, None, log_regime=False)
+        if closed:
+            return j, pos["last_close_reason"].split("|")[0]
+    return None
+
+
+def test_simulate_exits_matches_check_protection_rules(quiet_bot, ticks, tick_dir, monkeypatch):
+    bot = quiet_bot
+    closed = []
+    monkeypatch.setattr(bot, "safe_close", lambda *a, **k: closed.append(1))
+    paths = er.build_paths(_trades(ticks), 900, tick_cache={TEST_EPIC: ticks}, tick_dir=tick_dir)
+    grid = er.make_grid(_AXES)
+    res = er.simulate_exits(paths, grid)
+
+    for p in range(len(grid["STOP_LOSS_PCT"])):
+        for k in er.EXIT_KEYS:
+            cur = getattr(bot, k)
+            monkeypatch.setattr(bot, k, bool(grid[k][p]) if isinstance(cur, bool) else type(cur)(grid[k][p]))
+        for i, path in enumerate(paths):
+            live = _live_exit(bot, ticks, path, closed)
+            reason = int(res["reason"][i, p])
+            if live is None:
+                assert reason == er.REASON_END, (i, p)
+            else:
+                assert er.REASON_NAMES[reason] == live[1], (i, p)
+                assert res["exit_ms"][i, p] == path["ts"][live[0]], (i, p)
+    # der Vergleich soll alle Exit-Arten abdecken
+    for reason in (er.REASON_STOP, er.REASON_TP, er.REASON_END):
+        assert (res["reason"] == reason).any(), er.REASON_NAMES[reason]
+
+
+def test_end_cap(ticks, tick_dir):
+    # end_ms schneidet den Pfad vor dem Cap ab → kein Tick ab end_ms im Pfad
+    t = _trades(ticks, n=1)[0]
+    end_ms = t["open_ms"] + 60_000
+    (path,) = er.build_paths([t], 900, tick_cache={TEST_EPIC: ticks}, tick_dir=tick_dir, end_ms=end_ms)
+    sl = tick_slice(ticks, t["open_ms"], end_ms)
+    assert path["ts"][-1] < end_ms
+    assert len(path["ts"]) == sl.stop - sl.start
@@ -0,0 +1,59 @@
+# Dual-Feed: First-Arrival-Deduplizierung und Statistik pro Verbindung
+
+import pytest
+
+
+@pytest.fixture
+def feed(quiet_bot, monkeypatch):
+    bot = quiet_bot
+    monkeypatch.setattr(bot, "FEED_CONNECTIONS", 2)
+    monkeypatch.setattr(bot, "FEED_DEDUP_WINDOW", 3)
+    monkeypatch.setattr(bot, "_FEED", dict(bot._FEED, live=set(), seen={}, seen_order={}, stats={}))
+    return bot
+
+
+def test_first_copy_wins_second_is_dropped(feed):
+    bot = feed
+    q = ("ETHUSD", 100.0, 100.5, 1_760_000_000_000)
+    assert bot._feed_accept_quote(2, *q) is True
+    assert bot._feed_accept_quote(1, *q) is False
+    st = bot.feed_stats()
+    assert st[2]["win_pct"] == 100.0 and st[2]["dups"] == 0
+    assert st[1]["win_pct"] == 0.0 and st[1]["dups"] == 1 and st[1]["avg_lag_ms"] >= 0.0
+
+
+def test_key_is_per_epic_and_full_quote(feed):
+    bot = feed
+    ts = 1_760_000_000_000
+    assert bot._feed_accept_quote(1, "ETHUSD", 100.0, 100.5, ts)
+    assert bot._feed_accept_quote(2, "BTCUSD", 100.0, 100.5, ts)       # anderes Epic
+    assert bot._feed_accept_quote(2, "ETHUSD", 100.0, 100.6, ts)       # anderer Ask
+    assert bot._feed_accept_quote(2, "ETHUSD", 100.0, 100.5, ts + 1)   # anderer Zeitstempel
+
+
+def test_window_evicts_oldest_key(feed):
+    bot = feed
+    ts = 1_760_000_000_000
+    for k in range(4):                                                  # Fenster = 3 → ts verdrängt
+        assert bot._feed_accept_quote(1, "ETHUSD", 100.0, 100.5, ts + k)
+    assert len(bot._FEED["seen"]["ETHUSD"]) == 3
+    assert bot._feed_accept_quote(2, "ETHUSD", 100.0, 100.5, ts) is True
+    assert bot._feed_accept_quote(2, "ETHUSD", 100.0, 100.5, ts + 3) is False
+
+
+def test_single_feed_skips_dedup(feed, monkeypatch):
+    bot = feed
+    monkeypatch.setattr(bot, "FEED_CONNECTIONS", 1)
+    q = ("ETHUSD", 100.0, 100.5, 1_760_000_000_000)
+    assert bot._feed_accept_quote(1, *q) and bot._feed_accept_quote(1, *q)
+    assert not bot._FEED["seen"]
+
+
+def test_failover_keeps_feed_live_until_last_connection_drops(feed, monkeypatch):
+    bot = feed
+    monkeypatch.setattr(bot, "_RECONNECT", dict(bot._RECONNECT, state="LIVE", down_since=None))
+    bot._FEED["live"].update({1, 2})
+    bot._feed_conn_down(1, "recv timeout")
+    assert bot._FEED["live"] == {2} and bot._RECONNECT["state"] == "LIVE"
+    bot._feed_conn_down(2, "recv timeout")
+    assert bot._RECONNECT["state"] == "DOWN" and bot._RECONNECT["down_reason"] == "recv timeout"
@@ -0,0 +1,99 @@
+# Optimizer: Resume aus der Stand-Datei (nur fehlende Bewertungen), geänderte Einstellungen / kürzeres Archiv → neu
+
+import json
+import os
+
+import pytest
+
+import optimizer as opt
+import result_cache
+from conftest import TEST_EPIC, make_ticks, write_csv
+
+_KW = {"n": 9, "eta": 3, "min_days": 0.005, "workers": 1, "max_hold_sec": 1800, "verbose": False}
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch, quiet_bot):
+    # eigenes, veränderbares Archiv + Zähler für die bewerteten Sätze
+    monkeypatch.setattr(result_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    ts, bid, ask = make_ticks(40_000, seed=21)
+    csv = str(tmp_path / f"ticks_{TEST_EPIC}.csv")
+    write_csv(csv, ts[:30_000], bid[:30_000], ask[:30_000])
+    evaluated = []
+    real = opt._eval_chunk
+
+    def _counting(idx, rows, t0_ms, *a, **k):
+        evaluated.extend((t0_ms, i) for i in idx)
+        return real(idx, rows, t0_ms, *a, **k)
+
+    monkeypatch.setattr(opt, "_eval_chunk", _counting)
+    return {"dir": str(tmp_path), "csv": csv, "rest": (ts[30_000:], bid[30_000:], ask[30_000:]),
+            "state": str(tmp_path / "state.json"), "evaluated": evaluated}
+
+
+def _run(a, **kw):
+    a["evaluated"].clear()
+    return opt.optimize(TEST_EPIC, a["dir"], state_path=a["state"], **{**_KW, **kw})
+
+
+def _rung0(a, res) -> list:
+    # in Stufe 0 bewertete Kandidaten dieses Laufs
+    t0 = res["state"]["rungs"][0]["t0"]
+    return sorted(i for t, i in a["evaluated"] if t == t0)
+
+
+def _interrupt(a, keep_rungs: int) -> None:
+    # Stand wie nach einem Abbruch: spätere Stufen ohne Ergebnisse
+    with open(a["state"]) as f:
+        st = json.load(f)
+    for rung in st["rungs"][keep_rungs:]:
+        rung["alive"], rung["results"] = None, {}
+    with open(a["state"], "w") as f:
+        json.dump(st, f)
+
+
+def test_resume_evaluates_only_missing(archive):
+    first = _run(archive)
+    n_total = len(archive["evaluated"])
+    assert len(first["state"]["rungs"]) == 3 and n_total > _KW["n"]
+    _interrupt(archive, keep_rungs=1)
+    again = _run(archive)
+    assert len(archive["evaluated"]) == n_total - _KW["n"]          # Stufe 0 kommt aus der Datei
+    assert again["best"] == first["best"] and again["metrics"] == first["metrics"]
+
+
+def test_resume_keeps_windows_when_archive_grew(archive):
+    first = _run(archive)
+    write_csv(archive["csv"], *archive["rest"], mode="a")
+    _interrupt(archive, keep_rungs=2)
+    again = _run(archive)
+    assert again["t1"] == first["t1"] and again["best"] == first["best"]
+    assert len(archive["evaluated"]) == len(first["state"]["rungs"][-1]["alive"])    # nur die letzte Stufe
+    assert _rung0(archive, again) == []
+
+
+def test_changed_settings_start_over(archive):
+    _run(archive)
+    again = _run(archive, seed=1)
+    assert _rung0(archive, again) == list(range(_KW["n"]))
+    with open(archive["state"]) as f:
+        assert json.load(f)["seed"] == 1
+
+
+def test_shorter_archive_starts_over(archive):
+    first = _run(archive)
+    ts, bid, ask = make_ticks(20_000, seed=21)                      # CSV rotiert/gekürzt → Store neu
+    write_csv(archive["csv"], ts, bid, ask)
+    again = _run(archive)
+    assert again["t1"] < first["t1"]
+    assert _rung0(archive, again) == list(range(_KW["n"]))
+
+
+def test_parameter_csv_roundtrip(tmp_path, quiet_bot):
+    bot = quiet_bot
+    params = {"EMA_FAST": 4, "STOP_LOSS_PCT": 0.0025, "USE_HMA": True}
+    path = str(tmp_path / "parameter.csv")
+    opt.write_parameter_csv(params, path, comment="test")
+    back = opt.read_parameter_csv(path)
+    assert set(back) == set(bot._PARAM_KEYS)
+    assert back["EMA_FAST"] == 4 and back["STOP_LOSS_PCT"] == 0.0025 and back["USE_HMA"] is True
@@ -0,0 +1,122 @@
+# Optimistisches Open: pending-Registrierung, Confirm-Abgleich, close_on_confirm
+
+import asyncio
+
+import pytest
+
+EPIC = "ETHUSD"
+
+
+class _Resp:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def broker(quiet_bot, monkeypatch):
+    # Broker-Attrappe: Order-POST liefert eine dealReference, Confirms/Positionen kommen aus Listen
+    bot = quiet_bot
+    b = {"confirms": [], "positions": [], "closes": [], "logged": []}
+
+    def _fetch_confirm(CST, XSEC, ref):
+        return b["confirms"].pop(0) if b["confirms"] else None
+
+    def _get_positions(CST, XSEC, retry=True):
+        item = b["positions"].pop(0) if b["positions"] else []
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    monkeypatch.setattr(bot, "OPTIMISTIC_OPEN", True)
+    monkeypatch.setattr(bot, "CONFIRM_TIMEOUT_SEC", 0.05)
+    monkeypatch.setattr(bot, "CONFIRM_POLL_INTERVAL_SEC", 0.01)
+    monkeypatch.setattr(bot, "CONFIRM_RETRY_MAX_SEC", 0.02)
+    monkeypatch.setattr(bot, "broker_request", lambda *a, **k: _Resp(200, {"dealReference": "REF1"}))
+    monkeypatch.setattr(bot, "fetch_confirm", _fetch_confirm)
+    monkeypatch.setattr(bot, "get_positions", _get_positions)
+    monkeypatch.setattr(bot, "safe_close", lambda CST, XSEC, epic, deal_id=None, reason=None:
+                        b["closes"].append((epic, deal_id, reason)))
+    monkeypatch.setattr(bot, "log_trade", lambda **k: b["logged"].append(k))
+    monkeypatch.setattr(bot, "_PENDING_OPEN", dict(bot._PENDING_OPEN, rejected=0, timeouts=0))
+    return bot, b
+
+
+def _open(bot, during=None, wait=0.3):
+    # Open im Loop; during(pos) läuft, während der Confirm noch aussteht
+    async def main():
+        assert bot.safe_open(None, None, EPIC, "BUY", 1.0, 100.0) is True
+        pos = bot.open_positions[EPIC]
+        assert pos["pending"] and pos["dealId"] is None and pos["trailing_stop"] is not None
+        if during:
+            during(pos)
+        await asyncio.sleep(wait)
+        return pos
+
+    return asyncio.run(main())
+
+
+def test_accepted_confirm_resolves_with_fill(broker):
+    bot, b = broker
+    b["confirms"] = [{"dealStatus": "ACCEPTED", "affectedDeals": [{"dealId": "D1"}], "level": 101.0}]
+    pos = _open(bot)
+    assert bot.open_positions[EPIC] is pos
+    assert pos["dealId"] == "D1" and pos["entry_price"] == 101.0 and "pending" not in pos
+    assert pos["trailing_stop"] == bot._initial_trailing("BUY", 101.0)
+    assert [e["event"] for e in b["logged"]] == ["OPEN"] and not b["closes"]
+
+
+def test_trailing_moved_by_protection_is_kept(broker):
+    bot, b = broker
+    b["confirms"] = [None, {"dealStatus": "ACCEPTED", "dealId": "D1", "level": 101.0}]
+    pos = _open(bot, during=lambda p: p.update(trailing_stop=100.5))
+    assert pos["dealId"] == "D1" and pos["trailing_stop"] == 100.5
+
+
+def test_rejected_confirm_drops_pending(broker):
+    bot, b = broker
+    b["confirms"] = [{"dealStatus": "REJECTED", "reason": "MARKET_CLOSED"}]
+    _open(bot)
+    assert bot.open_positions[EPIC] is None
+    assert bot.pending_open_stats()["rejected"] == 1 and not b["logged"]
+
+
+def test_close_while_pending_runs_after_confirm(broker):
+    bot, b = broker
+    b["confirms"] = [None, None, {"dealStatus": "ACCEPTED", "dealId": "D1", "level": 100.0}]
+
+    def stop_hit(pos):
+        # Stop-Loss schon vor dem Confirm → nur vormerken, kein DELETE ohne dealId
+        bot.check_protection_rules(EPIC, 50.0, 50.5, 0.5, None, None, log_regime=False)
+        assert pos["close_on_confirm"] and not b["closes"]
+
+    _open(bot, during=stop_hit)
+    assert b["closes"] == [(EPIC, "D1", "STOP_LOSS")]
+
+
+def test_no_confirm_broker_position_decides(broker):
+    bot, b = broker
+    b["positions"] = [RuntimeError("HTTP 500"), [{"position": {"epic": EPIC, "dealId": "D7", "level": 99.0}}]]
+    pos = _open(bot, wait=0.5)
+    assert pos["dealId"] == "D7" and pos["entry_price"] == 99.0 and "pending" not in pos
+    assert bot.pending_open_stats()["timeouts"] == 1
+
+
+def test_accepted_without_deal_id_and_no_broker_position(broker):
+    bot, b = broker
+    b["confirms"] = [{"dealStatus": "ACCEPTED"}]
+    b["positions"] = [[]]
+    _open(bot)
+    assert bot.open_positions[EPIC] is None
+
+
+def test_confirm_for_replaced_position_is_ignored(broker):
+    bot, b = broker
+    b["confirms"] = [None, {"dealStatus": "ACCEPTED", "dealId": "D1", "level": 101.0}]
+    other = {"direction": "SELL", "dealId": "D9", "entry_price": 100.0}
+    _open(bot, during=lambda p: bot.open_positions.__setitem__(EPIC, other))
+    assert bot.open_positions[EPIC] is other and not b["logged"]
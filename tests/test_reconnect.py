@@ -0,0 +1,88 @@
+# Reconnect-Zustandsmaschine + Positions-Sync nach dem Reconnect (Fetch im Thread, Abgleich im Loop)
+
+import asyncio
+import threading
+from collections import deque
+
+import pytest
+
+
+@pytest.fixture
+def rc(quiet_bot, monkeypatch):
+    bot = quiet_bot
+    monkeypatch.setattr(bot, "_RECONNECT", {"state": "INIT", "down_since": None, "down_reason": None,
+                                            "reconnects": 0, "downtimes": deque(maxlen=bot.RECONNECT_STATS_LEN)})
+    monkeypatch.setattr(bot, "_FEED", dict(bot._FEED, live=set(), stats={}, sync_task=None))
+    return bot
+
+
+def test_backoff_immediate_then_exponential_capped(rc, monkeypatch):
+    monkeypatch.setattr(rc, "RECONNECT_JITTER", 0.0)
+    assert rc._reconnect_backoff_delay(0) == 0.0
+    assert rc._reconnect_backoff_delay(1) == rc.RECONNECT_BACKOFF_BASE
+    assert rc._reconnect_backoff_delay(3) == rc.RECONNECT_BACKOFF_BASE * 4
+    assert rc._reconnect_backoff_delay(50) == rc.RECONNECT_BACKOFF_MAX
+
+
+def test_only_auth_errors_drop_tokens(rc):
+    assert rc._is_auth_error(RuntimeError("force_reconnect"))
+    assert rc._is_auth_error(Exception("HTTP 401 error.invalid.session.token"))
+    assert not rc._is_auth_error(ConnectionResetError("connection closed"))
+    assert not rc._is_auth_error(TimeoutError("recv timeout"))
+
+
+def test_downtime_measured_once_per_outage(rc, monkeypatch):
+    clock = iter([100.0, 103.5])
+    monkeypatch.setattr(rc.time, "monotonic", lambda: next(clock))
+    rc._reconnect_mark_live()                       # erster Connect: keine Downtime
+    assert rc._RECONNECT["state"] == "LIVE" and rc._RECONNECT["reconnects"] == 0
+    rc._reconnect_mark_down("recv timeout")         # t=100
+    rc._reconnect_mark_down("zweite Verbindung")    # Ausfall läuft schon, Start bleibt
+    assert rc._RECONNECT["state"] == "DOWN" and rc._RECONNECT["down_reason"] == "recv timeout"
+    rc._reconnect_mark_live()                       # t=103.5
+    assert rc.reconnect_stats()["reconnects"] == 1
+    assert list(rc._RECONNECT["downtimes"]) == [3.5]
+
+
+def _run_reconnect_sync(bot, monkeypatch, on_loop_during_fetch):
+    # Feed komplett weg → wieder live; get_positions blockiert im Thread, bis der Loop etwas erledigt hat
+    epic = bot.INSTRUMENTS[0]
+    release = threading.Event()
+    closes = []
+
+    def _get_positions(CST, XSEC, retry=True):
+        release.wait(5)
+        return []                                   # Snapshot vom Fetch-Start: Broker ohne Positionen
+
+    monkeypatch.setattr(bot, "get_positions", _get_positions)
+    monkeypatch.setattr(bot, "safe_close", lambda *a, **k: closes.append((a, k)))
+
+    async def main():
+        bot._reconnect_mark_down("test")
+        bot._feed_conn_up(1)
+        await asyncio.sleep(0.05)
+        on_loop_during_fetch(epic)
+        release.set()
+        await bot._FEED["sync_task"]
+
+    asyncio.run(main())
+    return epic, closes
+
+
+def test_sync_keeps_open_confirmed_during_fetch(rc, monkeypatch):
+    pos = {"direction": "BUY", "dealId": None, "entry_price": 100.0, "pending": True, "dealReference": "R1"}
+    rc.open_positions[rc.INSTRUMENTS[0]] = pos
+
+    def confirm(epic):
+        pos.update(dealId="D1", pending=False)      # Confirm-Task im Loop, während der Fetch läuft
+
+    epic, closes = _run_reconnect_sync(rc, monkeypatch, confirm)
+    assert rc.open_positions[epic] is pos and pos["dealId"] == "D1"
+    assert not closes
+
+
+def test_sync_clears_position_unknown_to_broker(rc, monkeypatch):
+    rc.open_positions[rc.INSTRUMENTS[0]] = {"direction": "BUY", "dealId": "D1", "entry_price": 100.0}
+    epic, closes = _run_reconnect_sync(rc, monkeypatch, lambda epic: None)
+    assert rc.open_positions[epic] is None
+    assert rc._RECONNECT["state"] == "LIVE"
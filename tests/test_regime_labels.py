@@ -0,0 +1,47 @@
+# Parität: regime_labels inkrementell (angehängte Ticks, kleine Blöcke) gegen komplett neu gelabelt
+
+import os
+
+import numpy as np
+
+import regime_labels as rl
+from conftest import TEST_EPIC, make_ticks, write_csv
+
+_COLS = [name for name, _dtype, _ext in rl._FEATURES + rl._LABELS]
+
+
+def test_incremental_labels_match_full(tmp_path, monkeypatch):
+    ts, bid, ask = make_ticks(20_000, seed=11)
+    csv = os.path.join(tmp_path, f"ticks_{TEST_EPIC}.csv")
+    monkeypatch.setattr(rl, "REGIME_LABEL_BLOCK", 1500)
+
+    # inkrementell: erst ein Teil der CSV, dann der Rest angehängt (wie der laufende Bot)
+    write_csv(csv, ts[:7_000], bid[:7_000], ask[:7_000])
+    assert rl.update_labels(TEST_EPIC, str(tmp_path)) == 7_000
+    write_csv(csv, ts[7_000:], bid[7_000:], ask[7_000:], mode="a")
+    assert rl.update_labels(TEST_EPIC, str(tmp_path)) == len(ts) - 7_000
+    assert rl.update_labels(TEST_EPIC, str(tmp_path)) == 0
+    inc = rl.load_labels(TEST_EPIC, str(tmp_path))
+
+    # komplett: eigener Store, ein einziger Block
+    monkeypatch.setattr(rl, "REGIME_LABEL_BLOCK", 1 << 22)
+    full_store = os.path.join(tmp_path, "full_store")
+    rl.update_labels(TEST_EPIC, str(tmp_path), store_dir=full_store, full=True)
+    full = rl.load_labels(TEST_EPIC, str(tmp_path), store_dir=full_store)
+
+    for name in _COLS:
+        assert len(inc[name]) == len(ts), name
+        np.testing.assert_array_equal(np.asarray(inc[name]), np.asarray(full[name]), err_msg=name)
+    assert len(np.unique(np.asarray(full["regime_long"]))) > 1
+
+
+def test_changed_thresholds_relabel_from_features(tmp_path, monkeypatch):
+    # nur Schwellen geändert → Labels = classify auf den gespeicherten Features
+    ts, bid, ask = make_ticks(5_000, seed=12)
+    write_csv(os.path.join(tmp_path, f"ticks_{TEST_EPIC}.csv"), ts, bid, ask)
+    rl.update_labels(TEST_EPIC, str(tmp_path))
+    monkeypatch.setattr(rl.bot, "REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME", 1.0)
+    assert rl.update_labels(TEST_EPIC, str(tmp_path)) == 0
+    r = rl.load_labels(TEST_EPIC, str(tmp_path))
+    np.testing.assert_array_equal(np.asarray(r["regime_long"]),
+                                  rl.classify(np.asarray(r["since_high"]), np.asarray(r["range_spreads"])))
@@ -0,0 +1,194 @@
+# ShardCoordinator (Zuteilung, globales Risiko-Limit) + ShardClient über echtes TCP + nicht blockierendes Open im Bot
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import shard_coordinator as sc
+
+
+class _Writer:
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+
+def _coord(epics, max_open, workers):
+    c = sc.ShardCoordinator(epics, max_open)
+    for wid in workers:
+        c.workers[wid] = {"writer": _Writer(), "epics": set(), "last_seen": time.monotonic()}
+        c._assign_orphans()
+        c._rebalance_for(wid)
+    return c
+
+
+def test_epics_balanced_and_orphans_reassigned(monkeypatch):
+    monkeypatch.setattr(sc, "print", lambda *a, **k: None, raising=False)
+    c = _coord(["A", "B", "C", "D"], 2, ["w1", "w2"])
+    assert sorted(len(w["epics"]) for w in c.workers.values()) == [2, 2]
+    c._drop_worker("w1", "test")
+    assert c.workers["w2"]["epics"] == {"A", "B", "C", "D"}
+    assert set(c.owner.values()) == {"w2"}
+
+
+def test_rebalance_keeps_epics_with_open_positions(monkeypatch):
+    monkeypatch.setattr(sc, "print", lambda *a, **k: None, raising=False)
+    c = _coord(["A", "B", "C", "D"], 4, ["w1"])
+    c._apply_heartbeat("w1", {"A": {"direction": "BUY", "dealId": "1"}, "B": {"direction": "SELL", "dealId": "2"}})
+    c.workers["w2"] = {"writer": _Writer(), "epics": set(), "last_seen": time.monotonic()}
+    c._rebalance_for("w2")
+    assert {"A", "B"} <= c.workers["w1"]["epics"]
+    assert c.workers["w2"]["epics"] == {"C", "D"}
+
+
+def test_global_risk_limit_and_grace(monkeypatch):
+    c = _coord(["A", "B"], 1, ["w1", "w2"])
+    a_owner, b_owner = c.owner["A"], c.owner["B"]
+    assert not c._risk_acquire(b_owner, "A")               # nur der Besitzer des Epics
+    assert c._risk_acquire(a_owner, "A")
+    assert c._risk_acquire(a_owner, "A")                   # Slot gehört dem Epic schon
+    assert not c._risk_acquire(b_owner, "B")               # global max. 1
+    c._apply_heartbeat(a_owner, {})                        # noch flat, aber Order im Flug → Slot bleibt
+    assert "A" in c.risk_slots
+    now = time.monotonic()
+    monkeypatch.setattr(sc.time, "monotonic", lambda: now + sc.RISK_GRANT_GRACE_SEC + 1)
+    c._apply_heartbeat(a_owner, {})
+    assert c._risk_acquire(b_owner, "B")
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    # Coordinator in eigenem Loop-Thread auf einem freien Port
+    monkeypatch.setattr(sc, "print", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(sc, "HEARTBEAT_SEC", 0.05)
+    coord = sc.ShardCoordinator(["A", "B"], 1)
+    loop = asyncio.new_event_loop()
+    started = concurrent.futures.Future()
+
+    async def main():
+        server = await asyncio.start_server(coord.handle, "127.0.0.1", 0)
+        started.set_result((server, server.sockets[0].getsockname()[1]))
+
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(main(), loop)
+    server, port = started.result(5)
+    yield coord, port
+    loop.call_soon_threadsafe(server.close)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def _client(port, wid, assigned):
+    c = sc.ShardClient(f"127.0.0.1:{port}", wid, lambda epics, all_epics: assigned.__setitem__(wid, epics), dict)
+    c.start()
+    return c
+
+
+def _wait(cond, timeout=5.0):
+    t0 = time.monotonic()
+    while not cond():
+        assert time.monotonic() - t0 < timeout
+        time.sleep(0.01)
+
+
+def test_clients_over_tcp_share_one_risk_slot(coordinator):
+    coord, port = coordinator
+    assigned = {}
+    c1 = _client(port, "w1", assigned)
+    _wait(lambda: assigned.get("w1") == ["A", "B"])
+    c2 = _client(port, "w2", assigned)
+    _wait(lambda: len(assigned.get("w1", [])) == 1 and len(assigned.get("w2", [])) == 1)
+
+    fut = c1.risk_request(assigned["w1"][0])
+    assert isinstance(fut, concurrent.futures.Future)       # kehrt sofort zurück
+    assert fut.result(5) is True
+    assert c2.risk_acquire(assigned["w2"][0], timeout=5) is False
+    assert c1.risk == {"open": 1, "limit": 1}
+
+
+def test_request_without_coordinator_is_rejected():
+    c = sc.ShardClient("127.0.0.1:1", "w1", lambda *a: None, dict)
+    assert c.risk_request("A").result(0) is False
+    assert c.risk_acquire("A", timeout=0.01) is False
+
+
+class _FakeClient:
+    # Antwort des Coordinators kommt erst, wenn der Test sie freigibt
+    def __init__(self):
+        self.futures = []
+        self.released = []
+        self.risk = {"open": 0, "limit": 1}
+
+    def risk_request(self, epic):
+        fut = concurrent.futures.Future()
+        self.futures.append(fut)
+        return fut
+
+    def risk_release(self, epic):
+        self.released.append(epic)
+
+
+@pytest.fixture
+def shard_bot(quiet_bot, monkeypatch):
+    bot = quiet_bot
+    client = _FakeClient()
+    opens = []
+    monkeypatch.setattr(bot, "_SHARD", dict(bot._SHARD, client=client, acquiring=set()))
+    monkeypatch.setattr(bot, "_HALT", dict(bot._HALT, halted=False))
+    monkeypatch.setattr(bot, "calc_trade_size", lambda *a, **k: 1.0)
+    monkeypatch.setattr(bot, "safe_open", lambda *a: opens.append(a) or True)
+    return bot, client, opens
+
+
+def test_open_waits_for_slot_without_blocking_loop(shard_bot):
+    bot, client, opens = shard_bot
+    epic = bot.INSTRUMENTS[0]
+
+    async def main():
+        t0 = time.perf_counter()
+        bot.decide_and_trade(None, None, epic, "BEREIT: BUY", 100.0)
+        bot.decide_and_trade(None, None, epic, "BEREIT: BUY", 100.0)   # zweites Signal während der Anfrage
+        assert time.perf_counter() - t0 < 0.1 and not opens
+        await asyncio.sleep(0.05)
+        assert len(client.futures) == 1 and not opens
+        client.futures[0].set_result(True)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert [(o[2], o[3]) for o in opens] == [(epic, "BUY")]
+    assert not bot._SHARD["acquiring"]
+
+
+def test_slot_returned_when_halted_during_request(shard_bot):
+    bot, client, opens = shard_bot
+    epic = bot.INSTRUMENTS[0]
+
+    async def main():
+        bot.decide_and_trade(None, None, epic, "BEREIT: SELL", 100.0)
+        await asyncio.sleep(0.01)
+        bot._HALT["halted"] = True
+        client.futures[0].set_result(True)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert not opens and client.released == [epic]
+
+
+def test_slot_timeout_means_no_open(shard_bot, monkeypatch):
+    bot, client, opens = shard_bot
+    monkeypatch.setattr(bot, "SHARD_RISK_TIMEOUT_SEC", 0.02)
+
+    async def main():
+        bot.decide_and_trade(None, None, bot.INSTRUMENTS[0], "BEREIT: BUY", 100.0)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert not opens and client.futures[0].cancelled()
+    assert not bot._SHARD["acquiring"]
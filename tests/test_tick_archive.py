@@ -0,0 +1,61 @@
+# Parität: rolling_range / rolling_argmax (Sparse-Table, blockweise) gegen Brute Force
+
+import numpy as np
+import pytest
+
+from tick_archive import rolling_argmax, rolling_range
+
+
+def _brute_range(ts, values, window_ms):
+    # Fenster [ts - window_ms, ts] wie _tickring_range
+    rmin, rmax = [], []
+    for i in range(len(ts)):
+        lo = int(np.searchsorted(ts, ts[i] - window_ms, "left"))
+        rmin.append(values[lo:i + 1].min())
+        rmax.append(values[lo:i + 1].max())
+    return np.array(rmin), np.array(rmax)
+
+
+def _series(seed=3):
+    rng = np.random.default_rng(seed)
+    ts = np.cumsum(rng.integers(0, 300, 3000)).astype(np.int64)      # inkl. gleicher Zeitstempel
+    values = np.round(rng.normal(0, 1, len(ts)), 1)                   # gerundet → viele Gleichstände
+    return ts, values
+
+
+@pytest.mark.parametrize("block", [1 << 20, 97])
+def test_rolling_range_matches_brute_force(block):
+    ts, values = _series()
+    for window_ms in (0, 1_000, 30_000):
+        bmin, bmax = _brute_range(ts, values, window_ms)
+        rmin, rmax = rolling_range(ts, values, window_ms, block=block)
+        np.testing.assert_array_equal(rmin, bmin)
+        np.testing.assert_array_equal(rmax, bmax)
+
+
+def test_rolling_range_empty():
+    rmin, rmax = rolling_range(np.empty(0, dtype=np.int64), np.empty(0), 1000)
+    assert len(rmin) == len(rmax) == 0
+
+
+def _brute_argmax(ts, values, window_ms):
+    # frühester Index des Maximums bei Gleichstand (wie "neues Extrem nur bei strikt größer")
+    out = []
+    for i in range(len(ts)):
+        lo = int(np.searchsorted(ts, ts[i] - window_ms, "left"))
+        out.append(lo + int(np.argmax(values[lo:i + 1])))
+    return np.array(out)
+
+
+@pytest.mark.parametrize("block", [1 << 20, 97])
+def test_rolling_argmax_matches_brute_force(block):
+    ts, values = _series()
+    for window_ms in (0, 1_000, 30_000):
+        np.testing.assert_array_equal(rolling_argmax(ts, values, window_ms, block=block),
+                                      _brute_argmax(ts, values, window_ms))
+        np.testing.assert_array_equal(rolling_argmax(ts, -values, window_ms, block=block),
+                                      _brute_argmax(ts, -values, window_ms))
+
+
+def test_rolling_argmax_empty():
+    assert len(rolling_argmax(np.empty(0, dtype=np.int64), np.empty(0), 1000)) == 0
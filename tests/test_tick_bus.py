@@ -0,0 +1,109 @@
+# Tick-Bus: Reihenfolge, Überrundung (dropped), Schließen/Ablösen des Writers (TickBusClosed)
+
+import os
+import struct
+import uuid
+
+import pytest
+
+import tick_bus as tb
+
+
+@pytest.fixture
+def name():
+    n = f"tb_test_{uuid.uuid4().hex[:10]}"
+    yield n
+    try:
+        from multiprocessing import shared_memory
+        shm = tb._attach(n)
+        shm.close()
+        shared_memory.SharedMemory(name=n).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _quotes(k0, k1, epic="ETHUSD"):
+    return [(epic, 100.0 + k, 100.5 + k, 1_760_000_000_000 + k) for k in range(k0, k1)]
+
+
+def test_latest_and_oldest_cursor(name):
+    w = tb.TickBusWriter(name, capacity=64, epics=["ETHUSD"])
+    w.publish_many(_quotes(0, 3))
+    late = tb.TickBusReader(name)                      # "latest" → nur neue Quotes
+    old = tb.TickBusReader(name, start="oldest")
+    w.publish_many(_quotes(3, 5, epic="BTCUSD"))       # neues Epic nach dem Öffnen der Leser
+    assert late.poll() == _quotes(3, 5, epic="BTCUSD")
+    assert old.poll() == _quotes(0, 3) + _quotes(3, 5, epic="BTCUSD")
+    assert late.poll() == [] and late.lag() == 0
+    late.close(), old.close(), w.close()
+
+
+def test_slow_reader_is_lapped_and_counts_dropped(name):
+    w = tb.TickBusWriter(name, capacity=8)
+    rd = tb.TickBusReader(name)
+    w.publish_many(_quotes(0, 20))
+    assert rd.lag() == 20
+    assert rd.poll(max_items=3) == _quotes(12, 15)     # nur die letzten 8 liegen noch im Ring
+    assert rd.dropped == 12
+    assert rd.poll() == _quotes(15, 20) and rd.dropped == 12
+    rd.close(), w.close()
+
+
+def test_reader_close_keeps_segment(name):
+    w = tb.TickBusWriter(name, capacity=8)
+    tb.TickBusReader(name).close()
+    rd = tb.TickBusReader(name)                        # Segment noch da
+    w.publish("ETHUSD", 1.0, 2.0, 3)
+    assert rd.poll() == [("ETHUSD", 1.0, 2.0, 3)]
+    rd.close(), w.close()
+
+
+def test_writer_close_drains_then_raises(name):
+    w = tb.TickBusWriter(name, capacity=8)
+    rd = tb.TickBusReader(name)
+    w.publish_many(_quotes(0, 2))
+    w.close()
+    assert rd.poll() == _quotes(0, 2)                  # Rest wird noch ausgeliefert
+    with pytest.raises(tb.TickBusClosed):
+        rd.poll()
+    rd.close()
+    with pytest.raises(FileNotFoundError):
+        tb.TickBusReader(name)
+
+
+def test_replaced_writer_closes_old_readers(name):
+    w1 = tb.TickBusWriter(name, capacity=8)
+    rd = tb.TickBusReader(name)
+    w1.close(unlink=False)                             # "Absturz": Segment bleibt liegen
+    w2 = tb.TickBusWriter(name, capacity=8)            # übernimmt, markiert den alten Bus als abgelöst
+    with pytest.raises(tb.TickBusClosed):
+        rd.poll()
+    rd.close()
+    rd2 = tb.TickBusReader(name)
+    w2.publish("ETHUSD", 1.0, 2.0, 3)
+    assert rd2.poll() == [("ETHUSD", 1.0, 2.0, 3)]
+    rd2.close(), w2.close()
+
+
+def test_second_writer_rejected_while_first_alive(name):
+    w = tb.TickBusWriter(name, capacity=8)
+    struct.pack_into("<I", w.buf, tb._WRITER_PID_OFFSET, os.getppid())   # Writer = anderer, lebender Prozess
+    with pytest.raises(RuntimeError, match="bereits"):
+        tb.TickBusWriter(name, capacity=8)
+    rd = tb.TickBusReader(name)                        # alter Bus unverändert nutzbar
+    w.publish("ETHUSD", 1.0, 2.0, 3)
+    assert rd.poll() == [("ETHUSD", 1.0, 2.0, 3)]
+    rd.close(), w.close()
+
+
+def test_iter_ticks_reconnects_to_new_writer(name):
+    w1 = tb.TickBusWriter(name, capacity=8)
+    gen = tb.iter_ticks(name, start="oldest", idle_sleep=0.001, reconnect_sec=0.01)
+    w1.publish_many(_quotes(0, 2))
+    assert [next(gen), next(gen)] == _quotes(0, 2)
+    w1.close()
+    w2 = tb.TickBusWriter(name, capacity=8)
+    w2.publish_many(_quotes(5, 6))
+    assert next(gen) == _quotes(5, 6)[0]
+    gen.close()
+    w2.close()
@@ -0,0 +1,50 @@
+# Ingest → Pipeline: frischeste Quote, verspätete und Out-of-Order-Ticks
+
+import pytest
+
+
+@pytest.fixture
+def pipe(quiet_bot, monkeypatch):
+    bot = quiet_bot
+    monkeypatch.setattr(bot, "_PIPE", dict(bot._PIPE, latest={}, pending={}, entries={},
+                                           stats=dict.fromkeys(bot._PIPE["stats"], 0)))
+    monkeypatch.setattr(bot, "_CANDLE_CLOSE", dict(bot._CANDLE_CLOSE, late_ticks=0))
+    monkeypatch.setattr(bot, "_TICKLOG_BUF", {})
+    monkeypatch.setattr(bot, "_INTRABAR", {})
+    epic = bot.INSTRUMENTS[0]
+    return bot, epic, {epic: {"minute": None, "bar": None}}
+
+
+T0 = 1_760_000_040_000   # volle Minute (UTC)
+
+
+def test_out_of_order_tick_keeps_newer_quote(pipe):
+    bot, epic, states = pipe
+    bot._ingest_quote(states, epic, 100.0, 100.5, T0 + 2_000)
+    bot._ingest_quote(states, epic, 90.0, 90.5, T0 + 1_000)       # älter, kommt später an
+    assert bot._PIPE["latest"][epic] == (100.0, 100.5, T0 + 2_000)
+    assert bot._PIPE["pending"][epic] == 1
+    assert bot._PIPE["stats"]["out_of_order"] == 1
+    assert bot._PIPE["stats"]["ingested"] == 2
+
+
+def test_out_of_order_tick_does_not_fire_intrabar(pipe):
+    bot, epic, states = pipe
+    bot._ingest_quote(states, epic, 100.0, 100.5, T0 + 2_000)
+    bot._INTRABAR[epic] = {"dir": "LONG", "price": 105.0}
+    bot._ingest_quote(states, epic, 110.0, 110.5, T0 + 1_000)
+    assert epic in bot._INTRABAR and not bot._PIPE["entries"]
+
+
+def test_late_tick_after_timer_close_still_reaches_worker(pipe):
+    bot, epic, states = pipe
+    bot._ingest_quote(states, epic, 100.0, 100.5, T0 + 59_000)
+    minute = states[epic]["minute"]
+    bar = states[epic]["bar"]
+    states[epic]["minute"] = bot.local_minute_floor(T0 + 60_000)    # Timer hat die Minute geschlossen
+    states[epic]["bar"] = None
+    bot._ingest_quote(states, epic, 101.0, 101.5, T0 + 59_500)      # verspätet, aber frischeste Quote
+    assert bot._CANDLE_CLOSE["late_ticks"] == 1
+    assert states[epic]["bar"] is None and bar["close_bid"] == 100.0 and minute < states[epic]["minute"]
+    assert bot._PIPE["latest"][epic] == (101.0, 101.5, T0 + 59_500)
+    assert bot._PIPE["pending"][epic] == 2
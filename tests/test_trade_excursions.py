@@ -0,0 +1,50 @@
+# Parität: trade_excursions.regime_along gegen log_trade_regime, Tick für Tick
+
+from collections import deque
+
+import numpy as np
+
+from conftest import TEST_EPIC
+from tick_archive import rolling_range, tick_slice
+from trade_excursions import regime_along
+
+_STATES = {"IMPULSE": 1, "RUN": 2, "FLAT": 3}
+
+
+def test_regime_along_matches_log_trade_regime(quiet_bot, ticks):
+    bot = quiet_bot
+    window = bot.REGIME_RANGE_WINDOW_MS
+    rng = np.random.default_rng(7)
+    evaluated = 0
+    for i in rng.integers(1000, len(ticks["ts"]) - 5000, 25):
+        direction = str(rng.choice(["BUY", "SELL"]))
+        s = 1.0 if direction == "BUY" else -1.0
+        open_ms = int(ticks["ts"][i])
+        entry = float(ticks["ask"][i] if s > 0 else ticks["bid"][i])
+        sl = tick_slice(ticks, open_ms, open_ms + int(rng.integers(60, 1200)) * 1000 + 1)
+        pre = tick_slice(ticks, open_ms - window, open_ms)
+
+        # live: Zustand nur an den Ticks, an denen log_trade_regime neu bewertet
+        ring = bot.TICK_RING[TEST_EPIC] = deque(maxlen=10 ** 6)
+        for a in range(pre.start, pre.stop):
+            ring.append((int(ticks["ts"][a]), (ticks["bid"][a] + ticks["ask"][a]) / 2))
+        pos = {"direction": direction, "entry_price": entry}
+        live = []
+        for a in range(sl.start, sl.stop):
+            tt, b, k = int(ticks["ts"][a]), float(ticks["bid"][a]), float(ticks["ask"][a])
+            ring.append((tt, (b + k) / 2))
+            prev = pos.pop("regime_state", None)
+            bot.log_trade_regime(TEST_EPIC, pos, b, k, k - b, tt, verbose=False)
+            live.append(_STATES.get(pos.get("regime_state"), 0))
+            pos["regime_state"] = pos.get("regime_state") or prev
+
+        ts = np.asarray(ticks["ts"][pre.start:sl.stop])
+        bid = np.asarray(ticks["bid"][pre.start:sl.stop])
+        ask = np.asarray(ticks["ask"][pre.start:sl.stop])
+        rmin, rmax = rolling_range(ts, (bid + ask) / 2.0, window)
+        k = sl.start - pre.start
+        x = s * np.where(s > 0, bid, ask)[k:]
+        vec = regime_along(ts[k:], x, s * entry, (ask - bid)[k:], (rmax - rmin)[k:])
+        np.testing.assert_array_equal(vec, np.array(live, dtype=np.int8))
+        evaluated += int((vec > 0).sum())
+    assert evaluated > 0
@@ -0,0 +1,69 @@
+# Walk-Forward: Folds starten flach (Vorlauf öffnet nichts), Test-Trades enden spätestens am nächsten
+# Test-Start, stitch lässt keine überlappenden Positionen durch
+
+import os
+
+import numpy as np
+
+import batch_eval as be
+import optimizer
+import result_cache
+import walkforward as wf
+from conftest import TEST_EPIC
+
+_ROW = {"EMA_FAST": 3, "EMA_SLOW": 7, "CONFIRM_MIN_CLOSE_DELTA_SPREADS": 0.1,
+        "PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS": 0.5}
+_HOUR = 3_600_000
+
+
+def _fold(ticks, tick_dir, monkeypatch, next_test0=None):
+    # Optimierer überspringen: fester Satz als "bester" → nur die Test-Bewertung von run_fold
+    monkeypatch.setattr(result_cache, "CACHE_DIR", os.path.join(tick_dir, "cache"))
+    row = be.set_row(be.sets_from_rows([_ROW]), 0)
+    monkeypatch.setattr(optimizer, "optimize", lambda *a, **k: {"best": row, "metrics": {"pnl": 0.0}})
+    t0 = int(ticks["ts"][0])
+    fold = (t0, t0 + _HOUR, t0 + _HOUR, t0 + 2 * _HOUR)
+    return wf.run_fold(0, TEST_EPIC, tick_dir, fold, 9, 3, 0.005, 0, {}, 4 * 3600, None, next_test0)
+
+
+def test_make_folds_contiguous_test_windows():
+    folds = wf.make_folds(0, 10 * wf._DAY_MS, 3, 2)
+    assert len(folds) == 3
+    for a, b in zip(folds, folds[1:]):
+        assert a[3] == b[2]                                     # Test-Fenster lückenlos
+    assert all(f[1] == f[2] for f in folds)
+
+
+def test_warmup_signals_do_not_block_test_entries(quiet_bot, ticks):
+    sets = be.sets_from_rows([_ROW])
+    t0 = int(ticks["ts"][0])
+    test0 = t0 + _HOUR
+    full = be.evaluate(ticks, sets, t0, t0 + 2 * _HOUR, 4 * 3600, use_cache=False)
+    flat = be.evaluate(ticks, sets, t0, t0 + 2 * _HOUR, 4 * 3600, use_cache=False, entry_min_ms=test0)
+    fo, ft = flat["trades"]["open_ms"], flat["trades"]["taken"][0]
+    assert len(ft) and (fo[ft] >= test0).all()
+    # keine Vorlauf-Position offen → das erste Signal ab test0 wird genommen
+    sig = np.sort(fo[fo >= test0])
+    assert fo[ft][0] == sig[0]
+    taken_full = full["trades"]["open_ms"][full["trades"]["taken"][0]]
+    assert taken_full.min() < test0                             # Vergleich: ohne Grenze gibt es Vorlauf-Trades
+
+
+def test_run_fold_caps_exits_at_next_test0(quiet_bot, ticks, tick_dir, monkeypatch):
+    t0 = int(ticks["ts"][0])
+    nxt = t0 + int(1.5 * _HOUR)
+    free = _fold(ticks, tick_dir, monkeypatch)
+    cap = _fold(ticks, tick_dir, monkeypatch, nxt)
+    assert free["exit_ms"].max() > nxt                          # ohne Cap klingen Trades aus
+    assert (cap["open_ms"] >= t0 + _HOUR).all() and (cap["open_ms"] < nxt).all()
+    assert (cap["exit_ms"] < nxt).all()
+
+
+def test_stitch_drops_overlapping_trades():
+    a = {"open_ms": np.array([0, 100]), "exit_ms": np.array([50.0, 400.0]), "pnl": np.array([1.0, 2.0])}
+    b = {"open_ms": np.array([300, 450]), "exit_ms": np.array([350.0, 500.0]), "pnl": np.array([5.0, -1.0])}
+    st = wf.stitch([a, b])
+    assert st["open_ms"].tolist() == [0, 100, 450]
+    assert st["equity"].tolist() == [1.0, 3.0, 2.0]
+    assert st["dropped"] == 1
+    assert st["win_rate"] == 2 / 3
@@ -0,0 +1,341 @@
+# tick_archive.py – Tick-Archiv (ticks_{epic}.csv) als spaltenweiser Binär-Store + Trades aus bot_log.csv
+#
+# Der Bot schreibt pro Epic "ts_ms;bid;ask" zeilenweise an ticks_{epic}.csv an. Für Auswertungen
+# wird das einmal in Spalten-Dateien übersetzt (tick_store/ neben den CSVs) und danach nur noch der
+# neue Teil der CSV gelesen:
+#   tick_store/{epic}/ts.i8   (int64, UTC ms)
+#   tick_store/{epic}/bid.f8  (float64)
+#   tick_store/{epic}/ask.f8  (float64)
+#   tick_store/{epic}/meta.json  (Byte-Offset in der CSV, Zeilen, sortiert?)
+# Geladen wird per np.memmap (read-only) → mehrere Prozesse teilen sich dieselben Seiten im Page-Cache.
+# Zeitfenster werden über np.searchsorted auf ts geschnitten, nie über CSV-Scans.
+#
+# Aufruf:
+#   python tick_archive.py                 → alle ticks_*.csv im Bot-Ordner importieren/aktualisieren
+#   python tick_archive.py --epic GOLD     → nur ein Epic
+#   python tick_archive.py --trades        → Trades aus bot_log.csv anzeigen (Open/Close gepaart)
+
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from tradingbot_2 import BASE_DIR, LOCAL_TZ, LOG_CSV, _PARAM_KEYS
+
+TICK_DIR = BASE_DIR                                   # hier liegen die ticks_{epic}.csv des Bots
+STORE_DIR = None                                      # None → {TICK_DIR}/tick_store
+IMPORT_CHUNK_BYTES = 64 * 1024 * 1024                 # CSV wird in Blöcken dieser Größe übersetzt
+
+_COLUMNS = (("ts", np.int64, "i8"), ("bid", np.float64, "f8"), ("ask", np.float64, "f8"))
+
+
+def csv_path(epic: str, tick_dir: str = None) -> str:
+    return os.path.join(tick_dir or TICK_DIR, f"ticks_{epic}.csv")
+
+
+def store_path(epic: str, store_dir: str = None, tick_dir: str = None) -> str:
+    return os.path.join(store_dir or STORE_DIR or os.path.join(tick_dir or TICK_DIR, "tick_store"), epic)
+
+
+def list_epics(tick_dir: str = None) -> list:
+    out = []
+    for p in sorted(glob.glob(os.path.join(tick_dir or TICK_DIR, "ticks_*.csv"))):
+        out.append(os.path.basename(p)[len("ticks_"):-len(".csv")])
+    return out
+
+
+def _read_meta(path: str) -> dict:
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"csv_offset": 0, "rows": 0, "sorted": True, "last_ts": None}
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def _parse_rows(raw: bytes) -> np.ndarray:
+    # "ts;bid;ask\n..." → (n, 3) float64; kaputte Zeilen (Absturz mitten im Schreiben) werden verworfen
+    lines = raw.split(b"\n")
+    good = [ln for ln in lines if ln.count(b";") == 2]
+    if not good:
+        return np.empty((0, 3))
+    try:
+        return np.array(b";".join(good).split(b";"), dtype=np.float64).reshape(-1, 3)
+    except ValueError:
+        rows = []
+        for ln in good:
+            try:
+                rows.append([float(v) for v in ln.split(b";")])
+            except ValueError:
+                continue
+        return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def _sort_store(path: str, rows: int) -> None:
+    # Selten: Quotes kamen nicht in Zeitreihenfolge an → Store einmal stabil nach ts sortieren
+    ts = np.fromfile(os.path.join(path, "ts.i8"), dtype=np.int64, count=rows)
+    order = np.argsort(ts, kind="stable")
+    for name, dtype, ext in _COLUMNS:
+        fn = os.path.join(path, f"{name}.{ext}")
+        col = np.fromfile(fn, dtype=dtype, count=rows)[order]
+        col.tofile(fn + ".tmp")
+        os.replace(fn + ".tmp", fn)
+
+
+def update_store(epic: str, tick_dir: str = None, store_dir: str = None) -> int:
+    # Nur den seit dem letzten Import angehängten Teil der CSV übersetzen. Rückgabe: neue Zeilen
+    src = csv_path(epic, tick_dir)
+    path = store_path(epic, store_dir, tick_dir)
+    os.makedirs(path, exist_ok=True)
+    meta = _read_meta(path)
+
+    if not os.path.isfile(src):
+        return 0
+    size = os.path.getsize(src)
+    if size < meta["csv_offset"]:
+        # CSV wurde rotiert/gekürzt → Store neu aufbauen
+        print(f"♻️ [{epic}] {os.path.basename(src)} kleiner als beim letzten Import → Neuaufbau")
+        for _name, _dtype, ext in _COLUMNS:
+            fn = os.path.join(path, f"{_name}.{ext}")
+            if os.path.exists(fn):
+                os.remove(fn)
+        meta = {"csv_offset": 0, "rows": 0, "sorted": True, "last_ts": None}
+
+    added = 0
+    with open(src, "rb") as f:
+        f.seek(meta["csv_offset"])
+        while True:
+            raw = f.read(IMPORT_CHUNK_BYTES)
+            if not raw:
+                break
+            cut = raw.rfind(b"\n")
+            if cut < 0:
+                break  # angefangene letzte Zeile – beim nächsten Import
+            raw = raw[:cut + 1]
+            f.seek(meta["csv_offset"] + len(raw))
+
+            arr = _parse_rows(raw)
+            meta["csv_offset"] += len(raw)
+            if not len(arr):
+                continue
+
+            ts = arr[:, 0].astype(np.int64)
+            if meta["sorted"]:
+                if (len(ts) > 1 and np.any(np.diff(ts) < 0)) or (meta["last_ts"] is not None and ts[0] < meta["last_ts"]):
+                    meta["sorted"] = False
+            for (name, dtype, ext), col in zip(_COLUMNS, (ts, arr[:, 1], arr[:, 2])):
+                with open(os.path.join(path, f"{name}.{ext}"), "ab") as out:
+                    np.ascontiguousarray(col, dtype=dtype).tofile(out)
+            meta["rows"] += len(arr)
+            meta["last_ts"] = int(ts.max()) if meta["last_ts"] is None else max(meta["last_ts"], int(ts.max()))
+            added += len(arr)
+
+    if not meta["sorted"]:
+        _sort_store(path, meta["rows"])
+        meta["sorted"] = True
+    _write_meta(path, meta)
+    return added
+
+
+def load_ticks(epic: str, update: bool = True, tick_dir: str = None, store_dir: str = None) -> dict:
+    # {"epic", "ts", "bid", "ask"} als read-only memmaps (leere Arrays, wenn es keine Daten gibt)
+    if update:
+        update_store(epic, tick_dir, store_dir)
+    path = store_path(epic, store_dir, tick_dir)
+    rows = _read_meta(path)["rows"]
+    out = {"epic": epic}
+    for name, dtype, ext in _COLUMNS:
+        fn = os.path.join(path, f"{name}.{ext}")
+        if rows and os.path.isfile(fn):
+            out[name] = np.memmap(fn, dtype=dtype, mode="r", shape=(rows,))
+        else:
+            out[name] = np.empty(0, dtype=dtype)
+    return out
+
+
+def tick_slice(ticks: dict, t0_ms: int, t1_ms: int) -> slice:
+    # Index-Bereich [t0_ms, t1_ms) über binäre Suche
+    ts = ticks["ts"]
+    return slice(int(np.searchsorted(ts, t0_ms, "left")), int(np.searchsorted(ts, t1_ms, "left")))
+
+
+def mid(ticks: dict, sl: slice = slice(None)) -> np.ndarray:
+    return (np.asarray(ticks["bid"][sl]) + np.asarray(ticks["ask"][sl])) / 2.0
+
+
+def rolling_range(ts: np.ndarray, values: np.ndarray, window_ms: int, block: int = 1 << 20):
+    # (min, max) über das rückwärts gerichtete Zeitfenster [ts - window_ms, ts] für jeden Index –
+    # wie _tickring_range im Bot (cutoff = ts - window_ms, Ticks mit ts >= cutoff zählen).
+    # Sparse-Table (Min/Max über Zweierpotenz-Blöcke) + zwei überlappende Abfragen pro Index,
+    # blockweise, damit der Speicher bei Monaten an Ticks begrenzt bleibt.
+    ts = np.asarray(ts)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(ts)
+    rmin = np.empty(n)
+    rmax = np.empty(n)
+    if n == 0:
+        return rmin, rmax
+    left_all = np.searchsorted(ts, ts - window_ms, "left")
+
+    for b0 in range(0, n, block):
+        b1 = min(n, b0 + block)
+        lo = int(left_all[b0:b1].min())
+        seg = values[lo:b1]
+        left = left_all[b0:b1] - lo
+        right = np.arange(b0, b1) - lo
+        length = right - left + 1
+        k = np.floor(np.log2(length)).astype(np.int64)
+
+        tmin, tmax = [seg], [seg]
+        span = 1
+        while span * 2 <= length.max():
+            pmin, pmax = tmin[-1], tmax[-1]
+            tmin.append(np.minimum(pmin[:-span], pmin[span:]))
+            tmax.append(np.maximum(pmax[:-span], pmax[span:]))
+            span *= 2
+
+        out_min = np.empty(b1 - b0)
+        out_max = np.empty(b1 - b0)
+        for lvl in np.unique(k):
+            m = k == lvl
+            a = left[m]
+            c = right[m] - (1 << int(lvl)) + 1
+            out_min[m] = np.minimum(tmin[lvl][a], tmin[lvl][c])
+            out_max[m] = np.maximum(tmax[lvl][a], tmax[lvl][c])
+        rmin[b0:b1] = out_min
+        rmax[b0:b1] = out_max
+    return rmin, rmax
+
+
+def rolling_argmax(ts: np.ndarray, values: np.ndarray, window_ms: int, block: int = 1 << 20) -> np.ndarray:
+    # Index des Maximums im Fenster [ts - window_ms, ts] (bei Gleichstand der FRÜHESTE – wie das
+    # "neue Extrem nur bei strikt größer" im Bot). Gleiche Sparse-Table wie rolling_range, nur mit Indizes.
+    ts = np.asarray(ts)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(ts)
+    out = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return out
+    left_all = np.searchsorted(ts, ts - window_ms, "left")
+
+    for b0 in range(0, n, block):
+        b1 = min(n, b0 + block)
+        lo = int(left_all[b0:b1].min())
+        seg = values[lo:b1]
+        left = left_all[b0:b1] - lo
+        right = np.arange(b0, b1) - lo
+        length = right - left + 1
+        k = np.floor(np.log2(length)).astype(np.int64)
+
+        targ = [np.arange(len(seg))]
+        span = 1
+        while span * 2 <= length.max():
+            p = targ[-1]
+            ia, ib = p[:-span], p[span:]
+            targ.append(np.where(seg[ib] > seg[ia], ib, ia))
+            span *= 2
+
+        res = np.empty(b1 - b0, dtype=np.int64)
+        for lvl in np.unique(k):
+            m = k == lvl
+            ia = targ[lvl][left[m]]
+            ib = targ[lvl][right[m] - (1 << int(lvl)) + 1]
+            res[m] = np.where(seg[ib] > seg[ia], ib, ia)
+        out[b0:b1] = res + lo
+    return out
+
+
+# ==============================
+# Trades aus bot_log.csv (OPEN/CLOSE gepaart)
+# ==============================
+def local_str_to_ms(s: str) -> int:
+    # "31.12.2025 14:03:07,123" (Europe/Berlin) → UTC ms
+    dt = datetime.strptime(s.strip(), "%d.%m.%Y %H:%M:%S,%f").replace(tzinfo=LOCAL_TZ)
+    return int(dt.timestamp() * 1000)
+
+
+def _num(v: str):
+    v = (v or "").strip()
+    if not v or v == "None":
+        return None
+    try:
+        return float(v.replace(",", "."))
+    except ValueError:
+        return v
+
+
+def load_trades(path: str = LOG_CSV, epics=None) -> list:
+    # Liste von Trades: epic, direction, deal_id, open_ms, close_ms, entry, exit, size, pnl, reason, params
+    # Gepaart wird pro Epic in Dateireihenfolge (der Bot hat max. 1 Position pro Epic);
+    # ein OPEN ohne CLOSE (Bot läuft noch / Absturz) bekommt close_ms=None.
+    if not os.path.isfile(path):
+        return []
+    trades, open_by_epic = [], {}
+    with open(path, "r", encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split(";")
+        for line in f:
+            vals = line.rstrip("\n").split(";")
+            row = dict(zip(header, vals))
+            trigger = row.get("trigger", "")
+            epic = row.get("epic", "")
+            if trigger not in ("open", "close") or (epics and epic not in epics):
+                continue
+            try:
+                ts_ms = local_str_to_ms(row["timestamp"])
+            except (KeyError, ValueError):
+                continue
+
+            if trigger == "open":
+                open_by_epic[epic] = {
+                    "epic": epic,
+                    "direction": row.get("direction"),
+                    "deal_id": row.get("deal_id"),
+                    "open_ms": ts_ms,
+                    "close_ms": None,
+                    "entry": _num(row.get("price")),
+                    "exit": None,
+                    "size": _num(row.get("size")),
+                    "pnl": None,
+                    "reason": None,
+                    "params": {k: _num(row.get(k)) for k in _PARAM_KEYS if k in row},
+                }
+                trades.append(open_by_epic[epic])
+            else:
+                t = open_by_epic.pop(epic, None)
+                if t is None:
+                    continue  # CLOSE ohne OPEN (z.B. Position aus einem früheren Lauf)
+                t["close_ms"] = ts_ms
+                t["exit"] = _num(row.get("price"))
+                t["pnl"] = _num(row.get("pnl"))
+                t["reason"] = row.get("reason")
+    return [t for t in trades if isinstance(t["entry"], float) and t["direction"] in ("BUY", "SELL")]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Tick-Archiv importieren/aktualisieren (CSV → Spalten-Store)")
+    ap.add_argument("--epic", action="append", help="nur diese Epics (mehrfach möglich)")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--trades", action="store_true", help="Trades aus bot_log.csv auflisten")
+    args = ap.parse_args()
+
+    if args.trades:
+        for t in load_trades(epics=args.epic):
+            print(f"{t['epic']:<10} {t['direction']:<4} open={t['open_ms']} close={t['close_ms']} "
+                  f"entry={t['entry']} exit={t['exit']} pnl={t['pnl']} reason={t['reason']}")
+    else:
+        for epic in args.epic or list_epics(args.dir):
+            n = update_store(epic, tick_dir=args.dir)
+            ticks = load_ticks(epic, update=False, tick_dir=args.dir)
+            span = ""
+            if len(ticks["ts"]):
+                span = f"  {ticks['ts'][0]} … {ticks['ts'][-1]}"
+            print(f"📦 [{epic}] +{n} Ticks → {len(ticks['ts'])} im Store{span}")
@@ -0,0 +1,276 @@
+# tick_bus.py – Shared-Memory Tick-Bus: 1 Feed-Prozess schreibt, beliebig viele lokale Prozesse lesen
+#
+# Ringpuffer in multiprocessing.shared_memory, Single-Writer, lock-frei:
+#   - jeder Slot trägt eine Sequenznummer (Seqlock): ungerade = wird gerade geschrieben,
+#     2*n+2 = Quote Nr. n fertig. Leser prüfen die Nummer vor und nach dem Lesen.
+#   - jeder Leser hat seinen eigenen Cursor (kein Zustand im Shared Memory) → Leser
+#     bremsen weder den Writer noch sich gegenseitig. Wer zu langsam ist, wird überrundet
+#     und bekommt die verlorenen Quotes als "dropped" gezählt.
+#   - Leser melden das Segment NICHT beim resource_tracker an (sonst löscht es der erste Leser beim Beenden)
+#   - Header trägt die PID des Writers; 0 = Writer beendet bzw. von einem neuen Writer abgelöst →
+#     poll() wirft TickBusClosed (iter_ticks verbindet sich dann selbst neu). Ein zweiter Writer,
+#     während der erste noch lebt, bricht mit RuntimeError ab.
+#
+# Writer (tradingbot_2, wenn TICK_BUS_NAME gesetzt ist):
+#   bus = TickBusWriter("capital_ticks", epics=INSTRUMENTS)
+#   bus.publish(epic, bid, ask, ts_ms)
+#
+# Leser (Chart, Recorder, Shadow-Strategie, Notebook):
+#   rd = TickBusReader("capital_ticks")
+#   for epic, bid, ask, ts_ms in rd.poll(): ...
+#   # oder blockierend:
+#   for epic, bid, ask, ts_ms in iter_ticks("capital_ticks"): ...
+#
+# Schnelltest:  python tick_bus.py --name capital_ticks   (liest und zeigt Quotes/s pro Epic)
+
+import argparse
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+MAGIC = b"TICKBUS1"
+
+# Header: magic | capacity | slot_size | n_epics | writer_pid (0 = Writer beendet/abgelöst) | write_seq
+_HEADER = struct.Struct("<8sIIIIQ")
+_WRITER_PID_OFFSET = 20
+_WRITE_SEQ_OFFSET = 24
+_MAX_EPICS = 32
+_EPIC_LEN = 24
+_EPIC_TABLE_OFFSET = 64
+_SLOTS_OFFSET = _EPIC_TABLE_OFFSET + _MAX_EPICS * _EPIC_LEN   # 832, 64-Byte-aligned
+
+# Slot: seq | ts_ms | bid | ask | epic_id
+_SLOT = struct.Struct("<QqddI4x")
+_SEQ = struct.Struct("<Q")
+
+DEFAULT_CAPACITY = 65536   # Quotes im Ring (bei ~50 Quotes/s/Epic reicht das für Minuten Rückstand)
+
+
+class TickBusClosed(RuntimeError):
+    # Writer hat den Bus geschlossen bzw. ein neuer Writer hat ihn ersetzt → neu verbinden
+    pass
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Bestehendes Segment öffnen, OHNE es beim resource_tracker dieses Prozesses anzumelden –
+    # sonst löscht das Ende des ersten Lesers das Segment für alle anderen (Python < 3.13)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class TickBusWriter:
+    # Genau EIN Writer pro Bus (der Feed-Prozess). Legt das Shared Memory an bzw. übernimmt es.
+
+    def __init__(self, name: str, capacity: int = DEFAULT_CAPACITY, epics=()):
+        size = _SLOTS_OFFSET + capacity * _SLOT.size
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Reste eines abgestürzten Laufs → als abgelöst markieren (noch verbundene Leser bekommen
+            # TickBusClosed statt still einen toten Puffer zu pollen), dann neu anlegen.
+            # Lebt der alte Writer noch → laut abbrechen statt ihm den Bus wegzunehmen.
+            old = _attach(name)
+            try:
+                if bytes(old.buf[:8]) == MAGIC:
+                    pid = struct.unpack_from("<I", old.buf, _WRITER_PID_OFFSET)[0]
+                    if pid != os.getpid() and _pid_alive(pid):
+                        raise RuntimeError(f"TickBus '{name}' wird bereits von PID {pid} geschrieben")
+                    struct.pack_into("<I", old.buf, _WRITER_PID_OFFSET, 0)
+            finally:
+                old.close()
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        self.capacity = capacity
+        self.buf = self.shm.buf
+        self._n = 0
+        self._epic_ids = {}
+        _HEADER.pack_into(self.buf, 0, MAGIC, capacity, _SLOT.size, 0, os.getpid(), 0)
+        for epic in epics:
+            self._epic_id(epic)
+
+    def _epic_id(self, epic: str) -> int:
+        eid = self._epic_ids.get(epic)
+        if eid is not None:
+            return eid
+        eid = len(self._epic_ids)
+        if eid >= _MAX_EPICS:
+            raise ValueError(f"TickBus: max. {_MAX_EPICS} Epics")
+        raw = epic.encode("utf-8")[:_EPIC_LEN]
+        off = _EPIC_TABLE_OFFSET + eid * _EPIC_LEN
+        self.buf[off:off + _EPIC_LEN] = raw.ljust(_EPIC_LEN, b"\0")
+        self._epic_ids[epic] = eid
+        struct.pack_into("<I", self.buf, 16, len(self._epic_ids))
+        return eid
+
+    def publish(self, epic: str, bid: float, ask: float, ts_ms: int) -> None:
+        n = self._n
+        off = _SLOTS_OFFSET + (n % self.capacity) * _SLOT.size
+        eid = self._epic_id(epic)
+        _SEQ.pack_into(self.buf, off, 2 * n + 1)                       # Slot "in Arbeit"
+        _SLOT.pack_into(self.buf, off, 2 * n + 1, ts_ms, bid, ask, eid)
+        _SEQ.pack_into(self.buf, off, 2 * n + 2)                       # Slot fertig
+        self._n = n + 1
+        _SEQ.pack_into(self.buf, _WRITE_SEQ_OFFSET, n + 1)             # erst jetzt für Leser sichtbar
+
+    def publish_many(self, quotes) -> None:
+        for epic, bid, ask, ts_ms in quotes:
+            self.publish(epic, bid, ask, ts_ms)
+
+    def close(self, unlink: bool = True) -> None:
+        if unlink:
+            struct.pack_into("<I", self.buf, _WRITER_PID_OFFSET, 0)   # Leser: Bus ist weg
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class TickBusReader:
+    # Beliebig viele Leser, jeder mit eigenem Cursor.
+    #   start="latest" → nur neue Quotes, start="oldest" → alles, was noch im Ring liegt
+
+    def __init__(self, name: str, start: str = "latest"):
+        self.shm = _attach(name)
+        self.buf = self.shm.buf
+        magic, capacity, slot_size, _n_epics, writer_pid, head = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or slot_size != _SLOT.size:
+            self.shm.close()
+            raise ValueError(f"TickBus '{name}': unbekanntes Format")
+        if writer_pid == 0:
+            self.shm.close()
+            raise TickBusClosed(f"TickBus '{name}': Writer beendet")
+        self.name = name
+        self.capacity = capacity
+        self.cursor = head if start == "latest" else max(0, head - capacity)
+        self.dropped = 0
+        self._epics = []
+        self._load_epics()
+
+    def _load_epics(self) -> None:
+        n = struct.unpack_from("<I", self.buf, 16)[0]
+        self._epics = []
+        for i in range(n):
+            off = _EPIC_TABLE_OFFSET + i * _EPIC_LEN
+            self._epics.append(bytes(self.buf[off:off + _EPIC_LEN]).rstrip(b"\0").decode("utf-8"))
+
+    def head(self) -> int:
+        return _SEQ.unpack_from(self.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def lag(self) -> int:
+        # Anzahl Quotes, die dieser Leser noch nicht abgeholt hat
+        return self.head() - self.cursor
+
+    def poll(self, max_items: int = 4096) -> list:
+        # Liefert [(epic, bid, ask, ts_ms), ...] seit dem letzten poll – nicht blockierend
+        # TickBusClosed, sobald der Writer den Bus geschlossen oder ein neuer Writer ihn ersetzt hat
+        head = self.head()
+        if head == self.cursor and struct.unpack_from("<I", self.buf, _WRITER_PID_OFFSET)[0] == 0:
+            raise TickBusClosed(f"TickBus '{self.name}': Writer beendet bzw. ersetzt – neu verbinden")
+        if head - self.cursor > self.capacity:
+            # überrundet → auf das älteste noch gültige Element springen
+            skipped = head - self.capacity - self.cursor
+            self.dropped += skipped
+            self.cursor = head - self.capacity
+
+        out = []
+        end = min(head, self.cursor + max_items)
+        buf = self.buf
+        while self.cursor < end:
+            n = self.cursor
+            off = _SLOTS_OFFSET + (n % self.capacity) * _SLOT.size
+            seq1, ts_ms, bid, ask, eid = _SLOT.unpack_from(buf, off)
+            seq2 = _SEQ.unpack_from(buf, off)[0]
+            self.cursor = n + 1
+            if seq1 != 2 * n + 2 or seq2 != seq1:
+                # während des Lesens überschrieben → verloren
+                self.dropped += 1
+                continue
+            if eid >= len(self._epics):
+                self._load_epics()
+            out.append((self._epics[eid] if eid < len(self._epics) else str(eid), bid, ask, ts_ms))
+        return out
+
+    def close(self) -> None:
+        self.buf = None
+        self.shm.close()
+
+
+def iter_ticks(name: str, start: str = "latest", idle_sleep: float = 0.001, reconnect_sec: float = 1.0):
+    # Blockierender Generator für einfache Konsumenten (Recorder, Notebook);
+    # neuer Writer → automatisch neu verbinden (ab dem Anfang seines Rings)
+    rd = TickBusReader(name, start=start)
+    try:
+        while True:
+            try:
+                batch = rd.poll()
+            except TickBusClosed:
+                rd.close()
+                rd = None
+                while rd is None:
+                    time.sleep(reconnect_sec)
+                    try:
+                        rd = TickBusReader(name, start="oldest")
+                    except (FileNotFoundError, TickBusClosed):
+                        pass
+                continue
+            if not batch:
+                time.sleep(idle_sleep)
+                continue
+            yield from batch
+    finally:
+        if rd is not None:
+            rd.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Tick-Bus mitlesen (Quotes/s pro Epic, Lag, verlorene Quotes)")
+    ap.add_argument("--name", default="capital_ticks")
+    ap.add_argument("--start", default="latest", choices=["latest", "oldest"])
+    args = ap.parse_args()
+
+    rd = TickBusReader(args.name, start=args.start)
+    counts, last = {}, time.time()
+    try:
+        while True:
+            batch = rd.poll()
+            for epic, bid, ask, ts_ms in batch:
+                counts[epic] = counts.get(epic, 0) + 1
+            now = time.time()
+            if now - last >= 1.0:
+                age = (now * 1000 - batch[-1][3]) if batch else None
+                print(f"📡 {args.name}: " + "  ".join(f"{e}={c}/s" for e, c in counts.items())
+                      + f"  lag={rd.lag()}  dropped={rd.dropped}"
+                      + (f"  age={age:.0f}ms" if age is not None else ""))
+                counts, last = {}, now
+            if not batch:
+                time.sleep(0.001)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rd.close()
@@ -0,0 +1,236 @@
+# trade_excursions.py – MAE/MFE pro Trade aus bot_log.csv + Tick-Archiv (spaltenweise Tabelle als .npz)
+#
+# Für jeden abgeschlossenen Trade: maximale Gegen- (MAE) und Mit-Bewegung (MFE) zwischen Open und Close,
+# Zeit bis MFE/MAE, und welche Regime-Zustände (log_trade_regime: IMPULSE/RUN/FLAT) unterwegs galten.
+# Damit lässt sich prüfen, ob STOP_LOSS_PCT / TAKE_PROFIT_PCT sinnvoll sitzen (z.B. "MFE erreicht TP fast
+# nie" oder "Verlierer waren vorher deutlich im Plus").
+#   - Open/Close aus bot_log.csv (tick_archive.load_trades), Tick-Fenster per searchsorted auf dem Store
+#   - Preis wie check_protection_rules: LONG=Bid, SHORT=Ask; Exkursion x = ±(Preis − Entry)
+#   - Regime wie live: 1×/Sekunde, nur wenn Gewinn > REGIME_PROFIT_GATE_SPREADS·Spread, Extremwerte
+#     trade-lokal, Range über REGIME_RANGE_WINDOW_MS (Mid, tick_archive.rolling_range)
+# Ausgabe: trade_excursions.npz (eine Spalte pro Feld, Strings als Unicode-Arrays → np.load ohne pickle).
+# Inkrementell: bereits vorhandene Trades (epic, open_ms, deal_id) werden übersprungen, nur neue gerechnet.
+#
+# Aufruf:
+#   python trade_excursions.py                      → neue Trades ergänzen + Übersicht
+#   python trade_excursions.py --full --epic GOLD   → alles neu rechnen (nur GOLD)
+#   Notebook: d = dict(np.load("trade_excursions.npz"))
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import tradingbot_2 as bot
+from tick_archive import load_ticks, load_trades, rolling_range, tick_slice
+
+EXCURSIONS_NPZ = os.path.join(bot.BASE_DIR, "trade_excursions.npz")
+
+_STR_COLS = ("epic", "direction", "deal_id", "reason", "regime_last")
+_COLUMNS = (
+    "epic", "direction", "deal_id", "open_ms", "close_ms", "entry", "exit", "size", "pnl", "reason",
+    "sl_pct", "tp_pct", "spread_entry", "n_ticks", "hold_sec",
+    "mfe", "mae", "mfe_pct", "mae_pct", "mfe_spreads", "mae_spreads", "t_mfe_sec", "t_mae_sec", "capture",
+    "regime_impulse", "regime_run", "regime_flat", "regime_last",
+)
+_REGIME_NAMES = ("", "IMPULSE", "RUN", "FLAT")
+
+
+# ==============================
+# Regime entlang eines Trade-Pfads (log_trade_regime, vektorisiert)
+# ==============================
+def regime_along(ts: np.ndarray, x: np.ndarray, e: float, spread: np.ndarray, rng: np.ndarray) -> np.ndarray:
+    # Zustand je Tick (0 = nicht bewertet, 1/2/3 = IMPULSE/RUN/FLAT) – nur an bewerteten Ticks gesetzt
+    out = np.zeros(len(ts), dtype=np.int8)
+    pos = spread > 0
+    sec = ts // 1000
+    # 1×/Sekunde: erster Tick (mit Spread > 0) jeder neuen Sekunde
+    idx = np.flatnonzero(pos)
+    if not len(idx):
+        return out
+    first = np.ones(len(idx), dtype=bool)
+    first[1:] = sec[idx[1:]] != sec[idx[:-1]]
+    ev = idx[first]
+    upd = ev[(x[ev] - e) > bot.REGIME_PROFIT_GATE_SPREADS * spread[ev]]
+    if not len(upd):
+        return out
+    xu, tu = x[upd], ts[upd]
+    # neues Extrem = strikt über dem bisherigen Maximum (nur unter bewerteten Ticks)
+    prev_max = np.concatenate(([-np.inf], np.maximum.accumulate(xu)[:-1]))
+    new_peak = xu > prev_max
+    last_ext = np.maximum.accumulate(np.where(new_peak, tu, -1))
+    since = (tu - last_ext) / 1000.0
+    rs = rng[upd] / spread[upd]
+    st = np.where(since <= bot.REGIME_IMPULSE_MAX_SECS_SINCE_EXTREME, 1,
+                  np.where((since >= bot.REGIME_FLAT_MIN_SECS_SINCE_EXTREME) & (rs <= bot.REGIME_FLAT_MAX_RANGE_SPREADS),
+                           3, 2))
+    out[upd] = st
+    return out
+
+
+# ==============================
+# Kennzahlen
+# ==============================
+def _trade_key(epic, open_ms, deal_id) -> tuple:
+    return str(epic), int(open_ms), str(deal_id or "")
+
+
+def _param(t: dict, key: str) -> float:
+    # beim Open geloggter Parameterwert (NaN, wenn die Spalte fehlt/leer ist)
+    v = t["params"].get(key)
+    return float(v) if isinstance(v, (int, float)) else np.nan
+
+
+def compute(trades: list, tick_dir: str = None, tick_cache: dict = None) -> dict:
+    # → Spalten-Dict (_COLUMNS) für alle Trades mit Ticks im Archiv
+    window = bot.REGIME_RANGE_WINDOW_MS
+    cache = {} if tick_cache is None else tick_cache
+    rows = {k: [] for k in _COLUMNS}
+    for t in trades:
+        if t["close_ms"] is None or not isinstance(t["exit"], float):
+            continue
+        if t["epic"] not in cache:
+            try:
+                cache[t["epic"]] = load_ticks(t["epic"], tick_dir=tick_dir)
+            except FileNotFoundError:
+                cache[t["epic"]] = None
+        ticks = cache[t["epic"]]
+        if ticks is None:
+            continue
+        sl = tick_slice(ticks, t["open_ms"], t["close_ms"] + 1)
+        if sl.stop - sl.start < 1:
+            continue
+        pre = tick_slice(ticks, t["open_ms"] - window, t["open_ms"])
+        ts = np.asarray(ticks["ts"][pre.start:sl.stop])
+        bid = np.asarray(ticks["bid"][pre.start:sl.stop])
+        ask = np.asarray(ticks["ask"][pre.start:sl.stop])
+        rmin, rmax = rolling_range(ts, (bid + ask) / 2.0, window)
+        k = sl.start - pre.start
+        ts, bid, ask, rng = ts[k:], bid[k:], ask[k:], (rmax - rmin)[k:]
+
+        s = 1.0 if t["direction"] == "BUY" else -1.0
+        entry = t["entry"]
+        x = s * np.where(s > 0, bid, ask)
+        exc = x - s * entry
+        spread = ask - bid
+        i_mfe, i_mae = int(np.argmax(exc)), int(np.argmin(exc))
+        mfe, mae = max(float(exc[i_mfe]), 0.0), max(-float(exc[i_mae]), 0.0)
+        sp0 = float(spread[0]) if spread[0] > 0 else np.nan
+        realized = s * (t["exit"] - entry)
+        size = t["size"] if isinstance(t["size"], float) else float(bot.MANUAL_TRADE_SIZE)
+        reg = regime_along(ts, x, s * entry, spread, rng)
+        seen = reg[reg > 0]
+
+        rows["epic"].append(t["epic"])
+        rows["direction"].append(t["direction"])
+        rows["deal_id"].append(t["deal_id"] or "")
+        rows["open_ms"].append(t["open_ms"])
+        rows["close_ms"].append(t["close_ms"])
+        rows["entry"].append(entry)
+        rows["exit"].append(t["exit"])
+        rows["size"].append(size)
+        rows["pnl"].append(t["pnl"] if isinstance(t["pnl"], float) else realized * size)
+        rows["reason"].append(t["reason"] or "")
+        rows["sl_pct"].append(_param(t, "STOP_LOSS_PCT"))
+        rows["tp_pct"].append(_param(t, "TAKE_PROFIT_PCT"))
+        rows["spread_entry"].append(sp0)
+        rows["n_ticks"].append(len(ts))
+        rows["hold_sec"].append((t["close_ms"] - t["open_ms"]) / 1000.0)
+        rows["mfe"].append(mfe)
+        rows["mae"].append(mae)
+        rows["mfe_pct"].append(mfe / entry * 100.0)
+        rows["mae_pct"].append(mae / entry * 100.0)
+        rows["mfe_spreads"].append(mfe / sp0)
+        rows["mae_spreads"].append(mae / sp0)
+        rows["t_mfe_sec"].append((ts[i_mfe] - t["open_ms"]) / 1000.0)
+        rows["t_mae_sec"].append((ts[i_mae] - t["open_ms"]) / 1000.0)
+        rows["capture"].append(realized / mfe if mfe > 0 else np.nan)
+        rows["regime_impulse"].append(int((seen == 1).sum()))
+        rows["regime_run"].append(int((seen == 2).sum()))
+        rows["regime_flat"].append(int((seen == 3).sum()))
+        rows["regime_last"].append(_REGIME_NAMES[int(seen[-1])] if len(seen) else "")
+    return _to_columns(rows)
+
+
+def _to_columns(rows: dict) -> dict:
+    out = {}
+    for k in _COLUMNS:
+        if k in _STR_COLS:
+            out[k] = np.array(rows[k], dtype=str)
+        elif k in ("open_ms", "close_ms", "n_ticks", "regime_impulse", "regime_run", "regime_flat"):
+            out[k] = np.array(rows[k], dtype=np.int64)
+        else:
+            out[k] = np.array(rows[k], dtype=np.float64)
+    return out
+
+
+# ==============================
+# Tabelle lesen/schreiben (inkrementell)
+# ==============================
+def load_table(path: str = EXCURSIONS_NPZ) -> dict:
+    if not os.path.isfile(path):
+        return _to_columns({k: [] for k in _COLUMNS})
+    with np.load(path) as z:
+        return {k: z[k] for k in _COLUMNS}
+
+
+def save_table(table: dict, path: str = EXCURSIONS_NPZ) -> None:
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **table)
+    os.replace(tmp, path)
+
+
+def update_table(log_path: str = bot.LOG_CSV, out_path: str = EXCURSIONS_NPZ, epics=None,
+                 tick_dir: str = None, full: bool = False) -> tuple:
+    # → (Tabelle, Anzahl neu gerechneter Trades); nur Trades, die noch nicht in der Tabelle stehen
+    trades = load_trades(log_path, epics)
+    table = _to_columns({k: [] for k in _COLUMNS}) if full else load_table(out_path)
+    have = {_trade_key(e, o, d) for e, o, d in zip(table["epic"], table["open_ms"], table["deal_id"])}
+    new = [t for t in trades if _trade_key(t["epic"], t["open_ms"], t["deal_id"]) not in have]
+    add = compute(new, tick_dir)
+    if len(add["open_ms"]):
+        table = {k: np.concatenate([table[k], add[k]]) for k in _COLUMNS}
+        order = np.lexsort((table["epic"], table["open_ms"]))
+        table = {k: v[order] for k, v in table.items()}
+    save_table(table, out_path)
+    return table, len(add["open_ms"])
+
+
+def summary(table: dict) -> str:
+    n = len(table["open_ms"])
+    if not n:
+        return "ℹ️ keine Trades in der Tabelle"
+    def med(k):
+        return float(np.nanmedian(table[k]))
+
+    win = table["pnl"] > 0
+    lines = [
+        f"📐 {n} Trades | MFE median {med('mfe_pct'):.3f}% ({med('mfe_spreads'):.1f} Spreads, nach {med('t_mfe_sec'):.0f}s) | "
+        f"MAE median {med('mae_pct'):.3f}% ({med('mae_spreads'):.1f} Spreads)",
+    ]
+    tp, sl = table["tp_pct"] * 100.0, table["sl_pct"] * 100.0
+    if np.isfinite(tp).any():
+        lines.append(f"   MFE ≥ TP: {np.nanmean(table['mfe_pct'] >= tp) * 100:.1f}% | "
+                     f"MAE ≥ SL: {np.nanmean(table['mae_pct'] >= sl) * 100:.1f}%")
+    if (~win).any():
+        lines.append(f"   Verlierer mit MFE ≥ 2 Spreads vorher: {np.mean(table['mfe_spreads'][~win] >= 2) * 100:.1f}% | "
+                     f"Capture (realisiert/MFE) median: {float(np.nanmedian(table['capture'])):.2f}")
+    lines.append(f"   Regime-Sekunden: IMPULSE={table['regime_impulse'].sum()} RUN={table['regime_run'].sum()} "
+                 f"FLAT={table['regime_flat'].sum()}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="MAE/MFE pro Trade aus bot_log.csv + Tick-Archiv")
+    ap.add_argument("--log", default=bot.LOG_CSV, help="bot_log.csv")
+    ap.add_argument("--epic", action="append", help="nur Trades dieser Epics")
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--out", default=EXCURSIONS_NPZ)
+    ap.add_argument("--full", action="store_true", help="alles neu rechnen statt nur neue Trades")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    table, n_new = update_table(args.log, args.out, args.epic, args.dir, args.full)
+    print(f"🧮 {n_new} Trades neu, {len(table['open_ms'])} gesamt ({time.perf_counter() - t0:.2f}s) → {args.out}")
+    print(summary(table))
@@ -2,10 +2,19 @@
 
 import os
 import json
+import re
 import requests
 import asyncio
 import websockets
 import time
+import random
+import bisect
+import sys
+import threading
+import traceback
+import tracemalloc
+import signal
+from concurrent.futures import ThreadPoolExecutor
 import cProfile
 import pstats
 from datetime import datetime, timezone
@@ -42,7 +51,7 @@ USERNAME = os.getenv("CAPITAL_USERNAME") or "carsten.schoettke@gmx.de"
 PWD      = os.getenv("CAPITAL_PASSWORD") or "G8ZdGJHN7VB9vJy_"
 
 # API Adressen
-BASE_STREAM = "wss://api-streaming-capital.backend-capital.com/connect"
+BASE_STREAM = os.getenv("CAPITAL_STREAM_URL") or "wss://api-streaming-capital.backend-capital.com/connect"  # Override z.B. für lokalen Stand-in
 # Basis-URLs LIVE
 #BASE_REST   = "https://api-capital.backend-capital.com"
 #ACCOUNT  = os.getenv("CAPITAL_ACCOUNT_TYPE", "live")  # "demo" oder "live"
@@ -63,8 +72,87 @@ CST, XSEC = None, None
 # CONFIG ping
 # ==============================
 PING_INTERVAL    = 15   # Sekunden zwischen WebSocket-Pings
-RECONNECT_DELAY  = 3    # Sekunden warten nach Verbindungsabbruch
 RECV_TIMEOUT     = 60   # Sekunden Timeout fürs Warten auf eine 
+FEED_MAX_QUEUE   = 4096 # max. gepufferte Frames pro Verbindung (websockets max_queue)
+FEED_MAX_BATCH   = 1024 # max. Nachrichten, die pro Aufwachen am Stück abgeholt werden
+
+# ==============================
+# CONFIG Reconnect (Zustandsmaschine)
+# ==============================
+# 1. Abbruch → sofort neu verbinden (Tokens bleiben, solange kein Auth-Fehler kam)
+# ab dem 2. Fehlversuch in Folge → exponentieller Backoff mit Jitter
+RECONNECT_BACKOFF_BASE = 0.5    # Sekunden Wartezeit beim 2. Fehlversuch in Folge
+RECONNECT_BACKOFF_MAX  = 30.0   # Obergrenze für den Backoff (Sekunden)
+RECONNECT_JITTER       = 0.3    # ±30 % Zufallsstreuung, damit nicht im Gleichtakt reconnectet wird
+RECONNECT_STATS_LEN    = 100    # so viele Downtimes werden für die Statistik gemerkt
+
+# ==============================
+# CONFIG Redundanter Feed
+# ==============================
+FEED_CONNECTIONS        = 1     # Anzahl paralleler Quote-Verbindungen (2 = Dual-Feed, sofortiges Failover)
+FEED_DEDUP_WINDOW       = 512   # pro Epic gemerkte Quote-Keys (epic, timestamp, bid, ofr) für die Duplikaterkennung
+FEED_STATS_INTERVAL_SEC = 300   # alle X Sekunden Latenz-/Gewinner-Statistik pro Verbindung ausgeben
+TICK_BUS_NAME = os.getenv("TICK_BUS_NAME") or None  # gesetzt → jede angenommene Quote geht auch in den Shared-Memory-Tick-Bus (tick_bus.py)
+
+# ==============================
+# CONFIG Sharding (Worker-Modus, siehe shard_coordinator.py)
+# ==============================
+SHARD_COORDINATOR = os.getenv("SHARD_COORDINATOR") or None  # "host:port" → Epics kommen vom Coordinator statt aus INSTRUMENTS
+SHARD_WORKER_ID   = os.getenv("SHARD_WORKER_ID") or f"w{os.getpid()}"
+SHARD_RISK_TIMEOUT_SEC = 1.0  # max. Wartezeit auf den globalen Risiko-Slot vor einem Open (Timeout = kein Trade)
+
+# ==============================
+# CONFIG Stale-Feed-Watchdog (pro Epic)
+# ==============================
+STALE_CHECK_INTERVAL_SEC  = 0.5    # wie oft der Watchdog prüft
+STALE_GAP_WINDOW          = 256    # so viele Inter-Arrival-Zeiten pro Epic für den Median
+STALE_MIN_SAMPLES         = 20     # erst ab X Samples statistisch urteilen (sonst STALE_MAX_GAP_SEC)
+STALE_GAP_MULT            = 20.0   # stale, wenn Lücke > X × Median der Inter-Arrival-Zeit
+STALE_MIN_GAP_SEC         = 2.0    # Untergrenze der Schwelle (sehr schnelle Märkte / Burst-Phasen)
+STALE_MAX_GAP_SEC         = 15.0   # Obergrenze der Schwelle → Blindfenster max. X Sekunden statt RECV_TIMEOUT
+STALE_RECONNECT_AFTER_SEC = 15.0   # bleibt ein Epic trotz Resubscribe X s stale → Feed-Reconnect
+STALE_ACTION_OPEN_TRADE   = "LOG"  # "LOG" = nur warnen, "CLOSE" = offenen Trade des stale Epics schließen
+
+# ==============================
+# CONFIG Feed-Latenz / Uhrversatz (Empfangszeit − Quote-Timestamp, pro Epic)
+# ==============================
+LATENCY_WINDOW_SEC         = 60      # Fensterlänge: pro Fenster Min/p50/p95/p99 der Quote-Alter
+LATENCY_WINDOW_MAX_SAMPLES = 20000   # Obergrenze Samples pro Fenster (Burst-Schutz)
+LATENCY_HISTORY            = 120     # so viele abgeschlossene Fenster pro Epic (Versatz-/Drift-Schätzung)
+LATENCY_DRIFT_MIN_WINDOWS  = 10      # Drift erst ab X Fenstern schätzen
+LATENCY_DRIFT_ALERT_MS_PER_H = 200.0 # Alarm, wenn die lokale Uhr mehr als X ms/h gegenüber dem Feed wandert
+LATENCY_OFFSET_ALERT_MS    = 1000.0  # Alarm, wenn der Versatz (Uhr + minimale Netzlatenz) betragsmäßig > X ms
+LATENCY_ALERT_MULT         = 3.0     # Alarm, wenn p95 (ohne Versatz) > X × Baseline …
+LATENCY_ALERT_MIN_MS       = 250.0   # … und zugleich > X ms (kein Alarm bei 5 → 15 ms)
+LATENCY_BASELINE_ALPHA     = 0.1     # EWMA-Gewicht der p95-Baseline (nur Fenster ohne Alarm fließen ein)
+LATENCY_STALE_QUOTE_MS     = 1500.0  # Stop/TP-Entscheidung auf einer Quote, die älter ist → im Trade-Log markiert
+LATENCY_CLOCK_SYNCED       = True    # lokale Uhr per NTP synchron → Quote-Alter roh (Versatz = echte Feed-Verzögerung);
+                                     # False → geschätzten Versatz (Uhr + minimale Netzlatenz) abziehen
+LATENCY_STATS_INTERVAL_SEC = 300     # alle X Sekunden Latenz-Übersicht ausgeben
+
+# ==============================
+# CONFIG Tick-Pipeline (Backpressure / Konflation)
+# ==============================
+PIPELINE_COSMETIC_MAX_AGE_MS = 1000  # unter Last: Forming-Anzeige/Chart/Regime-Log spätestens alle X ms
+PIPELINE_STATS_INTERVAL_SEC  = 300   # alle X Sekunden Pipeline-Zähler ausgeben
+
+# ==============================
+# CONFIG Candle-Close
+# ==============================
+CANDLE_CLOSE_MODE      = "TIMER"  # "TIMER" = Close an der Minutengrenze (+Grace), "TICK" = erst beim 1. Tick der Folgeminute (alt)
+CANDLE_CLOSE_GRACE_MS  = 150      # so lange nach der Minutengrenze (Broker-Zeit + gemessener Uhrversatz) dürfen verspätete Ticks noch in die Candle
+CANDLE_CLOSE_STATS_LEN = 500      # so viele Close-Delays pro Modus für die Statistik
+
+# ==============================
+# CONFIG Order-Confirm
+# ==============================
+# OPTIMISTIC_OPEN: Position wird schon bei Order-Annahme (HTTP 200 + dealReference) als "pending"
+# mit vorläufigen Levels registriert → Schutz-Regeln greifen sofort. Der Confirm (Fill, dealId)
+# wird im Hintergrund abgeholt und eingearbeitet.
+OPTIMISTIC_OPEN           = True
+CONFIRM_TIMEOUT_SEC       = 5.0   # so lange wird /confirms/{ref} gepollt, danach Abgleich über /positions
+CONFIRM_POLL_INTERVAL_SEC = 0.25  # Abstand zwischen zwei Confirm-Abfragen
+CONFIRM_RETRY_MAX_SEC     = 30.0  # get_positions fehlgeschlagen → pending bleibt, Wiederholung mit Backoff bis hierhin
 
 # ==============================
 # # --- Laufzeit / Profiling ---
@@ -72,6 +160,26 @@ RECV_TIMEOUT     = 60   # Sekunden Timeout fürs Warten auf eine
 ENABLE_PROFILING = False
 PROFILE_OUT_FILE = "profile_bot_1.txt"
 
+# Laufzeit-Profiler (ohne Neustart): SIGUSR2 bzw. Admin POST /profile/start|stop
+PROFILE_WINDOW_SEC         = 60     # Standard-Fensterlänge, danach wird automatisch geschrieben
+PROFILE_SAMPLE_INTERVAL_MS = 5      # Sampling-Intervall für die Collapsed-Stacks (Flame-Graph)
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+
+# Event-Loop-Lag: misst, wie spät der Loop geplante Callbacks ausführt, und hält den Stack des Blockierers fest
+LOOP_LAG_INTERVAL_MS       = 50     # Messtakt des Lag-Tasks
+LOOP_LAG_THRESHOLD_MS      = 100    # ab dieser Blockade wird der Stack des Loop-Threads mitgeschnitten
+LOOP_LAG_WINDOW            = 6000   # so viele Lag-Messungen für die Perzentile (~5 min bei 50 ms)
+LOOP_LAG_STATS_INTERVAL_SEC = 300   # alle X Sekunden p50/p95/p99/max ausgeben
+LOOP_LAG_LOG = os.path.join(BASE_DIR, "loop_lag.log")  # Blockaden inkl. Stack (nur Live-Bot)
+
+# Speicher-Tracking für Langläufer (opt-in, tracemalloc kostet spürbar CPU/RAM): BOT_MEMTRACK=1
+MEMTRACK_ENABLED      = os.getenv("BOT_MEMTRACK") == "1"
+MEMTRACK_INTERVAL_SEC = 600    # Snapshot-Abstand
+MEMTRACK_FRAMES       = 5      # Stack-Tiefe pro Allokation (mehr = genauer, teurer)
+MEMTRACK_TOP          = 10     # so viele am stärksten wachsende Allokationsstellen pro Snapshot
+MEMTRACK_DUMP_MB      = 1024   # ab so viel getracktem Speicher einmalig einen Heap-Dump schreiben (0 = nie)
+MEMTRACK_LOG = os.path.join(BASE_DIR, "memtrack.log")
+
 # ==============================
 # STRATEGIE-EINSTELLUNGEN
 # ==============================
@@ -92,6 +200,40 @@ EMA_SLOW = 18 # 11 #21  # lange EMA-Periode (z. B. 21, 30, 50)
 
 TRADE_RISK_PCT = 0.0025  # 2% vom verfügbaren Kapital pro Trade
 MANUAL_TRADE_SIZE = 0.3 # ETHUSD 0.3 ~1000€, XRPUSD 400 ~1000€, BTCUSD 0.01 ~1000€
+USE_RISK_SIZING = False # True = Größe aus TRADE_RISK_PCT + gecachten Konto-/Marktdaten, False = MANUAL_TRADE_SIZE
+
+# Metadaten-Cache (Konto + Markt) – wird im Hintergrund aufgefrischt, Entry liest nur aus dem Speicher
+META_ACCOUNT_TTL_SEC    = 60    # Kontostand ändert sich mit jedem Trade → kurz
+META_MARKET_TTL_SEC     = 3600  # Contract Size / Margin Factor / Min Deal Size ändern sich selten
+META_REFRESH_CHECK_SEC  = 5     # so oft prüft der Hintergrund-Task, ob etwas abgelaufen ist
+META_REQUEST_TIMEOUT_SEC = 5    # REST-Timeout pro Abruf (langsame API blockiert nur den Refresh-Thread)
+
+# ==============================
+# CONFIG REST-Budget (broker_request)
+# ==============================
+# Token-Bucket pro Endpoint: (Requests pro Sekunde, Burst). "*" = Gesamtbudget über alle Endpoints.
+# Angelehnt an die Capital.com-Limits (10 Req/s pro User, 1 Order / 0,1 s, 1 Session-Request / s).
+REST_BUDGETS = {
+    "*":                   (10.0, 10),
+    "POST /session":       (1.0, 1),
+    "POST /positions":     (10.0, 1),
+    "DELETE /positions/*": (10.0, 10),  # Burst = Gesamtbudget, damit flatten_all in einer Runde schließt
+    "GET /positions":      (5.0, 5),
+}
+# Kurzlebiger Cache für identische Reads (Sekunden). Jeder POST/DELETE invalidiert den Cache.
+REST_CACHE_TTL = {
+    "GET /positions": 0.5,
+}
+REST_STATS_INTERVAL_SEC = 3600  # so oft werden eingesparte Calls ausgegeben
+REST_LOOP_OVERDRAFT = 2.0       # Aufrufe im Event-Loop warten nie: so viele Tokens dürfen sie vorziehen, danach RestThrottled
+
+# ==============================
+# CONFIG Kill-Switch (flatten_all)
+# ==============================
+FLATTEN_MAX_RETRIES     = 3     # so oft werden Nachzügler (noch offene Positionen) erneut geschlossen
+FLATTEN_RETRY_DELAY_SEC = 0.5   # Pause vor jedem Retry
+FLATTEN_PENDING_WAIT_SEC = 6.0  # so lange wird auf Confirms optimistisch offener (pending) Positionen gewartet
+ADMIN_HTTP_PORT = int(os.getenv("BOT_ADMIN_PORT", "0")) or None  # lokaler Admin-Endpoint (nur 127.0.0.1), None = aus
 USE_HMA = True  # Wenn False → klassische EMA, wenn True → Hull MA
 
 # ==============================
@@ -129,6 +271,11 @@ PULLBACK_FAR_MA_MIN_DISTANCE_SPREADS = 8.0
 CONFIRM_MIN_CLOSE_DELTA_SPREADS = 0.3 # ursprünglich 2.0, Wert * spread zwischen zwei aufeinanderfolgenden Candle-Closes, ab dem Trade zugelassen wird
 REGIME_MIN_DIRECTIONALITY = 0.05
 
+# Intrabar-Entry: in WAIT_CONFIRM ist der Confirm-Preis schon beim Close bekannt
+# (last_close ± CONFIRM_MIN_CLOSE_DELTA_SPREADS * spread) → Entry beim ersten Tick, der ihn kreuzt,
+# statt erst beim nächsten Candle-Close
+INTRABAR_ENTRY = False
+
 # ==============================
 # Risk Management Parameter
 # ==============================
@@ -161,6 +308,8 @@ BREAK_EVEN_BUFFER_PCT     = 0.0002 # Puffer über BREAK_EVEN_STOP, ab dem der BE
 # Pullback/Retest State pro Instrument (Variante 1)
 # --------------------------------------------
 _TREND_STATE = {}  # epic -> {"state": str, "dir": "LONG"/"SHORT"/None, "armed": bool}
+_INTRABAR = {}      # epic -> {"dir", "price" (Mid-Trigger), "ma_type", "deadline_ms"} – nur bei INTRABAR_ENTRY
+_INTRABAR_STATS = {"armed": 0, "fired": 0, "stale": 0, "lead_ms": deque(maxlen=200)}
 
 
 
@@ -414,52 +563,345 @@ candle_history = {epic: deque(maxlen=200) for epic in INSTRUMENTS}
 # Merker: pro Instrument zuletzt ausgegebene Sekunde
 last_printed_sec = {epic: None for epic in INSTRUMENTS}
 
+# ==============================
+# BROKER-CALL-SCHICHT: alle REST-Aufrufe laufen über broker_request
+#   - Single-Flight: gleichzeitige identische GETs teilen sich einen Request
+#   - Kurz-Cache: sehr frische GET-Ergebnisse (REST_CACHE_TTL) werden wiederverwendet
+#   - Budget: Token-Bucket pro Endpoint + gesamt (REST_BUDGETS), bei Bedarf wird gewartet – nur in
+#     Worker-Threads. Im Event-Loop (Orders aus check_protection_rules/safe_close) wird nie geschlafen:
+#     bis REST_LOOP_OVERDRAFT Tokens vorziehen (Threads zahlen sie danach ab), sonst sofort RestThrottled
+#   - POST/DELETE erhöhen die Generation → Cache und laufende Flights gelten als veraltet
+# Thread-sicher, da REST auch aus asyncio.to_thread heraus aufgerufen wird.
+# ==============================
+_REST_LOCK = threading.Lock()
+_REST = {
+    "buckets": {},      # endpoint -> {"tokens", "ts"}
+    "inflight": {},     # (url, CST, gen) -> {"event", "resp", "exc"}
+    "cache": {},        # (url, CST) -> (gen, ts, resp)
+    "gen": 0,
+    "stats": {"sent": 0, "saved_cache": 0, "saved_singleflight": 0, "throttled": 0, "throttle_wait_s": 0.0,
+              "loop_overdraft": 0, "loop_rejected": 0},
+    "by_endpoint": {},  # endpoint -> {"sent", "saved"}
+    "started": time.time(),
+    "last_report": time.time(),
+}
+
+
+def _rest_endpoint(method: str, url: str) -> str:
+    # "GET https://…/api/v1/positions/DEAL123" → "GET /positions/*"
+    path = url.split("/api/v1", 1)[-1].split("?", 1)[0]
+    parts = [p for p in path.split("/") if p]
+    if len(parts) > 1:
+        parts = parts[:1] + ["*"]
+    return f"{method} /" + "/".join(parts)
+
+
+class RestThrottled(RuntimeError):
+    # Budget erschöpft und Aufruf im Event-Loop (dort wird nicht geschlafen) → Aufrufer versucht es später
+    pass
+
+
+def _rest_take_token(endpoint: str) -> None:
+    # Worker-Thread: blockiert, bis im Gesamt- und im Endpoint-Budget ein Token frei ist.
+    # Event-Loop: nie schlafen – Token vorziehen (bis REST_LOOP_OVERDRAFT) oder RestThrottled
+    on_loop = _running_loop() is not None
+    waited = 0.0
+    keys = ["*"] + ([endpoint] if endpoint in REST_BUDGETS else [])
+    while True:
+        with _REST_LOCK:
+            now = time.monotonic()
+            wait = 0.0
+            low = float("inf")
+            for k in keys:
+                rate, burst = REST_BUDGETS[k]
+                b = _REST["buckets"].setdefault(k, {"tokens": float(burst), "ts": now})
+                b["tokens"] = min(float(burst), b["tokens"] + (now - b["ts"]) * rate)
+                b["ts"] = now
+                low = min(low, b["tokens"])
+                if b["tokens"] < 1.0:
+                    wait = max(wait, (1.0 - b["tokens"]) / rate)
+            if wait > 0.0 and on_loop:
+                if low < 1.0 - REST_LOOP_OVERDRAFT:
+                    _REST["stats"]["loop_rejected"] += 1
+                    raise RestThrottled(f"{endpoint}: REST-Budget erschöpft (Event-Loop, kein Warten)")
+                _REST["stats"]["loop_overdraft"] += 1
+                wait = 0.0
+            if wait <= 0.0:
+                for k in keys:
+                    _REST["buckets"][k]["tokens"] -= 1.0
+                if waited > 0.0:
+                    _REST["stats"]["throttled"] += 1
+                    _REST["stats"]["throttle_wait_s"] += waited
+                return
+        time.sleep(wait)
+        waited += wait
+
+
+def _rest_send(method: str, endpoint: str, url: str, **kwargs):
+    _rest_take_token(endpoint)
+    r = getattr(requests, method.lower())(url, **kwargs)
+    with _REST_LOCK:
+        _REST["stats"]["sent"] += 1
+        _REST["by_endpoint"].setdefault(endpoint, {"sent": 0, "saved": 0})["sent"] += 1
+    return r
+
+
+def _rest_saved(endpoint: str, kind: str) -> None:
+    with _REST_LOCK:
+        _REST["stats"][kind] += 1
+        _REST["by_endpoint"].setdefault(endpoint, {"sent": 0, "saved": 0})["saved"] += 1
+
+
+def broker_request(method: str, url: str, headers=None, json=None, timeout=None):
+    method = method.upper()
+    endpoint = _rest_endpoint(method, url)
+    kwargs = {"headers": headers}
+    if json is not None:
+        kwargs["json"] = json
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+
+    if method != "GET":
+        r = _rest_send(method, endpoint, url, **kwargs)
+        with _REST_LOCK:
+            # Schreibzugriff → alle gecachten/laufenden Reads sind ab jetzt veraltet
+            _REST["gen"] += 1
+            _REST["cache"].clear()
+        _rest_maybe_report()
+        return r
+
+    key = (url, (headers or {}).get("CST"))
+    ttl = REST_CACHE_TTL.get(endpoint)
+    with _REST_LOCK:
+        gen = _REST["gen"]
+        cached = _REST["cache"].get(key)
+        if ttl and cached and cached[0] == gen and time.monotonic() - cached[1] < ttl:
+            hit = cached[2]
+        else:
+            hit = None
+            flight = _REST["inflight"].get(key + (gen,))
+            leader = flight is None
+            if leader:
+                flight = {"event": threading.Event(), "resp": None, "exc": None}
+                _REST["inflight"][key + (gen,)] = flight
+
+    if hit is not None:
+        _rest_saved(endpoint, "saved_cache")
+        return hit
+
+    if not leader:
+        # Identischer Request läuft bereits → auf dessen Ergebnis warten
+        flight["event"].wait()
+        _rest_saved(endpoint, "saved_singleflight")
+        if flight["exc"] is not None:
+            raise flight["exc"]
+        return flight["resp"]
+
+    try:
+        r = _rest_send(method, endpoint, url, **kwargs)
+        flight["resp"] = r
+        return r
+    except Exception as e:
+        flight["exc"] = e
+        raise
+    finally:
+        with _REST_LOCK:
+            _REST["inflight"].pop(key + (gen,), None)
+            r = flight["resp"]
+            if ttl and r is not None and r.status_code == 200 and _REST["gen"] == gen:
+                _REST["cache"][key] = (gen, time.monotonic(), r)
+        flight["event"].set()
+        _rest_maybe_report()
+
+
+def rest_stats() -> dict:
+    with _REST_LOCK:
+        st = dict(_REST["stats"])
+        by_ep = {k: dict(v) for k, v in _REST["by_endpoint"].items()}
+        hours = max(1e-9, (time.time() - _REST["started"]) / 3600.0)
+    saved = st["saved_cache"] + st["saved_singleflight"]
+    st["saved_per_hour"] = saved / hours
+    st["by_endpoint"] = by_ep
+    return st
+
+
+def _rest_maybe_report() -> None:
+    now = time.time()
+    if now - _REST["last_report"] < REST_STATS_INTERVAL_SEC:
+        return
+    _REST["last_report"] = now
+    st = rest_stats()
+    print(
+        f"🌐 [REST] gesendet={st['sent']} gespart={st['saved_cache'] + st['saved_singleflight']} "
+        f"(Cache={st['saved_cache']}, Single-Flight={st['saved_singleflight']}) "
+        f"→ {st['saved_per_hour']:.0f} Calls/h gespart | gedrosselt={st['throttled']} "
+        f"({st['throttle_wait_s']:.2f}s) | Loop vorgezogen={st['loop_overdraft']} abgewiesen={st['loop_rejected']}"
+    )
+
+
+# ==============================
+# METADATEN-CACHE: Konto (/accounts) + Markt (/markets/{epic})
+# Hintergrund-Task frischt per TTL auf (REST im Thread), calc_trade_size liest nur
+# den letzten gültigen Stand. Fehlschläge behalten den alten Stand (last known good).
+# ==============================
+_META = {
+    "account": None,   # {"available", "balance", "currency", "ts"}
+    "markets": {},     # epic -> {"contract_size", "margin_factor", "min_deal_size", "lot_size", "size_increment", "bid", "ts"}
+    "refreshes": 0,
+    "errors": 0,
+}
+
+
+def _meta_headers(CST, XSEC):
+    return {
+        "X-CAP-API-KEY": API_KEY,
+        "CST": CST,
+        "X-SECURITY-TOKEN": XSEC,
+        "Accept": "application/json"
+    }
+
+
+def _float_or_none(v):
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _fetch_account_meta(CST, XSEC):
+    r = broker_request("GET", f"{BASE_REST}/api/v1/accounts", headers=_meta_headers(CST, XSEC),
+                       timeout=META_REQUEST_TIMEOUT_SEC)
+    if r.status_code != 200:
+        raise RuntimeError(f"/accounts HTTP {r.status_code}")
+    data = r.json()
+    accounts = data.get("accounts") or []
+    acc = next((a for a in accounts if a.get("preferred")), accounts[0] if accounts else {})
+    bal = acc.get("balance") or {}
+    available = _float_or_none(bal.get("available"))
+    if available is None:
+        available = _float_or_none(data.get("availableToDeal"))
+    if available is None:
+        raise RuntimeError("/accounts ohne verfügbaren Kontostand")
+    return {
+        "available": available,
+        "balance": _float_or_none(bal.get("balance")),
+        "currency": acc.get("currency"),
+        "ts": time.time(),
+    }
+
+
+def _fetch_market_meta(CST, XSEC, epic):
+    r = broker_request("GET", f"{BASE_REST}/api/v1/markets/{epic}", headers=_meta_headers(CST, XSEC),
+                       timeout=META_REQUEST_TIMEOUT_SEC)
+    if r.status_code != 200:
+        raise RuntimeError(f"/markets/{epic} HTTP {r.status_code}")
+    data = r.json()
+    inst = data.get("instrument") or {}
+    rules = data.get("dealingRules") or {}
+    snap = data.get("snapshot") or {}
+
+    margin_factor = _float_or_none(inst.get("marginFactor"))
+    if margin_factor is not None and str(inst.get("marginFactorUnit", "PERCENTAGE")).upper() == "PERCENTAGE":
+        margin_factor /= 100.0  # kommt in %
+
+    return {
+        "contract_size": _float_or_none(inst.get("contractSize")) or 1.0,
+        "margin_factor": margin_factor,
+        "min_deal_size": _float_or_none((rules.get("minDealSize") or {}).get("value")),
+        "lot_size": _float_or_none(inst.get("lotSize")),
+        "size_increment": _float_or_none((rules.get("minSizeIncrement") or {}).get("value")),
+        "bid": _float_or_none(snap.get("bid")),
+        "ts": time.time(),
+    }
+
+
+def refresh_metadata(CST, XSEC, force=False) -> None:
+    # Abgelaufene Einträge neu laden – blockierend, daher nur aus Thread/Notebook aufrufen.
+    # Nur calc_trade_size liest den Cache → ohne USE_RISK_SIZING kein REST-Budget dafür ausgeben
+    if not (USE_RISK_SIZING or force):
+        return
+    now = time.time()
+    acc = _META["account"]
+    if force or acc is None or now - acc["ts"] >= META_ACCOUNT_TTL_SEC:
+        try:
+            _META["account"] = _fetch_account_meta(CST, XSEC)
+            _META["refreshes"] += 1
+        except Exception as e:
+            _META["errors"] += 1
+            print(f"⚠️ [META] Konto-Refresh fehlgeschlagen, nutze letzten Stand: {e}")
+
+    for epic in INSTRUMENTS:
+        m = _META["markets"].get(epic)
+        if force or m is None or now - m["ts"] >= META_MARKET_TTL_SEC:
+            try:
+                _META["markets"][epic] = _fetch_market_meta(CST, XSEC, epic)
+                _META["refreshes"] += 1
+            except Exception as e:
+                _META["errors"] += 1
+                print(f"⚠️ [META] Markt-Refresh {epic} fehlgeschlagen, nutze letzten Stand: {e}")
+
+
+async def _metadata_refresher():
+    while True:
+        if CST and XSEC:
+            try:
+                await asyncio.to_thread(refresh_metadata, CST, XSEC)
+            except Exception as e:
+                print(f"⚠️ [META] Refresh-Task Fehler: {e}")
+        await asyncio.sleep(META_REFRESH_CHECK_SEC)
+
+
+def metadata_stats() -> dict:
+    now = time.time()
+    acc = _META["account"]
+    return {
+        "account_age_s": (now - acc["ts"]) if acc else None,
+        "market_age_s": {e: now - m["ts"] for e, m in _META["markets"].items()},
+        "refreshes": _META["refreshes"],
+        "errors": _META["errors"],
+    }
+
+
 # ==============================
 # TRADE berechnen aufgrund von verfügbarem Kontostand und %-davon
 # ==============================
 
-def calc_trade_size(CST, XSEC, epic, risk_pct=TRADE_RISK_PCT):
-    # # 1. Kontostand abrufen
-    # url_acc = f"{BASE_REST}/api/v1/accounts"
-    # headers = {
-    #     "X-CAP-API-KEY": API_KEY,
-    #     "CST": CST,
-    #     "X-SECURITY-TOKEN": XSEC,
-    #     "Accept": "application/json"
-    # }
-    # r_acc = requests.get(url_acc, headers=headers)
-    # if r_acc.status_code != 200:
-    #     print("⚠️ Fehler beim Abrufen des Kontostands:", r_acc.status_code, r_acc.text)
-    #     return 1
-    # acc_data = r_acc.json()
-    # available = float(acc_data.get("availableToDeal", 0))
-    # risk_amount = available * risk_pct
-
-    # # 2. Instrument-Infos abrufen
-    # url_mkt = f"{BASE_REST}/api/v1/markets/{epic}"
-    # r_mkt = requests.get(url_mkt, headers=headers)
-    # if r_mkt.status_code != 200:
-    #     print("⚠️ Fehler beim Abrufen der Marktdaten:", r_mkt.status_code, r_mkt.text)
-    #     return 1
-    # mkt_data = r_mkt.json().get("instrument", {})
-    # contract_size = float(mkt_data.get("contractSize", 1))
-    # margin_factor = float(mkt_data.get("marginFactor", 1)) / 100  # kommt in %
-
-    # # 3. Stück berechnen
-    # # -> angenommener Kurs: letzter Preis aus Market-Details
-    # snapshot = r_mkt.json().get("snapshot", {})
-    # price = float(snapshot.get("bid", 1))
-    # margin_per_unit = price * contract_size * margin_factor
-    # if margin_per_unit <= 0:
-    #     return 1
-    # size = risk_amount / margin_per_unit
-
-    # print(f"📊 calc_trade_size Debug → risk_amount={risk_amount}, margin_per_unit={margin_per_unit}, "
-    #   f"raw_size={risk_amount / margin_per_unit}, size_rounded={round(size, 3)}, "
-    #   f"minDealSize={mkt_data.get('minDealSize')}, lotSize={mkt_data.get('lotSize')}")
-
-    # ETHUSD 0.3 ~1000€, XRPUSD 400 ~1000€
-    size = MANUAL_TRADE_SIZE # test mit hartem wert, da im demo konto anscheinend kein kontostand übermittelt wird ...
+def calc_trade_size(CST, XSEC, epic, risk_pct=None):
+    # Liest ausschließlich aus dem Metadaten-Cache (kein REST auf dem Entry-Pfad).
+    # Fehlen Daten → MANUAL_TRADE_SIZE (im Demo-Konto wird teils kein Kontostand übermittelt).
+    # risk_pct=None → aktueller TRADE_RISK_PCT (zur Laufzeit gelesen, nicht beim Definieren gebunden)
+    if risk_pct is None:
+        risk_pct = TRADE_RISK_PCT
+    if not USE_RISK_SIZING:
+        return round(MANUAL_TRADE_SIZE, 3)  # 3 Nachkommastellen, also 0.001 genau
+
+    acc = _META["account"]
+    mkt = _META["markets"].get(epic)
+    if not acc or not mkt or not mkt.get("margin_factor"):
+        print(f"⚠️ calc_trade_size [{epic}]: keine Metadaten im Cache → MANUAL_TRADE_SIZE={MANUAL_TRADE_SIZE}")
+        return round(MANUAL_TRADE_SIZE, 3)
+
+    risk_amount = acc["available"] * risk_pct
+
+    # Kurs: frischeste Quote aus dem Feed, sonst Snapshot aus den Marktdaten
+    latest = _PIPE["latest"].get(epic)
+    price = ((latest[0] + latest[1]) / 2.0) if latest else mkt.get("bid")
+    if not price:
+        return round(MANUAL_TRADE_SIZE, 3)
+
+    margin_per_unit = price * mkt["contract_size"] * mkt["margin_factor"]
+    if margin_per_unit <= 0:
+        return round(MANUAL_TRADE_SIZE, 3)
+    size = risk_amount / margin_per_unit
+
+    step = mkt.get("size_increment")
+    if step:
+        size = int(size / step + 1e-9) * step  # auf das Handelsraster abrunden
+    if mkt.get("min_deal_size"):
+        size = max(size, mkt["min_deal_size"])
+
+    print(f"📊 calc_trade_size [{epic}] → risk_amount={risk_amount:.2f}, margin_per_unit={margin_per_unit:.4f}, "
+          f"size={round(size, 3)}, minDealSize={mkt.get('min_deal_size')}, lotSize={mkt.get('lot_size')}")
     return round(size, 3)  # 3 Nachkommastellen, also 0.001 genau
 
 # ==============================
@@ -477,7 +919,7 @@ def capital_login():
         "password": PWD,
         "encryptedPassword": False
     }
-    r = requests.post(f"{BASE_REST}/api/v1/session", headers=headers, json=payload)
+    r = broker_request("POST", f"{BASE_REST}/api/v1/session", headers=headers, json=payload)
     print("Login HTTP:", r.status_code)
     CST  = r.headers.get("CST")
     XSEC = r.headers.get("X-SECURITY-TOKEN")
@@ -497,7 +939,7 @@ def get_positions(CST, XSEC, retry=True):
         "X-SECURITY-TOKEN": XSEC,
         "Accept": "application/json"
     }
-    r = requests.get(url, headers=headers)
+    r = broker_request("GET", url, headers=headers)
     print(f"🧩 [DEBUG REST-Check] HTTP {r.status_code} → {r.text[:200]}") # debug 22.10.2025
     if r.status_code == 401 and retry:
         print("🔑 Session abgelaufen → erneuter Login (get_positions) ...")
@@ -537,7 +979,7 @@ def open_position(CST, XSEC, epic, direction, size, entry_price, retry=True):
         "guaranteedStop": False
     }
 
-    r = requests.post(url, headers=headers, json=data)
+    r = broker_request("POST", url, headers=headers, json=data)
 
     if r.status_code == 401 and retry:
         print("🔑 Session abgelaufen → erneuter Login (open_position) ...")
@@ -552,31 +994,13 @@ def open_position(CST, XSEC, epic, direction, size, entry_price, retry=True):
         try:
             ref = r.json().get("dealReference")
             if ref:
-                conf_url = f"{BASE_REST}/api/v1/confirms/{ref}"
-                conf = requests.get(conf_url, headers=headers)
-                if conf.status_code == 200:
-                    conf_data = conf.json()
-                    deal_id = None
-
-                    affected = conf_data.get("affectedDeals")
-                    if affected and isinstance(affected, list) and affected:
-                        deal_id = affected[0].get("dealId")
-
-                    if not deal_id and conf_data.get("dealId"):
-                        deal_id = conf_data.get("dealId")
+                conf_data = fetch_confirm(CST, XSEC, ref)
+                if conf_data is not None:
+                    deal_id = _confirm_deal_id(conf_data)
 
                     if deal_id:
                         # 1) Optional: Fill-Preis aus Confirm bevorzugen (falls vorhanden)
-                        fill_price = None
-                        try:
-                            fill_price = conf_data.get("level") or conf_data.get("price")
-                            if not fill_price:
-                                affected = conf_data.get("affectedDeals")
-                                if isinstance(affected, list) and affected:
-                                    fill_price = affected[0].get("level") or affected[0].get("price")
-                            fill_price = float(fill_price) if fill_price is not None else None
-                        except Exception:
-                            fill_price = None
+                        fill_price = _confirm_fill_price(conf_data)
 
                         # 2) Entry write-once: Confirm-Fill > übergebener Seitenpreis
                         final_entry = fill_price if isinstance(fill_price, (int, float)) else entry_price
@@ -608,6 +1032,45 @@ def open_position(CST, XSEC, epic, direction, size, entry_price, retry=True):
     return r
 
 
+def fetch_confirm(CST, XSEC, ref):
+    # GET /confirms/{dealReference} → Confirm-Dict oder None (noch nicht verfügbar / Fehler)
+    headers = {
+        "X-CAP-API-KEY": API_KEY,
+        "CST": CST,
+        "X-SECURITY-TOKEN": XSEC,
+        "Accept": "application/json"
+    }
+    conf = broker_request("GET", f"{BASE_REST}/api/v1/confirms/{ref}", headers=headers)
+    if conf.status_code != 200:
+        return None
+    try:
+        return conf.json()
+    except Exception:
+        return None
+
+
+def _confirm_deal_id(conf_data):
+    deal_id = None
+    affected = conf_data.get("affectedDeals")
+    if affected and isinstance(affected, list) and affected:
+        deal_id = affected[0].get("dealId")
+    if not deal_id and conf_data.get("dealId"):
+        deal_id = conf_data.get("dealId")
+    return deal_id
+
+
+def _confirm_fill_price(conf_data):
+    try:
+        fill_price = conf_data.get("level") or conf_data.get("price")
+        if not fill_price:
+            affected = conf_data.get("affectedDeals")
+            if isinstance(affected, list) and affected:
+                fill_price = affected[0].get("level") or affected[0].get("price")
+        return float(fill_price) if fill_price is not None else None
+    except Exception:
+        return None
+
+
 def close_position(CST, XSEC, epic, deal_id=None, retry=True):
     # Offene Position schließen über DELETE /positions/{dealId}
     if not deal_id:
@@ -624,7 +1087,7 @@ def close_position(CST, XSEC, epic, deal_id=None, retry=True):
     }
 
     print(f"🔎 Versuche Close mit DELETE {url} ...")
-    r = requests.delete(url, headers=headers)
+    r = broker_request("DELETE", url, headers=headers)
 
     if r is None:
         print("⚠️ Close-Request hat keine Antwort geliefert!")
@@ -648,13 +1111,25 @@ def close_position(CST, XSEC, epic, deal_id=None, retry=True):
 #   - "before_decision"
 # ==============================
 
-def sync_positions_with_broker(CST, XSEC, context="manual"):
+def _sync_local_key(epic):
+    # Lokaler Stand eines Epics für den Abgleich: (Objekt, dealId, pending) – ändert sich bei Open/Confirm/Close
+    pos = open_positions.get(epic)
+    if not isinstance(pos, dict):
+        return None
+    return id(pos), pos.get("dealId"), bool(pos.get("pending"))
+
 
-    try:
-        positions_data = get_positions(CST, XSEC)
-    except Exception as e:
-        print(f"⚠️ [SYNC] get_positions fehlgeschlagen ({context}): {e}")
-        return
+def sync_positions_with_broker(CST, XSEC, context="manual", positions_data=None, local_before=None):
+    # positions_data → bereits geholter Broker-Snapshot (kein eigener get_positions-Call)
+    # local_before   → {epic: _sync_local_key} zum Zeitpunkt des Snapshots; Epics, die sich lokal
+    #                  seitdem geändert haben (Confirm/Close während des Fetch), werden nicht angefasst
+
+    if positions_data is None:
+        try:
+            positions_data = get_positions(CST, XSEC)
+        except Exception as e:
+            print(f"⚠️ [SYNC] get_positions fehlgeschlagen ({context}): {e}")
+            return
 
     # positions_data ist typischerweise {"positions": [...]}
     if isinstance(positions_data, list):
@@ -692,7 +1167,7 @@ def sync_positions_with_broker(CST, XSEC, context="manual"):
 
     # --- Schutzgurt: Wenn Broker Positionen liefert, aber keine davon einem bekannten EPIC zugeordnet werden kann,
     # dann ist das ein Parsing-/Formatproblem -> in dem Fall NICHT destruktiv synchronisieren.
-    if positions_list and not any((e in broker_by_epic) for e in INSTRUMENTS):
+    if positions_list and not any((e in broker_by_epic) for e in (_SHARD["all_epics"] or INSTRUMENTS)):
         print(
             f"⚠️ [SYNC] (context={context}) Broker liefert Positionen, aber keine EPIC-Zuordnung möglich. "
             f"Abbruch ohne Änderungen (Parsing-Schutz)."
@@ -706,6 +1181,15 @@ def sync_positions_with_broker(CST, XSEC, context="manual"):
         remote_count = len(remote_positions)
         local_pos = open_positions.get(epic)
 
+        # Lokal seit dem Snapshot geändert → Snapshot ist für dieses Epic veraltet, nächster Sync entscheidet
+        if local_before is not None and _sync_local_key(epic) != local_before.get(epic):
+            print(f"ℹ️ [SYNC] {epic} (context={context}) – lokal seit dem Broker-Snapshot geändert, überspringe.")
+            continue
+
+        # Pending-Open: Confirm läuft noch im Hintergrund – der Abgleich gehört dem Confirm-Task
+        if isinstance(local_pos, dict) and local_pos.get("pending"):
+            print(f"⏳ [SYNC] {epic} (context={context}) – Open pending (ref={local_pos.get('dealReference')}), überspringe.")
+            continue
 
         # Fall 1: nichts offen – alles gut
         if remote_count == 0 and local_pos is None:
@@ -827,8 +1311,9 @@ def sync_positions_with_broker(CST, XSEC, context="manual"):
 # SIGNAL-LOGIK (Zelle D)
 # ==============================
 
-def on_candle_forming(epic, bar, ts_ms):
-    # Wird bei jedem Tick innerhalb einer Kerze aufgerufen (noch nicht geschlossen).
+def forming_trend(epic, bar):
+    # Trend-Zustandsmaschine auf der laufenden Candle fortschreiben (stateful: WAIT_TREND → WAIT_PULLBACK → …).
+    # Läuft in der Pipeline in JEDEM Zyklus auf der frischesten Quote – nie lastabhängig übersprungen.
     # Verwende Mid-Preis für die laufende Candle (technische Analyse)
     close_bid = bar.get("close_bid")
     close_ask = bar.get("close_ask")
@@ -836,11 +1321,6 @@ def on_candle_forming(epic, bar, ts_ms):
     closes = list(candle_history[epic]) + [mid_price]
     closes = [v for v in closes if v is not None]
 
-    # Ringpuffer füttern (Mid über close_bid/close_ask des aktuellen Ticks)
-    if mid_price is not None:
-        dq = TICK_RING.setdefault(epic, deque(maxlen=TICK_RING_MAXLEN))
-        dq.append((int(ts_ms), float(mid_price)))
-
     # 🔧 Spread auf Basis echter Marktseiten (Ask–Bid)
     high_ask = bar.get("high_ask")
     low_bid = bar.get("low_bid")
@@ -850,7 +1330,14 @@ def on_candle_forming(epic, bar, ts_ms):
     else:
         spread = None
 
-    trend = evaluate_trend_signal(epic, closes, spread)
+    return evaluate_trend_signal(epic, closes, spread)
+
+
+def on_candle_forming(epic, bar, ts_ms, trend=None):
+    # Anzeige der Kerze, die sich gerade bildet (noch nicht geschlossen).
+    # trend=None → Zustandsmaschine hier fortschreiben (alter Pfad), sonst nur anzeigen
+    if trend is None:
+        trend = forming_trend(epic, bar)
 
     # Zeit konvertieren
     local_dt = to_local_dt(ts_ms)
@@ -964,7 +1451,10 @@ def on_candle_close(epic, bar):
 
     # === 3️⃣ Handelssignal auswerten ===
     closes = [v for v in candle_history[epic] if v is not None]
+    _INTRABAR.pop(epic, None)  # alter Trigger gilt nur bis zu diesem Close
     signal = evaluate_trend_signal(epic, closes, spread)
+    if INTRABAR_ENTRY:
+        _intrabar_arm(epic, closes, spread, bar)
 
 
     print(
@@ -1238,10 +1728,119 @@ def evaluate_trend_signal(epic, closes, spread):
     return f"UNSICHER ⚪ ({ma_type})"
 
 
+# ==============================
+# INTRABAR-ENTRY (optional, INTRABAR_ENTRY = True)
+# Steht der State nach dem Close auf WAIT_CONFIRM, wird der Confirm-Preis vorab berechnet:
+#   LONG : last_close + CONFIRM_MIN_CLOSE_DELTA_SPREADS * spread
+#   SHORT: last_close - CONFIRM_MIN_CLOSE_DELTA_SPREADS * spread
+# Der Ingest prüft pro Tick nur noch einen Vergleich (Mid gegen Trigger); der Worker löst aus.
+# ==============================
+def _intrabar_arm(epic, closes, spread, bar):
+    st = _TREND_STATE.get(epic)
+    if not st or st["state"] != "WAIT_CONFIRM" or st["dir"] not in ("LONG", "SHORT"):
+        return
+    if not closes or spread is None or spread <= 0:
+        return
+
+    delta = CONFIRM_MIN_CLOSE_DELTA_SPREADS * spread
+    price = closes[-1] + delta if st["dir"] == "LONG" else closes[-1] - delta
+    ts_ms = bar.get("timestamp") or int(time.time() * 1000)
+    _INTRABAR[epic] = {
+        "dir": st["dir"],
+        "price": price,
+        "ma_type": "HMA" if USE_HMA else "EMA",
+        "deadline_ms": (ts_ms // 60000 + 2) * 60000,  # Ende der nächsten Candle = regulärer Confirm-Zeitpunkt
+    }
+    _INTRABAR_STATS["armed"] += 1
+    print(f"🎯 [{epic}] Intrabar-Trigger {st['dir']} @ Mid {price:.2f} (Close {closes[-1]:.2f}, Δ {delta:.2f})")
+
+
+def _intrabar_fire(epic, trig, bid, ask, ts_ms):
+    # Nur auslösen, wenn die Zustandsmaschine inzwischen nicht weitergelaufen ist
+    st = _TREND_STATE.get(epic)
+    if not st or st["state"] != "WAIT_CONFIRM" or st["dir"] != trig["dir"]:
+        _INTRABAR_STATS["stale"] += 1
+        print(f"⚪ [{epic}] Intrabar-Trigger verworfen (State={st and st['state']})")
+        return
+
+    # Entry-Event → State zurücksetzen, wie beim Confirm im Close
+    st["state"] = "WAIT_TREND"
+    st["dir"] = None
+    st["armed"] = False
+
+    if trig["dir"] == "LONG":
+        signal, entry_price = f"BEREIT: BUY ✅ ({trig['ma_type']}, intrabar)", ask
+    else:
+        signal, entry_price = f"BEREIT: SELL ⛔ ({trig['ma_type']}, intrabar)", bid
+
+    lead_ms = trig["deadline_ms"] - ts_ms
+    _INTRABAR_STATS["fired"] += 1
+    _INTRABAR_STATS["lead_ms"].append(lead_ms)
+    print(f"⚡ [{epic}] Intrabar-Confirm {trig['dir']} @ {bid:.2f}/{ask:.2f} (Trigger {trig['price']:.2f}) "
+          f"– {lead_ms / 1000:.1f}s vor dem Candle-Close")
+
+    try:
+        sync_positions_with_broker(CST, XSEC, context=f"before_decision:{epic}")
+    except Exception as e:
+        print(f"⚠️ [SYNC] Fehler im before_decision-Sync für {epic}: {e}")
+
+    pos = open_positions.get(epic)
+    in_trade = isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None
+    if not in_trade:
+        load_parameters(f"before_decision:{epic}")
+
+    decide_and_trade(CST, XSEC, epic, signal, entry_price)
+
+
+def intrabar_stats() -> dict:
+    lead = sorted(_INTRABAR_STATS["lead_ms"])
+    return {
+        "armed": _INTRABAR_STATS["armed"],
+        "fired": _INTRABAR_STATS["fired"],
+        "stale": _INTRABAR_STATS["stale"],
+        "lead_p50_ms": lead[len(lead) // 2] if lead else None,
+    }
+
+
 # ==============================
 # Hilfsfunktionen für robustes Open/Close
 # ==============================
 
+def _log_close_snapshot(epic, direction, deal_id, reason):
+    # Trade-CLOSE aus dem lokalen Positions-Snapshot loggen (vor dem Reset von open_positions)
+    snapshot = open_positions.get(epic) if isinstance(open_positions.get(epic), dict) else None
+    if not snapshot:
+        return
+    try:
+        entry = snapshot.get("entry_price")
+        size_val = snapshot.get("size") or MANUAL_TRADE_SIZE
+        close_price = snapshot.get("last_close_trigger_price") or snapshot.get("mark_price")
+        reason = reason or snapshot.get("last_close_reason") or "CLOSE"
+
+        pnl = None
+        if entry is not None and close_price is not None:
+            entry = float(entry)
+            close_price = float(close_price)
+            size_val = float(size_val)
+            if direction == "BUY":
+                pnl = (close_price - entry) * size_val
+            else:
+                pnl = (entry - close_price) * size_val
+
+        log_trade(
+            event="CLOSE",
+            epic=epic,
+            direction=direction,
+            deal_id=deal_id,
+            size=size_val,
+            price=close_price,
+            pnl=pnl,
+            reason=reason,
+        )
+    except Exception as e:
+        print(f"⚠️ Trade-Logging CLOSE fehlgeschlagen für {epic}: {e}")
+
+
 def safe_close(CST, XSEC, epic, deal_id=None, reason=None):
     # Wrapper: Close-Order robust mit Retry und Reset in open_positions.
     # Holt sich dealId und Richtung aus open_positions oder notfalls via get_positions().
@@ -1297,36 +1896,7 @@ def safe_close(CST, XSEC, epic, deal_id=None, reason=None):
 
     if ok:
         # Snapshot für Logging sichern, bevor open_positions gelöscht wird
-        snapshot = open_positions.get(epic) if isinstance(open_positions.get(epic), dict) else None
-        if snapshot:
-            try:
-                entry = snapshot.get("entry_price")
-                size_val = snapshot.get("size") or MANUAL_TRADE_SIZE
-                close_price = snapshot.get("last_close_trigger_price") or snapshot.get("mark_price")
-                reason = reason or snapshot.get("last_close_reason") or "CLOSE"
-
-                pnl = None
-                if entry is not None and close_price is not None:
-                    entry = float(entry)
-                    close_price = float(close_price)
-                    size_val = float(size_val)
-                    if direction == "BUY":
-                        pnl = (close_price - entry) * size_val
-                    else:
-                        pnl = (entry - close_price) * size_val
-
-                log_trade(
-                    event="CLOSE",
-                    epic=epic,
-                    direction=direction,
-                    deal_id=deal_id,
-                    size=size_val,
-                    price=close_price,
-                    pnl=pnl,
-                    reason=reason,
-                )
-            except Exception as e:
-                print(f"⚠️ Trade-Logging CLOSE fehlgeschlagen für {epic}: {e}")
+        _log_close_snapshot(epic, direction, deal_id, reason)
 
         open_positions[epic] = None
         print(f"✅ [{epic}] Close erfolgreich → open_positions reset")
@@ -1355,6 +1925,9 @@ def safe_open(CST, XSEC, epic, direction, size, entry_price):
     # Wrapper: Open-Order robust mit Retry + Ergänzen von Trailing Stop
     global open_positions
 
+    if OPTIMISTIC_OPEN and _running_loop() is not None:
+        return _optimistic_open(CST, XSEC, epic, direction, size, entry_price)
+
     r = open_position(CST, XSEC, epic, direction, size, entry_price)
     ok = (r is not None and r.status_code == 200)
 
@@ -1390,15 +1963,235 @@ def safe_open(CST, XSEC, epic, direction, size, entry_price):
     return ok
 
 
+# ==============================
+# OPTIMISTISCHES OPEN: Registrierung bei Order-Annahme, Confirm asynchron
+#   POST ok → open_positions[epic] = pending (vorläufiger Entry = Seitenpreis, Trailing gesetzt)
+#   Confirm-Task (im Loop, HTTP via to_thread):
+#     ACCEPTED  → dealId + Fill übernehmen, Levels auf den Fill verschieben, OPEN loggen
+#     REJECTED  → pending verwerfen
+#     Timeout / ACCEPTED ohne dealId → Broker-Positionen entscheiden (übernehmen oder verwerfen)
+#     get_positions fehlgeschlagen   → bleibt pending (Schutz + close_on_confirm aktiv), neuer Versuch
+# ==============================
+_PENDING_OPEN = {
+    "confirm_ms": deque(maxlen=100),  # Order-Annahme → Confirm eingearbeitet (so lange lief Schutz bisher NICHT)
+    "rejected": 0,
+    "timeouts": 0,
+}
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _initial_trailing(direction, entry_price):
+    if direction == "BUY":
+        return entry_price * (1 - TRAILING_STOP_PCT)
+    return entry_price * (1 + TRAILING_STOP_PCT)
+
+
+def _optimistic_open(CST, XSEC, epic, direction, size, entry_price):
+    url = f"{BASE_REST}/api/v1/positions"
+    headers = {
+        "X-CAP-API-KEY": API_KEY,
+        "CST": CST,
+        "X-SECURITY-TOKEN": XSEC,
+        "Content-Type": "application/json"
+    }
+    data = {
+        "epic": epic,
+        "direction": direction,
+        "size": size,
+        "orderType": "MARKET",
+        "guaranteedStop": False
+    }
+
+    r = broker_request("POST", url, headers=headers, json=data)
+    if r.status_code == 401:
+        print("🔑 Session abgelaufen → erneuter Login (open_position) ...")
+        raise RuntimeError("force_reconnect")
+
+    print("📩 Order-Response:", r.status_code, r.text)
+    if r.status_code != 200:
+        return False
+
+    try:
+        ref = r.json().get("dealReference")
+    except Exception:
+        ref = None
+    if not ref:
+        print(f"⚠️ [{epic}] Order ohne dealReference – Abgleich beim nächsten Sync")
+        return False
+
+    trailing_stop = _initial_trailing(direction, entry_price)
+    open_positions[epic] = {
+        "direction": direction,
+        "dealId": None,
+        "entry_price": entry_price,          # vorläufig: Seitenpreis, wird durch den Fill ersetzt
+        "size": size,
+        "trailing_stop": trailing_stop,
+        "pending": True,
+        "dealReference": ref,
+        "provisional_trailing": trailing_stop,
+    }
+    print(
+        f"⏳ [{epic}] Order angenommen → {direction} pending "
+        f"(ref={ref}, entry≈{entry_price}, trailing={trailing_stop}) – Schutz aktiv"
+    )
+
+    task = asyncio.get_running_loop().create_task(
+        _reconcile_open(CST, XSEC, epic, ref, time.monotonic())
+    )
+    task.add_done_callback(_log_task_error(f"confirm {epic}"))
+    return True
+
+
+def _find_broker_position(positions, epic):
+    for p in positions or []:
+        position = p.get("position") or {}
+        if position.get("epic") == epic or (p.get("market") or {}).get("epic") == epic:
+            return position
+    return None
+
+
+async def _reconcile_open(CST, XSEC, epic, ref, t0):
+    # Confirm pollen, bis er da ist oder CONFIRM_TIMEOUT_SEC abgelaufen ist; ohne Confirm (oder ACCEPTED
+    # ohne dealId) entscheidet get_positions. Schlägt auch das fehl → pending bleibt, neuer Versuch.
+    retry_sec = CONFIRM_POLL_INTERVAL_SEC
+    rounds = 0
+    while True:
+        conf = None
+        t_poll = time.monotonic()
+        while time.monotonic() - t_poll < CONFIRM_TIMEOUT_SEC:
+            try:
+                conf = await asyncio.to_thread(fetch_confirm, CST, XSEC, ref)
+            except Exception as e:
+                print(f"⚠️ [{epic}] Confirm-Abfrage fehlgeschlagen: {e}")
+            if conf is not None:
+                break
+            await asyncio.sleep(CONFIRM_POLL_INTERVAL_SEC)
+        rounds += 1
+
+        if not _still_pending(epic, ref):
+            print(f"ℹ️ [{epic}] Confirm {ref} eingetroffen, Position aber nicht mehr pending – ignoriert")
+            return
+
+        if conf is not None:
+            status = str(conf.get("dealStatus") or "").upper()
+            deal_id = _confirm_deal_id(conf)
+            if status == "REJECTED":
+                _PENDING_OPEN["rejected"] += 1
+                open_positions[epic] = None
+                print(f"❌ [{epic}] Order abgelehnt (ref={ref}, reason={conf.get('reason')}) → pending verworfen")
+                return
+            if deal_id:
+                _resolve_pending_open(CST, XSEC, epic, open_positions[epic], deal_id, _confirm_fill_price(conf), t0)
+                return
+            print(f"⚠️ [{epic}] Confirm ohne dealId (ref={ref}, status={status or '?'}) → Abgleich über get_positions")
+        else:
+            if rounds == 1:
+                _PENDING_OPEN["timeouts"] += 1
+            print(f"⌛ [{epic}] Kein Confirm nach {CONFIRM_TIMEOUT_SEC:.1f}s (ref={ref}) → Abgleich über get_positions")
+
+        # Broker-Sicht entscheidet – ohne Antwort keine Entscheidung (kein Platzhalter als dealId)
+        try:
+            broker_pos = _find_broker_position(await asyncio.to_thread(get_positions, CST, XSEC), epic)
+        except Exception as e:
+            print(f"⚠️ [{epic}] get_positions fehlgeschlagen: {e} → bleibt pending, neuer Versuch in {retry_sec:.1f}s")
+            await asyncio.sleep(retry_sec)
+            retry_sec = min(retry_sec * 2, CONFIRM_RETRY_MAX_SEC)
+            continue
+
+        if not _still_pending(epic, ref):
+            print(f"ℹ️ [{epic}] Abgleich {ref} fertig, Position aber nicht mehr pending – ignoriert")
+            return
+        if broker_pos is None:
+            open_positions[epic] = None
+            print(f"❌ [{epic}] Broker meldet keine Position zu ref={ref} → pending verworfen")
+            return
+        deal_id = broker_pos.get("dealId")
+        if not deal_id:
+            print(f"⚠️ [{epic}] Broker-Position ohne dealId → bleibt pending, neuer Versuch in {retry_sec:.1f}s")
+            await asyncio.sleep(retry_sec)
+            retry_sec = min(retry_sec * 2, CONFIRM_RETRY_MAX_SEC)
+            continue
+        try:
+            fill_price = float(broker_pos.get("level")) if broker_pos.get("level") is not None else None
+        except Exception:
+            fill_price = None
+        _resolve_pending_open(CST, XSEC, epic, open_positions[epic], deal_id, fill_price, t0)
+        return
+
+
+def _still_pending(epic, ref) -> bool:
+    pos = open_positions.get(epic)
+    return isinstance(pos, dict) and bool(pos.get("pending")) and pos.get("dealReference") == ref
+
+
+def _resolve_pending_open(CST, XSEC, epic, pos, deal_id, fill_price, t0):
+    direction = pos["direction"]
+    pos["dealId"] = deal_id
+
+    if isinstance(fill_price, (int, float)):
+        pos["entry_price"] = fill_price
+        # Trailing nur verschieben, wenn die Schutz-Logik ihn seit dem Open nicht schon bewegt hat
+        if pos.get("trailing_stop") == pos.get("provisional_trailing"):
+            pos["trailing_stop"] = _initial_trailing(direction, fill_price)
+
+    pos.pop("pending", None)
+    pos.pop("provisional_trailing", None)
+    pos.pop("dealReference", None)
+
+    confirm_ms = (time.monotonic() - t0) * 1000.0
+    _PENDING_OPEN["confirm_ms"].append(confirm_ms)
+    print(
+        f"🆕 [{epic}] Open bestätigt → {direction} (dealId={deal_id}, entry={pos.get('entry_price')}, "
+        f"trailing={pos.get('trailing_stop')}) – Confirm nach {confirm_ms:.0f}ms, Schutz lief bereits"
+    )
+
+    try:
+        log_trade(
+            event="OPEN",
+            epic=epic,
+            direction=direction,
+            deal_id=deal_id,
+            size=pos.get("size"),
+            price=pos.get("entry_price"),
+            pnl=None,
+            reason="OPEN",
+        )
+    except Exception as e:
+        print(f"⚠️ Trade-Logging OPEN fehlgeschlagen für {epic}: {e}")
+
+    reason = pos.pop("close_on_confirm", None)
+    if reason:
+        print(f"⛔ [{epic}] Vorgemerkter Close ({reason}) wird jetzt ausgeführt")
+        safe_close(CST, XSEC, epic, deal_id=deal_id, reason=reason)
+
+
+def pending_open_stats() -> dict:
+    vals = sorted(_PENDING_OPEN["confirm_ms"])
+    return {
+        "confirms": len(vals),
+        "rejected": _PENDING_OPEN["rejected"],
+        "timeouts": _PENDING_OPEN["timeouts"],
+        "confirm_p50_ms": vals[len(vals) // 2] if vals else None,
+        "confirm_max_ms": vals[-1] if vals else None,
+    }
+
+
 # ==============================
 # STOP LOSS & TRAILING STOP überwachen
 # ==============================
 
-def check_protection_rules(epic, bid, ask, spread, CST, XSEC):
+def check_protection_rules(epic, bid, ask, spread, CST, XSEC, log_regime=True):
     # Überwacht Stop-Loss, Take-Profit, Trailing-Stop und Break-Even.
     # Verwendet echte Marktseiten:
     #     - BUY  → Trigger = Bid (Verkaufsseite)
     #     - SELL → Trigger = Ask (Kaufseite)
+    # log_regime=False → Regime-Zustand wird berechnet, aber nicht gedruckt (Pipeline unter Last)
     
     global open_positions
     pos = open_positions.get(epic)
@@ -1415,6 +2208,13 @@ def check_protection_rules(epic, bid, ask, spread, CST, XSEC):
 
     # --- Debounced Close helper (verhindert Mehrfach-Calls in kurzer Zeit)
     def _debounced_close():
+        _latency_flag_stale(epic, pos)
+        if pos.get("pending"):
+            # Confirm noch unterwegs (keine dealId) → Close direkt nach dem Confirm ausführen
+            if not pos.get("close_on_confirm"):
+                pos["close_on_confirm"] = pos.get("last_close_reason") or "CLOSE"
+                print(f"⏳ [{epic}] Close vorgemerkt ({pos['close_on_confirm']}) – wartet auf Confirm")
+            return
         now = time.monotonic()
         if now - _last_close_ts.get(epic, 0.0) < CLOSE_COOLDOWN_SEC:
             return
@@ -1427,7 +2227,7 @@ def check_protection_rules(epic, bid, ask, spread, CST, XSEC):
 
     # 🧭 Regime-Logging (nur Sichtbarkeit, kein Eingriff)
     try:
-        log_trade_regime(epic, pos, bid, ask, spread, pos.get("last_tick_ms") or int(time.time() * 1000))
+        log_trade_regime(epic, pos, bid, ask, spread, pos.get("last_tick_ms") or int(time.time() * 1000), verbose=log_regime)
     except Exception as e:
         print(f"⚠️ [{epic}] Regime-Log Fehler: {e}")
 
@@ -1650,7 +2450,7 @@ def _tickring_range(epic: str, now_ms: int, window_ms: int = REGIME_RANGE_WINDOW
 # ==============================
 # Trade-lokales Regime-Logging (Seitwärts/Impuls) – ohne Einfluss auf TS/SL/TP.
 # ==============================
-def log_trade_regime(epic: str, pos: dict, bid: float, ask: float, spread: float, ts_ms: int):
+def log_trade_regime(epic: str, pos: dict, bid: float, ask: float, spread: float, ts_ms: int, verbose: bool = True):
     direction = pos.get("direction")
     entry = pos.get("entry_price")
     if not direction or entry is None:
@@ -1717,6 +2517,8 @@ def log_trade_regime(epic: str, pos: dict, bid: float, ask: float, spread: float
 
     # Logging (bei State-Change immer, sonst "ruhig" einmal pro Sekunde)
     # Wenn du es noch leiser willst: nur bei prev_state != state loggen.
+    if not verbose:
+        return
     p_pct = (profit_abs / entry) * 100.0
     print(
         f"📌 [REGIME {epic}] dir={direction} state={state}"
@@ -1821,6 +2623,10 @@ def decide_and_trade(CST, XSEC, epic, signal, current_price):
     current = pos.get("direction") if isinstance(pos, dict) else None
     deal_id = pos.get("dealId") if isinstance(pos, dict) else None
 
+    if _HALT["halted"] and current is None and signal.startswith("BEREIT"):
+        print(f"🛑 [{epic}] Trading angehalten ({_HALT['reason']}) → kein Open trotz {signal}")
+        return
+
     # ===========================
     # LONG-SIGNAL
     # ===========================
@@ -1834,7 +2640,7 @@ def decide_and_trade(CST, XSEC, epic, signal, current_price):
             print(f"{Fore.YELLOW}🚀 [{epic}] Long eröffnen{Style.RESET_ALL}")
 
             # ✅ Marktseitig korrekter Entry wird übergeben (Ask bei BUY)
-            safe_open(CST, XSEC, epic, "BUY", calc_trade_size(CST, XSEC, epic), current_price)
+            _open_with_risk_slot(CST, XSEC, epic, "BUY", current_price)
 
 
     # ===========================
@@ -1850,7 +2656,7 @@ def decide_and_trade(CST, XSEC, epic, signal, current_price):
             print(f"{Fore.YELLOW}🚀 [{epic}] Short eröffnen{Style.RESET_ALL}")
 
             # ✅ Marktseitig korrekter Entry wird übergeben (Bid bei SELL)
-            safe_open(CST, XSEC, epic, "SELL", calc_trade_size(CST, XSEC, epic), current_price)
+            _open_with_risk_slot(CST, XSEC, epic, "SELL", current_price)
 
 
 
@@ -1866,6 +2672,788 @@ def decide_and_trade(CST, XSEC, epic, signal, current_price):
             print(f"{Fore.YELLOW}🤔 [{epic}] Kein Trade offen → Signal = {signal}{Style.RESET_ALL}")
 
 
+# ==============================
+# KILL-SWITCH: flatten_all + Trading-Halt
+#   Auslöser: Code (flatten_all / request_flatten), Signal (SIGUSR1), lokaler Admin-HTTP (POST /flatten)
+#   Ablauf: Halt setzen → pending Opens mit close_on_confirm markieren und auf ihren Confirm warten
+#           → 1× get_positions → alle DELETEs parallel → 1× get_positions zur Kontrolle
+#           → Nachzügler bis FLATTEN_MAX_RETRIES erneut → Time-to-flat ausgeben
+#           (weiter pending → unter "remaining" als pending:{epic}:{ref})
+# ==============================
+_HALT = {"halted": False, "reason": None, "since": None}
+_FLATTEN_LOCK = threading.Lock()
+
+
+def halt_trading(reason: str) -> None:
+    if not _HALT["halted"]:
+        _HALT.update({"halted": True, "reason": reason, "since": time.time()})
+        print(f"🛑 Trading angehalten: {reason}")
+
+
+def resume_trading() -> None:
+    if _HALT["halted"]:
+        print(f"▶️ Trading wieder freigegeben (war angehalten seit {datetime.fromtimestamp(_HALT['since']).strftime('%H:%M:%S')}: {_HALT['reason']})")
+    _HALT.update({"halted": False, "reason": None, "since": None})
+
+
+def _broker_deals(positions) -> dict:
+    # dealId -> (epic, direction) aus einer get_positions-Antwort
+    deals = {}
+    for p in positions or []:
+        position = p.get("position") or {}
+        deal_id = position.get("dealId")
+        epic = position.get("epic") or (p.get("market") or {}).get("epic")
+        if deal_id:
+            deals[str(deal_id)] = (epic, position.get("direction"))
+    return deals
+
+
+def flatten_all(CST, XSEC, reason: str = "FLATTEN") -> dict:
+    # Alle Positionen beim Broker schließen – parallel, mit einer Kontroll-Abfrage pro Runde.
+    # Blockierend (Thread); im Loop über request_flatten() anstoßen.
+    if not _FLATTEN_LOCK.acquire(blocking=False):
+        print("⚠️ [FLATTEN] läuft bereits – ignoriert")
+        return {"ok": False, "busy": True}
+
+    try:
+        halt_trading(reason)
+        t0 = time.perf_counter()
+        print(f"🧯 [FLATTEN] Start ({reason})")
+
+        # Opens im Flug: Confirm-Task schließt sie direkt nach dem Confirm – darauf warten
+        pending = _flatten_mark_pending(reason)
+        if pending:
+            print(f"⏳ [FLATTEN] {len(pending)} pending Open(s), warte auf Confirm: {sorted(pending)}")
+            deadline = time.monotonic() + FLATTEN_PENDING_WAIT_SEC
+            while _flatten_mark_pending(reason) and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        deals = _broker_deals(get_positions(CST, XSEC))
+        # lokal bekannte dealIds mitnehmen, falls der Broker sie (noch) nicht listet
+        for epic, pos in open_positions.items():
+            if isinstance(pos, dict) and pos.get("dealId") and not str(pos["dealId"]).startswith("<"):
+                deals.setdefault(str(pos["dealId"]), (epic, pos.get("direction")))
+
+        initial = dict(deals)
+        attempts = 0
+        while deals and attempts <= FLATTEN_MAX_RETRIES:
+            if attempts:
+                print(f"🔁 [FLATTEN] Retry {attempts}/{FLATTEN_MAX_RETRIES} für {len(deals)} Nachzügler")
+                time.sleep(FLATTEN_RETRY_DELAY_SEC)
+            attempts += 1
+
+            with ThreadPoolExecutor(max_workers=min(32, len(deals))) as ex:
+                futures = {
+                    deal_id: ex.submit(close_position, CST, XSEC, epic, deal_id)
+                    for deal_id, (epic, _dir) in deals.items()
+                }
+                for deal_id, fut in futures.items():
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"⚠️ [FLATTEN] DELETE {deal_id} fehlgeschlagen: {e}")
+
+            # eine einzige Kontroll-Abfrage für alle
+            still_open = _broker_deals(get_positions(CST, XSEC))
+            deals = {d: v for d, v in deals.items() if d in still_open}
+
+        secs = time.perf_counter() - t0
+        closed = [d for d in initial if d not in deals]
+        for deal_id in closed:
+            epic, direction = initial[deal_id]
+            if epic in open_positions:
+                _log_close_snapshot(epic, direction, deal_id, reason)
+                open_positions[epic] = None
+
+        still_pending = _flatten_mark_pending(reason)
+        remaining = sorted(deals) + sorted(f"pending:{epic}:{ref}" for epic, ref in still_pending.items())
+        result = {
+            "ok": not remaining,
+            "closed": len(closed),
+            "remaining": remaining,
+            "rounds": attempts,
+            "time_to_flat_s": secs,
+        }
+        if remaining:
+            print(f"⚠️ [FLATTEN] Nach {attempts} Runden noch offen: {remaining} ({secs:.3f}s)")
+        else:
+            print(f"✅ [FLATTEN] Flat: {len(closed)} Positionen in {secs:.3f}s ({attempts} Runde(n))")
+        return result
+    finally:
+        _FLATTEN_LOCK.release()
+
+
+def _flatten_mark_pending(reason: str) -> dict:
+    # Pending Opens (noch keine dealId) → close_on_confirm setzen; Rückgabe: epic -> dealReference
+    out = {}
+    for epic, pos in list(open_positions.items()):
+        if isinstance(pos, dict) and pos.get("pending"):
+            pos["close_on_confirm"] = reason
+            out[epic] = pos.get("dealReference")
+    return out
+
+
+def request_flatten(reason: str = "FLATTEN"):
+    # Aus dem Event-Loop heraus: flatten_all im Thread starten, Loop läuft weiter (Schutz, Feed)
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(flatten_all, CST, XSEC, reason))
+    task.add_done_callback(_log_task_error("flatten_all"))
+    return task
+
+
+# --- Lokaler Admin-Endpoint (nur 127.0.0.1). Weitere Routen einfach in _ADMIN_ROUTES eintragen.
+async def _admin_flatten(params):
+    return await asyncio.to_thread(flatten_all, CST, XSEC, params.get("reason", "ADMIN_HTTP"))
+
+
+async def _admin_halt(params):
+    halt_trading(params.get("reason", "ADMIN_HTTP"))
+    return dict(_HALT)
+
+
+async def _admin_resume(params):
+    resume_trading()
+    return dict(_HALT)
+
+
+async def _admin_status(params):
+    return {"halt": dict(_HALT), "open_positions": open_positions, "reconnect": reconnect_stats()}
+
+
+_ADMIN_ROUTES = {
+    ("POST", "/flatten"): _admin_flatten,
+    ("POST", "/halt"): _admin_halt,
+    ("POST", "/resume"): _admin_resume,
+    ("GET", "/status"): _admin_status,
+}
+
+
+async def _admin_handle(reader, writer):
+    status, body = 404, {"error": "not found"}
+    try:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # Header ignorieren
+        method, target, _ = request_line.split(" ", 2)
+        path, _, query = target.partition("?")
+        params = dict(kv.split("=", 1) for kv in query.split("&") if "=" in kv)
+        handler = _ADMIN_ROUTES.get((method.upper(), path))
+        if handler is not None:
+            status, body = 200, await handler(params)
+    except Exception as e:
+        status, body = 500, {"error": str(e)}
+
+    payload = json.dumps(body, default=str).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERR'}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+        + payload
+    )
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _admin_server():
+    server = await asyncio.start_server(_admin_handle, "127.0.0.1", ADMIN_HTTP_PORT)
+    print(f"🛠️ Admin-Endpoint auf http://127.0.0.1:{ADMIN_HTTP_PORT} ({', '.join(f'{m} {p}' for m, p in _ADMIN_ROUTES)})")
+    async with server:
+        await server.serve_forever()
+
+
+def _install_signal_handlers() -> None:
+    # SIGUSR1 → flatten_all, SIGUSR2 → Profiler an/aus (nur Unix; unter Windows bleiben Admin-HTTP und Code)
+    loop = asyncio.get_running_loop()
+    for sig, handler, args in (
+        (getattr(signal, "SIGUSR1", None), request_flatten, ("SIGNAL",)),
+        (getattr(signal, "SIGUSR2", None), toggle_profiling, ()),
+    ):
+        if sig is None:
+            continue
+        try:
+            loop.add_signal_handler(sig, handler, *args)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+
+# ==============================
+# LAUFZEIT-PROFILER: Zeitfenster per Signal/Admin-Endpoint, ohne Neustart
+#   - cProfile auf dem Loop-Thread → .pstats (snakeviz / pstats)
+#   - Sampling-Thread über sys._current_frames() → .collapsed (flamegraph.pl / speedscope)
+#   - aus = keine Hooks, kein Thread → null Overhead
+# ==============================
+_PROFILER = {"active": False, "pr": None, "stop_evt": None, "stacks": {}, "samples": 0,
+             "started": None, "label": None, "timer": None}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _profile_sampler(stop_evt, interval_s: float) -> None:
+    own = threading.get_ident()
+    names = {}
+    stacks = _PROFILER["stacks"]
+    while not stop_evt.wait(interval_s):
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            if tid not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            key = f"{names.get(tid, tid)};{_collapse_stack(frame)}"
+            stacks[key] = stacks.get(key, 0) + 1
+        _PROFILER["samples"] += 1
+
+
+def start_profiling(seconds: float = PROFILE_WINDOW_SEC, label: str = "manual") -> dict:
+    # Muss auf dem Loop-Thread laufen (cProfile misst den Thread, der enable() aufruft)
+    if _PROFILER["active"]:
+        return {"active": True, "error": "läuft bereits"}
+    # Label landet im Dateinamen (auch aus dem Admin-HTTP) → nur [A-Za-z0-9_-], kein Pfad
+    label = re.sub(r"[^A-Za-z0-9_-]", "_", str(label or ""))[:40] or "manual"
+
+    pr = None
+    if not ENABLE_PROFILING:  # globales cProfile aktiv → nur Sampling
+        pr = cProfile.Profile()
+        pr.enable()
+
+    stop_evt = threading.Event()
+    _PROFILER.update({"active": True, "pr": pr, "stop_evt": stop_evt, "stacks": {}, "samples": 0,
+                      "started": time.time(), "label": label})
+    threading.Thread(target=_profile_sampler, args=(stop_evt, PROFILE_SAMPLE_INTERVAL_MS / 1000.0),
+                     name="profile-sampler", daemon=True).start()
+
+    if seconds:
+        _PROFILER["timer"] = asyncio.get_running_loop().call_later(seconds, stop_profiling)
+    print(f"🔬 Profiler gestartet ({label}, {'bis stop' if not seconds else f'{seconds:.0f}s'})")
+    return {"active": True, "seconds": seconds, "label": label}
+
+
+def stop_profiling() -> dict:
+    if not _PROFILER["active"]:
+        return {"active": False}
+    if _PROFILER["timer"] is not None:
+        _PROFILER["timer"].cancel()
+    _PROFILER["stop_evt"].set()
+    pr = _PROFILER["pr"]
+    if pr is not None:
+        pr.disable()
+    _PROFILER["active"] = False
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.fromtimestamp(_PROFILER["started"]).strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(PROFILE_DIR, f"profile_{stamp}_{_PROFILER['label']}")
+    files = {}
+    try:
+        if pr is not None:
+            pr.dump_stats(base + ".pstats")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                pstats.Stats(pr, stream=f).sort_stats("cumtime").print_stats(80)
+            files["pstats"] = base + ".pstats"
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, n in sorted(_PROFILER["stacks"].items(), key=lambda kv: -kv[1]):
+                f.write(f"{stack} {n}\n")
+        files["collapsed"] = base + ".collapsed"
+    except Exception as e:
+        print(f"⚠️ Profiler-Dump fehlgeschlagen: {e}")
+
+    secs = time.time() - _PROFILER["started"]
+    print(f"🔬 Profiler gestoppt nach {secs:.1f}s, {_PROFILER['samples']} Samples → {', '.join(files.values())}")
+    _PROFILER.update({"pr": None, "stop_evt": None, "timer": None})
+    return {"active": False, "seconds": secs, "samples": _PROFILER["samples"], "files": files}
+
+
+def toggle_profiling() -> dict:
+    return stop_profiling() if _PROFILER["active"] else start_profiling(PROFILE_WINDOW_SEC, "signal")
+
+
+async def _admin_profile_start(params):
+    return start_profiling(float(params.get("seconds", PROFILE_WINDOW_SEC)), params.get("label", "admin"))
+
+
+async def _admin_profile_stop(params):
+    return stop_profiling()
+
+
+_ADMIN_ROUTES[("POST", "/profile/start")] = _admin_profile_start
+_ADMIN_ROUTES[("POST", "/profile/stop")] = _admin_profile_stop
+
+
+# ==============================
+# EVENT-LOOP-LAG + BLOCKIER-DETEKTOR
+#   - Lag-Task: schläft LOOP_LAG_INTERVAL_MS, misst die Verspätung beim Aufwachen (= Loop war blockiert)
+#   - Watchdog-Thread: sieht, dass der Herzschlag des Lag-Tasks ausbleibt, und nimmt per
+#     sys._current_frames() den Stack des Loop-Threads auf – also genau die Zeile, die gerade blockiert
+#   - Perzentile über die letzten LOOP_LAG_WINDOW Messungen, Blockaden mit Stack in loop_lag.log
+# ==============================
+_LOOP_LAG = {
+    "samples": deque(maxlen=LOOP_LAG_WINDOW),  # Lag in ms
+    "beat": None,            # time.monotonic() des letzten Herzschlags
+    "loop_thread": None,
+    "episode_stack": None,   # Stack der aktuellen Blockade (vom Watchdog)
+    "episode_start": None,
+    "blocks": deque(maxlen=200),  # (Zeit, Dauer ms, Top-Frame, Stack)
+    "last_report": time.monotonic(),
+}
+
+
+def _loop_lag_watchdog() -> None:
+    # Eigener Thread – läuft auch dann, wenn der Loop hängt
+    limit = (LOOP_LAG_INTERVAL_MS + LOOP_LAG_THRESHOLD_MS) / 1000.0
+    poll = max(0.005, LOOP_LAG_THRESHOLD_MS / 4000.0)
+    while True:
+        time.sleep(poll)
+        beat = _LOOP_LAG["beat"]
+        if beat is None or _LOOP_LAG["episode_stack"] is not None:
+            continue
+        if time.monotonic() - beat > limit:
+            frame = sys._current_frames().get(_LOOP_LAG["loop_thread"])
+            if frame is not None:
+                _LOOP_LAG["episode_stack"] = traceback.extract_stack(frame)
+                _LOOP_LAG["episode_start"] = beat
+
+
+def _loop_lag_record_block(lag_ms: float) -> None:
+    stack = _LOOP_LAG["episode_stack"] or []
+    _LOOP_LAG["episode_stack"] = None
+    # Innerster Frame aus eigenem Code (= welcher Aufruf blockiert hat) + innerster Frame überhaupt (= wo)
+    own = next((f for f in reversed(stack) if os.path.basename(f.filename) in ("tradingbot_2.py", "chart_gui_2.py")), None)
+    top = "?"
+    if stack:
+        inner = stack[-1]
+        top = f"{os.path.basename(inner.filename)}:{inner.lineno} {inner.name}"
+        if own is not None and own is not inner:
+            top = f"{os.path.basename(own.filename)}:{own.lineno} {own.name} → {top}"
+    _LOOP_LAG["blocks"].append((time.time(), lag_ms, top, stack))
+    print(f"🐢 Event-Loop {lag_ms:.0f}ms blockiert → {top}")
+
+    if IS_LIVE_BOT:
+        try:
+            with open(LOOP_LAG_LOG, "a", encoding="utf-8") as f:
+                f.write(f"--- {datetime.now(LOCAL_TZ).strftime('%d.%m.%Y %H:%M:%S')} blockiert {lag_ms:.0f}ms\n")
+                f.writelines(traceback.format_list(stack))
+        except Exception as e:
+            print(f"⚠️ loop_lag.log nicht schreibbar: {e}")
+
+
+def loop_lag_stats() -> dict:
+    vals = sorted(_LOOP_LAG["samples"])
+    if not vals:
+        return {"n": 0}
+    n = len(vals)
+
+    def pct(q):
+        return vals[min(n - 1, int(round(q * (n - 1))))]
+
+    tops = {}
+    for _ts, _ms, top, _stack in _LOOP_LAG["blocks"]:
+        tops[top] = tops.get(top, 0) + 1
+    return {
+        "n": n,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": vals[-1],
+        "blocks": len(_LOOP_LAG["blocks"]),
+        "top_blockers": sorted(tops.items(), key=lambda kv: -kv[1])[:5],
+    }
+
+
+async def _loop_lag_monitor():
+    _LOOP_LAG["loop_thread"] = threading.get_ident()
+    _LOOP_LAG["beat"] = time.monotonic()
+    threading.Thread(target=_loop_lag_watchdog, name="loop-lag-watchdog", daemon=True).start()
+
+    interval = LOOP_LAG_INTERVAL_MS / 1000.0
+    while True:
+        t0 = time.monotonic()
+        _LOOP_LAG["beat"] = t0
+        await asyncio.sleep(interval)
+        lag_ms = max(0.0, (time.monotonic() - t0 - interval) * 1000.0)
+        _LOOP_LAG["samples"].append(lag_ms)
+        if lag_ms >= LOOP_LAG_THRESHOLD_MS:
+            _loop_lag_record_block(lag_ms)
+        else:
+            _LOOP_LAG["episode_stack"] = None
+
+        now = time.monotonic()
+        if now - _LOOP_LAG["last_report"] >= LOOP_LAG_STATS_INTERVAL_SEC:
+            _LOOP_LAG["last_report"] = now
+            st = loop_lag_stats()
+            print(f"🐢 [LOOP-LAG] p50={st['p50_ms']:.1f}ms p95={st['p95_ms']:.1f}ms p99={st['p99_ms']:.1f}ms "
+                  f"max={st['max_ms']:.0f}ms Blockaden={st['blocks']} Top={st['top_blockers'][:3]}")
+
+
+async def _admin_loop_lag(params):
+    return loop_lag_stats()
+
+
+_ADMIN_ROUTES[("GET", "/loop-lag")] = _admin_loop_lag
+
+
+# ==============================
+# SPEICHER-TRACKING (MEMTRACK_ENABLED)
+#   - tracemalloc-Snapshots alle MEMTRACK_INTERVAL_SEC, Vergleich mit dem vorherigen → Top-Wachstum
+#   - Größe der Langzeit-Strukturen pro Epic (Einträge + geschätzte Bytes)
+#   - kompaktes Log (memtrack.log), Heap-Dump bei MEMTRACK_DUMP_MB (tracemalloc.Snapshot.load(...))
+# ==============================
+_MEMTRACK = {"prev": None, "dumped": False, "last": None}
+
+
+def _deep_size(obj, sample: int = 50) -> int:
+    # Schätzung: Container + Stichprobe der Elemente hochgerechnet (exakt wäre bei 60k Ticks zu teuer)
+    size = sys.getsizeof(obj)
+    try:
+        n = len(obj)
+    except TypeError:
+        return size
+    if n == 0:
+        return size
+    if isinstance(obj, dict):
+        items = list(obj.values())[:sample]
+    elif isinstance(obj, (list, deque)):
+        items = [obj[i] for i in range(min(n, sample))]
+    else:
+        items = list(obj)[:sample]
+    per = 0
+    for it in items:
+        per += sys.getsizeof(it)
+        if isinstance(it, (tuple, list)):
+            per += sum(sys.getsizeof(x) for x in it)
+        elif isinstance(it, dict):
+            per += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in it.items())
+    return size + int(per / len(items) * n)
+
+
+def memory_structures() -> dict:
+    # Langzeit-Zustand des Bots: {Struktur: {epic|"*": (Einträge, Bytes)}}
+    out = {
+        "TICK_RING": {e: (len(dq), _deep_size(dq)) for e, dq in list(TICK_RING.items())},
+        "candle_history": {e: (len(dq), _deep_size(dq)) for e, dq in list(candle_history.items())},
+        "open_positions.keys": {e: (len(p), _deep_size(p)) for e, p in list(open_positions.items()) if isinstance(p, dict)},
+        "_last_close_ts": {"*": (len(_last_close_ts), _deep_size(_last_close_ts))},
+        "_last_ticklog_sec": {"*": (len(_last_ticklog_sec), _deep_size(_last_ticklog_sec))},
+        "_FEED.seen": {e: (len(v), _deep_size(v)) for e, v in list(_FEED["seen"].items())},
+        "_STALE": {"*": (len(_STALE), _deep_size(_STALE))},
+    }
+    try:
+        out["charts.data"] = {e: (len(dq), _deep_size(dq)) for e, dq in list(charts.data.items())}
+        artists = {}
+        for e, h in list(charts.lines.items()):
+            ax = h.get("ax")
+            if ax is not None:
+                n = len(ax.lines) + len(ax.texts) + len(ax.patches) + len(ax.collections)
+                artists[e] = (n, 0)
+        out["matplotlib.artists"] = artists
+    except Exception:
+        pass
+    return out
+
+
+def _memtrack_snapshot():
+    # Läuft im Thread (take_snapshot + compare können bei vielen Allokationen dauern)
+    snap = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    prev = _MEMTRACK["prev"]
+    growth = snap.compare_to(prev, "traceback")[:MEMTRACK_TOP] if prev is not None else []
+    _MEMTRACK["prev"] = snap
+    return snap, growth
+
+
+def _memtrack_write(lines) -> None:
+    if not IS_LIVE_BOT:
+        return
+    try:
+        with open(MEMTRACK_LOG, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    except Exception as e:
+        print(f"⚠️ memtrack.log nicht schreibbar: {e}")
+
+
+async def _memtrack_monitor():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(MEMTRACK_FRAMES)
+    print(f"🧠 Speicher-Tracking aktiv (tracemalloc, {MEMTRACK_FRAMES} Frames, alle {MEMTRACK_INTERVAL_SEC}s)")
+
+    while True:
+        await asyncio.sleep(MEMTRACK_INTERVAL_SEC)
+        snap, growth = await asyncio.to_thread(_memtrack_snapshot)
+        cur, peak = tracemalloc.get_traced_memory()
+        structs = memory_structures()
+
+        stamp = datetime.now(LOCAL_TZ).strftime("%d.%m.%Y %H:%M:%S")
+        lines = [f"=== {stamp} traced={cur / 2**20:.1f}MB peak={peak / 2**20:.1f}MB"]
+        for name, per_epic in structs.items():
+            if per_epic:
+                lines.append(f"  {name}: " + "  ".join(f"{e}={n}/{b / 1024:.0f}KB" for e, (n, b) in per_epic.items()))
+        for st in growth:
+            if st.size_diff <= 0:
+                continue
+            fr = st.traceback[-1]
+            lines.append(f"  +{st.size_diff / 1024:.0f}KB ({st.count_diff:+d}) {os.path.basename(fr.filename)}:{fr.lineno}")
+        _memtrack_write(lines)
+        _MEMTRACK["last"] = {"traced_mb": cur / 2**20, "peak_mb": peak / 2**20, "structures": structs,
+                             "top_growth": [(str(st.traceback[-1]), st.size_diff) for st in growth[:MEMTRACK_TOP]]}
+        print(f"🧠 [MEM] traced={cur / 2**20:.1f}MB peak={peak / 2**20:.1f}MB "
+              f"Top: {', '.join(f'{os.path.basename(st.traceback[-1].filename)}:{st.traceback[-1].lineno} +{st.size_diff / 1024:.0f}KB' for st in growth[:3] if st.size_diff > 0) or '-'}")
+
+        if MEMTRACK_DUMP_MB and not _MEMTRACK["dumped"] and cur / 2**20 >= MEMTRACK_DUMP_MB:
+            path = os.path.join(os.path.dirname(__file__), f"heap_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tracemalloc")
+            await asyncio.to_thread(snap.dump, path)
+            _MEMTRACK["dumped"] = True
+            print(f"🧠 [MEM] Schwelle {MEMTRACK_DUMP_MB}MB überschritten → Heap-Dump {path}")
+
+
+async def _admin_memory(params):
+    return _MEMTRACK["last"] or {"structures": memory_structures()}
+
+
+_ADMIN_ROUTES[("GET", "/memory")] = _admin_memory
+
+
+# ==============================
+# SHARDING: Worker-Modus (SHARD_COORDINATOR gesetzt)
+#   - der Coordinator teilt die Epics zu → INSTRUMENTS wird in-place ersetzt, Feed (un)subscribed live
+#   - Heartbeat meldet die eigenen Positionen, Antwort = globale Sicht (_SHARD["client"].global_positions)
+#   - vor jedem Open: globaler Risiko-Slot; im Loop als Task (Open erst nach der Zusage, der Loop wartet nie),
+#     ohne Coordinator / nach Timeout → kein Open
+# ==============================
+_SHARD = {
+    "client": None,
+    "acquiring": set(),   # Epics mit laufender Slot-Anfrage (kein zweites Open, solange sie läuft)
+    "all_epics": [],      # alle Epics über alle Worker (für den Parsing-Schutz im Sync)
+    "assigned": None,     # asyncio.Event – erste Zuteilung erhalten
+    "states": None,       # Candle-States des Aggregators (für neue Epics)
+    "loop": None,
+}
+
+
+def _shard_risk_acquire(epic: str) -> bool:
+    client = _SHARD["client"]
+    if client is None:
+        return True
+    if client.risk_acquire(epic, timeout=SHARD_RISK_TIMEOUT_SEC):
+        return True
+    print(f"🎟️ [{epic}] Kein globaler Risiko-Slot ({client.risk.get('open')}/{client.risk.get('limit')}) → kein Open")
+    return False
+
+
+def _open_with_risk_slot(CST, XSEC, epic, direction, price) -> None:
+    # Ohne Sharding sofort öffnen; mit Coordinator: Slot-Anfrage als Task, Open erst nach der Zusage
+    if _SHARD["client"] is None:
+        safe_open(CST, XSEC, epic, direction, calc_trade_size(CST, XSEC, epic), price)
+        return
+    loop = _running_loop()
+    if loop is None:
+        # außerhalb des Loops (Thread/Tests) darf kurz blockierend gewartet werden
+        if _shard_risk_acquire(epic):
+            if not safe_open(CST, XSEC, epic, direction, calc_trade_size(CST, XSEC, epic), price):
+                _shard_risk_release(epic)
+        return
+    if epic in _SHARD["acquiring"]:
+        print(f"🎟️ [{epic}] Risiko-Slot wird bereits angefragt → kein zweites Open")
+        return
+    _SHARD["acquiring"].add(epic)
+    task = loop.create_task(_shard_open(CST, XSEC, epic, direction, price))
+    task.add_done_callback(_log_task_error(f"shard open {epic}"))
+
+
+async def _shard_open(CST, XSEC, epic, direction, price) -> None:
+    client = _SHARD["client"]
+    try:
+        try:
+            granted = await asyncio.wait_for(asyncio.wrap_future(client.risk_request(epic)), SHARD_RISK_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            granted = False
+            client.risk_release(epic)   # evtl. verspätete Zusage nicht liegen lassen
+    finally:
+        _SHARD["acquiring"].discard(epic)
+    if not granted:
+        print(f"🎟️ [{epic}] Kein globaler Risiko-Slot ({client.risk.get('open')}/{client.risk.get('limit')}) → kein Open")
+        return
+    # Während der Anfrage kann sich der Zustand geändert haben (Halt, Open über anderen Pfad)
+    if _HALT["halted"] or open_positions.get(epic) is not None or epic not in INSTRUMENTS:
+        print(f"🎟️ [{epic}] Risiko-Slot erhalten, Open aber nicht mehr zulässig → Slot zurück")
+        _shard_risk_release(epic)
+        return
+    if not safe_open(CST, XSEC, epic, direction, calc_trade_size(CST, XSEC, epic), price):
+        _shard_risk_release(epic)
+
+
+def _shard_risk_release(epic: str) -> None:
+    if _SHARD["client"] is not None:
+        _SHARD["client"].risk_release(epic)
+
+
+def _shard_local_positions() -> dict:
+    # Läuft im Client-Thread → nur lesen, Snapshot
+    try:
+        items = list(open_positions.items())
+    except RuntimeError:
+        return {}
+    return {
+        epic: ({"direction": p.get("direction"), "dealId": p.get("dealId")}
+               if isinstance(p, dict) and p.get("direction") else None)
+        for epic, p in items if epic in INSTRUMENTS
+    }
+
+
+def _shard_on_assign(epics, all_epics) -> None:
+    # Client-Thread → Zuteilung im Event-Loop anwenden
+    _SHARD["loop"].call_soon_threadsafe(_shard_apply_assignment, list(epics), list(all_epics))
+
+
+def _shard_apply_assignment(epics, all_epics) -> None:
+    old, new = set(INSTRUMENTS), set(epics)
+    added, dropped = sorted(new - old), sorted(old - new)
+
+    for epic in added:
+        open_positions.setdefault(epic, None)
+        candle_history.setdefault(epic, deque(maxlen=200))
+        last_printed_sec.setdefault(epic, None)
+        _SHARD["states"].setdefault(epic, {"minute": None, "bar": None})
+    for epic in dropped:
+        if isinstance(open_positions.get(epic), dict):
+            print(f"⚠️ [SHARD] {epic} abgegeben, obwohl lokal noch eine Position offen ist")
+        _SHARD["states"][epic] = {"minute": None, "bar": None}
+        _INTRABAR.pop(epic, None)
+
+    INSTRUMENTS[:] = sorted(new)   # in-place: alle Module/Funktionen sehen dieselbe Liste
+    _SHARD["all_epics"] = all_epics
+    print(f"📦 [SHARD] {SHARD_WORKER_ID}: Epics={INSTRUMENTS} (+{added} −{dropped})")
+
+    if _FEED["conns"] and (added or dropped):
+        asyncio.create_task(_shard_resubscribe(added, dropped))
+    _SHARD["assigned"].set()
+
+
+async def _shard_resubscribe(added, dropped) -> None:
+    for conn_id, ws in list(_FEED["conns"].items()):
+        for dest, epics in (("marketData.unsubscribe", dropped), ("marketData.subscribe", added)):
+            if not epics:
+                continue
+            try:
+                await ws.send(json.dumps({
+                    "destination": dest,
+                    "correlationId": f"shard-{conn_id}",
+                    "cst": CST,
+                    "securityToken": XSEC,
+                    "payload": {"epics": epics},
+                }))
+            except Exception as e:
+                print(f"⚠️ [SHARD] {dest} auf Feed #{conn_id} fehlgeschlagen: {e}")
+
+
+async def _shard_start(states) -> None:
+    from shard_coordinator import ShardClient
+
+    _SHARD["states"] = states
+    _SHARD["loop"] = asyncio.get_running_loop()
+    _SHARD["assigned"] = asyncio.Event()
+    INSTRUMENTS[:] = []   # bis zur ersten Zuteilung nichts handeln
+    client = ShardClient(SHARD_COORDINATOR, SHARD_WORKER_ID, _shard_on_assign, _shard_local_positions)
+    _SHARD["client"] = client
+    client.start()
+    print(f"🧭 [SHARD] Worker {SHARD_WORKER_ID} wartet auf Zuteilung von {SHARD_COORDINATOR} ...")
+    await _SHARD["assigned"].wait()
+
+
+# ==============================
+# RECONNECT-ZUSTANDSMASCHINE
+# Zustände: INIT → LOGIN → CONNECTING → LIVE → DOWN → (Backoff) → CONNECTING ...
+#   - Tokens (CST/XSEC) werden nur bei echten Auth-Fehlern verworfen, sonst wiederverwendet
+#   - 1. Abbruch: sofort neu verbinden; erst wiederholte Fehlschläge → Backoff mit Jitter
+#   - Downtime (DOWN → LIVE) wird gemessen und ausgegeben
+# ==============================
+_RECONNECT = {
+    "state": "INIT",
+    "down_since": None,      # time.monotonic() beim Verbindungsverlust (Feed komplett weg)
+    "down_reason": None,
+    "reconnects": 0,
+    "downtimes": deque(maxlen=RECONNECT_STATS_LEN),  # Sekunden pro Ausfall
+}
+
+
+def _reconnect_backoff_delay(fail_streak: int) -> float:
+    # 0 → sofort; ab dem 2. Fehlversuch exponentiell (base * 2^(n-1)), gedeckelt, mit Jitter
+    if fail_streak <= 0:
+        return 0.0
+    delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_BASE * (2 ** (fail_streak - 1)))
+    return max(0.0, delay * (1.0 + random.uniform(-RECONNECT_JITTER, RECONNECT_JITTER)))
+
+
+def _is_auth_error(e) -> bool:
+    # Nur diese Fehler machen die Tokens ungültig – alles andere darf mit den alten Tokens reconnecten
+    msg = str(e).lower()
+    return (
+        "invalid.session.token" in msg
+        or "force_reconnect" in msg
+        or "http 401" in msg
+        or "http 403" in msg
+    )
+
+
+def _reconnect_mark_down(reason: str) -> None:
+    if _RECONNECT["down_since"] is None:
+        _RECONNECT["down_since"] = time.monotonic()
+        _RECONNECT["down_reason"] = reason
+    _RECONNECT["state"] = "DOWN"
+
+
+def _reconnect_mark_live() -> None:
+    _RECONNECT["state"] = "LIVE"
+    down_since = _RECONNECT["down_since"]
+    if down_since is None:
+        return  # erster Connect, keine Downtime
+
+    downtime = time.monotonic() - down_since
+    _RECONNECT["down_since"] = None
+    _RECONNECT["reconnects"] += 1
+    _RECONNECT["downtimes"].append(downtime)
+
+    stats = reconnect_stats()
+    print(
+        f"⏱️ Reconnect-Downtime {downtime:.2f}s (Grund: {_RECONNECT['down_reason']}) | "
+        f"#{stats['reconnects']} Ø={stats['avg_s']:.2f}s p95={stats['p95_s']:.2f}s max={stats['max_s']:.2f}s"
+    )
+
+
+def reconnect_stats() -> dict:
+    # Kennzahlen zu den letzten Downtimes (für Konsole / Notebooks)
+    vals = sorted(_RECONNECT["downtimes"])
+    if not vals:
+        return {"reconnects": _RECONNECT["reconnects"], "avg_s": 0.0, "p95_s": 0.0, "max_s": 0.0}
+    p95 = vals[min(len(vals) - 1, int(round(0.95 * (len(vals) - 1))))]
+    return {
+        "reconnects": _RECONNECT["reconnects"],
+        "avg_s": sum(vals) / len(vals),
+        "p95_s": p95,
+        "max_s": vals[-1],
+    }
+
+
+def _log_task_error(label: str):
+    # Done-Callback für Hintergrund-Tasks: Fehler sichtbar machen statt still verschlucken
+    def _cb(task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            print(f"⚠️ [{label}] Hintergrund-Task fehlgeschlagen: {exc}")
+    return _cb
+
+
 # ==============================
 # CANDLE-AGGREGATOR (Zelle C)
 # ==============================
@@ -1874,342 +3462,1143 @@ def local_minute_floor(ts_ms: int) -> datetime:
     dt_local = to_local_dt(ts_ms)
     return dt_local.replace(second=0, microsecond=0)
 
-async def run_candle_aggregator_per_instrument():
-    global CST, XSEC
+# ==============================
+# FEED-MERGE: redundante Quote-Verbindungen → ein Stream pro Epic
+# Jede Verbindung hat ihre eigene Reconnect-Schleife. Pro Quote gewinnt die
+# erste Kopie (First-Arrival), Duplikate werden über (epic, timestamp, bid, ofr)
+# erkannt und verworfen. Fällt eine Verbindung aus, läuft der Stream über die
+# anderen ohne Unterbrechung weiter (kein Warten auf RECV_TIMEOUT).
+# ==============================
+_FEED = {
+    "conns": {},            # conn_id -> offenes WebSocket
+    "live": set(),          # conn_ids mit aktiver Subscription
+    "seen": {},             # epic -> {(ts_ms, bid, ask): (conn_id, recv_ns)}
+    "seen_order": {},       # epic -> deque der Keys (FIFO-Verdrängung)
+    "stats": {},            # conn_id -> Zähler/Latenzen
+    "sync_task": None,      # laufender after_reconnect-Sync
+    "last_rest_ping": 0.0,  # REST-Keepalive nur einmal pro PING_INTERVAL, egal wie viele Verbindungen
+    "last_report": time.monotonic(),
+}
+_LOGIN_LOCK = None  # asyncio.Lock – Login nur einmal, auch wenn mehrere Verbindungen gleichzeitig neu starten
+
+
+def _feed_conn_stats(conn_id: int) -> dict:
+    st = _FEED["stats"].get(conn_id)
+    if st is None:
+        st = {
+            "quotes": 0,        # alle empfangenen Quotes dieser Verbindung
+            "first": 0,         # davon als erste Kopie angekommen (gewonnen)
+            "dups": 0,          # davon Duplikate (verloren)
+            "lag_sum_ms": 0.0,  # Rückstand auf die Gewinner-Verbindung (nur Duplikate)
+            "lag_max_ms": 0.0,
+            "age_sum_ms": 0.0,  # Empfangszeit − Quote-Timestamp
+            "connects": 0,
+        }
+        _FEED["stats"][conn_id] = st
+    return st
+
+
+def _feed_accept_quote(conn_id: int, epic: str, bid: float, ask: float, ts_ms: int) -> bool:
+    # True → erste Kopie dieser Quote, weiterverarbeiten; False → Duplikat, verwerfen
+    stats = _feed_conn_stats(conn_id)
+    stats["quotes"] += 1
+    stats["age_sum_ms"] += time.time() * 1000.0 - ts_ms
+
+    if FEED_CONNECTIONS <= 1:
+        stats["first"] += 1
+        return True
+
+    now_ns = time.perf_counter_ns()
+    key = (ts_ms, bid, ask)
+    seen = _FEED["seen"].setdefault(epic, {})
+    hit = seen.get(key)
+    if hit is not None:
+        lag_ms = (now_ns - hit[1]) / 1e6
+        stats["dups"] += 1
+        stats["lag_sum_ms"] += lag_ms
+        if lag_ms > stats["lag_max_ms"]:
+            stats["lag_max_ms"] = lag_ms
+        return False
 
-    invalid_token_streak = 0  # 🧩 Zähler für aufeinanderfolgende Tokenfehler
+    seen[key] = (conn_id, now_ns)
+    order = _FEED["seen_order"].setdefault(epic, deque())
+    order.append(key)
+    if len(order) > FEED_DEDUP_WINDOW:
+        seen.pop(order.popleft(), None)
 
-    while True:  # Endlosschleife mit Reconnect & Token-Refresh
-        if not CST or not XSEC:
+    stats["first"] += 1
+    return True
+
+
+def feed_stats() -> dict:
+    # Kennzahlen pro Verbindung (für Konsole / Notebooks)
+    out = {}
+    for conn_id, st in sorted(_FEED["stats"].items()):
+        q = st["quotes"] or 1
+        out[conn_id] = {
+            "live": conn_id in _FEED["live"],
+            "quotes": st["quotes"],
+            "win_pct": 100.0 * st["first"] / q,
+            "dups": st["dups"],
+            "avg_lag_ms": (st["lag_sum_ms"] / st["dups"]) if st["dups"] else 0.0,
+            "max_lag_ms": st["lag_max_ms"],
+            "avg_age_ms": st["age_sum_ms"] / q,
+            "connects": st["connects"],
+        }
+    return out
+
+
+def _feed_maybe_report() -> None:
+    now = time.monotonic()
+    if now - _FEED["last_report"] < FEED_STATS_INTERVAL_SEC:
+        return
+    _FEED["last_report"] = now
+    for conn_id, st in feed_stats().items():
+        print(
+            f"📶 [Feed #{conn_id}] live={st['live']} quotes={st['quotes']} first={st['win_pct']:.1f}% "
+            f"dups={st['dups']} lag Ø={st['avg_lag_ms']:.1f}ms max={st['max_lag_ms']:.1f}ms "
+            f"age Ø={st['avg_age_ms']:.0f}ms connects={st['connects']}"
+        )
+
+
+def _feed_conn_up(conn_id: int) -> None:
+    _feed_conn_stats(conn_id)["connects"] += 1
+    was_down = not _FEED["live"]
+    _FEED["live"].add(conn_id)
+    if not was_down:
+        print(f"🔀 [Feed #{conn_id}] live ({len(_FEED['live'])} Verbindung(en) aktiv)")
+        return
+
+    # Feed war komplett weg → Downtime messen + Positions-Sync parallel zu den Quotes
+    _reconnect_mark_live()
+    task = _FEED["sync_task"]
+    if task is None or task.done():
+        task = asyncio.create_task(_sync_after_reconnect(CST, XSEC))
+        task.add_done_callback(_log_task_error("SYNC after_reconnect"))
+        _FEED["sync_task"] = task
+
+
+async def _sync_after_reconnect(CST, XSEC) -> None:
+    # Nur der REST-Fetch läuft im Thread; der Abgleich (open_positions, safe_close) läuft danach im Loop –
+    # ohne await dazwischen, also atomar gegenüber Confirm-Tasks und Entscheidungen
+    before = {epic: _sync_local_key(epic) for epic in INSTRUMENTS}
+    try:
+        positions_data = await asyncio.to_thread(get_positions, CST, XSEC)
+    except Exception as e:
+        print(f"⚠️ [SYNC] get_positions fehlgeschlagen (after_reconnect): {e}")
+        return
+    sync_positions_with_broker(CST, XSEC, "after_reconnect", positions_data=positions_data, local_before=before)
+
+
+def _feed_conn_down(conn_id: int, reason: str) -> None:
+    _FEED["live"].discard(conn_id)
+    if _FEED["live"]:
+        print(f"🔀 [Feed #{conn_id}] weg ({reason}) → Failover, {len(_FEED['live'])} Verbindung(en) live")
+        return
+    _reconnect_mark_down(reason)
+
+
+# ==============================
+# STALE-FEED-WATCHDOG pro Epic
+# Misst die Inter-Arrival-Zeiten der Quotes je Epic (gleitendes Fenster, Median
+# inkrementell über sortierte Liste). Bleibt ein Epic statistisch auffällig lange
+# still (Lücke > STALE_GAP_MULT × Median, begrenzt durch MIN/MAX), wird es als
+# stale markiert → Resubscribe, Schutzaktion für offenen Trade, ggf. Reconnect.
+# ==============================
+_STALE = {}  # epic -> {"last_recv", "gaps", "sorted", "stale", "stale_since", "escalated", "events"}
+
+
+def _stale_entry(epic: str) -> dict:
+    w = _STALE.get(epic)
+    if w is None:
+        w = {
+            "last_recv": None,                         # time.monotonic() der letzten Quote
+            "gaps": deque(maxlen=STALE_GAP_WINDOW),    # Inter-Arrival-Zeiten (Sekunden), FIFO
+            "sorted": [],                              # dieselben Werte sortiert (für den Median)
+            "stale": False,
+            "stale_since": None,
+            "escalated": False,
+            "events": 0,
+        }
+        _STALE[epic] = w
+    return w
+
+
+def _stale_record_arrival(epic: str) -> None:
+    # Pro (deduplizierter) Quote aufrufen – O(log n) Suche + O(n) Insert bei n=STALE_GAP_WINDOW
+    now = time.monotonic()
+    w = _stale_entry(epic)
+    last = w["last_recv"]
+    w["last_recv"] = now
+
+    if w["stale"]:
+        # Erholung: die Lücke selbst nicht in die Statistik aufnehmen (Ausreißer)
+        print(f"💚 [WATCHDOG {epic}] Quotes wieder da nach {now - w['stale_since']:.1f}s")
+        w["stale"] = False
+        w["stale_since"] = None
+        w["escalated"] = False
+        return
+
+    if last is None:
+        return
+
+    gap = now - last
+    gaps = w["gaps"]
+    srt = w["sorted"]
+    if len(gaps) == gaps.maxlen:
+        old = gaps[0]
+        del srt[bisect.bisect_left(srt, old)]
+    gaps.append(gap)
+    bisect.insort(srt, gap)
+
+
+def _stale_threshold(w: dict) -> float:
+    srt = w["sorted"]
+    if len(srt) < STALE_MIN_SAMPLES:
+        return STALE_MAX_GAP_SEC  # zu wenig Daten → konservativ
+    median = srt[len(srt) // 2]
+    return min(STALE_MAX_GAP_SEC, max(STALE_MIN_GAP_SEC, STALE_GAP_MULT * median))
+
+
+def feed_watchdog_stats() -> dict:
+    # Median-Inter-Arrival, aktuelle Schwelle und Status pro Epic
+    now = time.monotonic()
+    out = {}
+    for epic, w in _STALE.items():
+        srt = w["sorted"]
+        out[epic] = {
+            "samples": len(srt),
+            "median_gap_s": srt[len(srt) // 2] if srt else None,
+            "threshold_s": _stale_threshold(w),
+            "silent_s": (now - w["last_recv"]) if w["last_recv"] is not None else None,
+            "stale": w["stale"],
+            "events": w["events"],
+        }
+    return out
+
+
+async def _resubscribe_epic(epic: str) -> None:
+    # Epic auf allen offenen Verbindungen ab- und wieder anmelden
+    for conn_id, ws in list(_FEED["conns"].items()):
+        for dest in ("marketData.unsubscribe", "marketData.subscribe"):
             try:
-                CST, XSEC = capital_login()
-                invalid_token_streak = 0  # Reset nach erfolgreichem Login
-            except requests.exceptions.RequestException as e:
-                print(f"❌ Login fehlgeschlagen: {e}\n⏳ {RECONNECT_DELAY}s warten und erneut versuchen …")
-                await asyncio.sleep(RECONNECT_DELAY)
-                continue  # zurück an den Schleifenanfang, ohne zu crashen
+                await ws.send(json.dumps({
+                    "destination": dest,
+                    "correlationId": f"watchdog-{epic}-{conn_id}",
+                    "cst": CST,
+                    "securityToken": XSEC,
+                    "payload": {"epics": [epic]},
+                }))
+            except Exception as e:
+                print(f"⚠️ [WATCHDOG {epic}] {dest} auf Feed #{conn_id} fehlgeschlagen: {e}")
+                break
 
-        ws_url = f"{BASE_STREAM}?CST={CST}&X-SECURITY-TOKEN={XSEC}"
-        subscribe = {
-            "destination": "marketData.subscribe",
-            "correlationId": "candles",
-            "cst": CST,
-            "securityToken": XSEC,
-            "payload": {"epics": INSTRUMENTS},
+
+def _stale_protect_open_trade(epic: str, silent_s: float) -> None:
+    pos = open_positions.get(epic)
+    if not (isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None):
+        return
+
+    if STALE_ACTION_OPEN_TRADE == "CLOSE":
+        print(f"🚨 [WATCHDOG {epic}] Offener Trade ohne Kursdaten seit {silent_s:.1f}s → Schutz-Close")
+        pos["last_close_reason"] = "STALE_FEED"
+        pos["last_close_trigger_price"] = pos.get("mark_price")
+        if pos.get("pending"):
+            # Confirm noch unterwegs (keine dealId) → Close direkt nach dem Confirm (wie _debounced_close)
+            if not pos.get("close_on_confirm"):
+                pos["close_on_confirm"] = "STALE_FEED"
+                print(f"⏳ [{epic}] Close vorgemerkt (STALE_FEED) – wartet auf Confirm")
+            return
+        _last_close_ts[epic] = time.monotonic()
+        safe_close(CST, XSEC, epic, deal_id=pos.get("dealId"), reason="STALE_FEED")
+    else:
+        print(f"🚨 [WATCHDOG {epic}] Offener Trade ohne Kursdaten seit {silent_s:.1f}s – Stops sind blind!")
+
+
+async def _stale_feed_watchdog():
+    while True:
+        await asyncio.sleep(STALE_CHECK_INTERVAL_SEC)
+        if not _FEED["live"]:
+            continue  # Feed komplett weg → das regelt die Reconnect-Zustandsmaschine
+
+        now = time.monotonic()
+        for epic in INSTRUMENTS:
+            w = _STALE.get(epic)
+            if w is None or w["last_recv"] is None:
+                continue
+
+            silent = now - w["last_recv"]
+            threshold = _stale_threshold(w)
+            if silent < threshold:
+                continue
+
+            if not w["stale"]:
+                w["stale"] = True
+                w["stale_since"] = w["last_recv"]
+                w["events"] += 1
+                srt = w["sorted"]
+                median = srt[len(srt) // 2] if srt else float("nan")
+                print(
+                    f"🧊 [WATCHDOG {epic}] keine Quotes seit {silent:.1f}s "
+                    f"(Schwelle {threshold:.1f}s, Median {median * 1000:.0f}ms) → Resubscribe"
+                )
+                await _resubscribe_epic(epic)
+                try:
+                    _stale_protect_open_trade(epic, silent)
+                except Exception as e:
+                    print(f"⚠️ [WATCHDOG {epic}] Schutzaktion fehlgeschlagen: {e}")
+
+            elif not w["escalated"] and (now - w["stale_since"]) >= STALE_RECONNECT_AFTER_SEC:
+                # Resubscribe hat nicht geholfen → alle Verbindungen neu aufbauen
+                w["escalated"] = True
+                print(f"🔁 [WATCHDOG {epic}] seit {now - w['stale_since']:.1f}s stale → Feed-Reconnect")
+                _close_feed_connections()
+
+
+# ==============================
+# FEED-LATENZ + UHRVERSATZ pro Epic
+#   - pro Quote: Alter = lokale Empfangszeit − Quote-Timestamp ins laufende Fenster (O(1))
+#   - pro Fenster (LATENCY_WINDOW_SEC): einmal sortieren → Min/p50/p95/p99
+#   - Versatz = Median der Fenster-Minima (≈ Uhrversatz + minimale Netzlatenz). Die echte
+#     Latenz ist Alter − Versatz; wandern die Minima über die Zeit, driftet die lokale Uhr
+#     (Steigung der Minima in ms/h) – Netzlatenz-Spitzen verschieben das Minimum kaum
+#   - Alarm bei Drift, großem Versatz oder p95-Verschlechterung gegenüber der eigenen Baseline
+#   - Stop/TP auf einer veralteten Quote → Close-Grund im Trade-Log bekommt "|STALE_QUOTE …ms";
+#     Alter dafür roh (LATENCY_CLOCK_SYNCED), sonst würde eine konstante Feed-Verzögerung im Versatz verschwinden
+# ==============================
+_LATENCY = {
+    "epics": {},                  # epic -> Fenster, Historie, Baseline, Alarmzustand
+    "alerts": deque(maxlen=200),  # (Zeit, epic, Art, Text)
+}
+
+
+def _latency_entry(epic: str) -> dict:
+    e = _LATENCY["epics"].get(epic)
+    if e is None:
+        e = {
+            "win_start": None,        # lokale Empfangszeit (ms) des Fensterbeginns
+            "win": deque(maxlen=LATENCY_WINDOW_MAX_SAMPLES),  # Alter in ms im laufenden Fenster
+            "windows": deque(maxlen=LATENCY_HISTORY),  # (Fensterende ms, n, min, p50, p95, p99) – rohe Alter
+            "offset_ms": None,        # Median der Fenster-Minima
+            "drift_ms_per_h": None,
+            "base_p95_ms": None,      # EWMA der p95-Latenz (ohne Versatz)
+            "degraded": False,
+            "offset_alert": False,
+            "drift_alert": False,
+            "stale_decisions": 0,
+            "last_ts": None,
+            "last_recv": None,
+        }
+        _LATENCY["epics"][epic] = e
+    return e
+
+
+def _latency_alert(epic: str, kind: str, text: str) -> None:
+    _LATENCY["alerts"].append((time.time(), epic, kind, text))
+    print(f"⏱️ [LATENZ {epic}] {text}")
+
+
+def _latency_record(epic: str, ts_ms: int, recv_ms: float) -> None:
+    # Pro (deduplizierter) Quote aufrufen
+    e = _latency_entry(epic)
+    e["last_ts"] = ts_ms
+    e["last_recv"] = recv_ms
+    if e["win_start"] is None:
+        e["win_start"] = recv_ms
+    elif recv_ms - e["win_start"] >= LATENCY_WINDOW_SEC * 1000.0:
+        _latency_close_window(epic, e, recv_ms)
+        e["win_start"] = recv_ms
+    e["win"].append(recv_ms - ts_ms)
+
+
+def _latency_close_window(epic: str, e: dict, end_ms: float) -> None:
+    vals = sorted(e["win"])
+    e["win"].clear()
+    if not vals:
+        return
+    n = len(vals)
+
+    def pct(q):
+        return vals[min(n - 1, int(round(q * (n - 1))))]
+
+    e["windows"].append((end_ms, n, vals[0], pct(0.50), pct(0.95), pct(0.99)))
+
+    mins = sorted(w[2] for w in e["windows"])
+    offset = mins[len(mins) // 2]
+    e["offset_ms"] = offset
+
+    # Drift: Steigung der Fenster-Minima über die Zeit (kleinste Quadrate)
+    if len(e["windows"]) >= LATENCY_DRIFT_MIN_WINDOWS:
+        xs = [w[0] / 3_600_000.0 for w in e["windows"]]
+        ys = [w[2] for w in e["windows"]]
+        mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+        var = sum((x - mx) ** 2 for x in xs)
+        if var > 0:
+            e["drift_ms_per_h"] = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+            drifting = abs(e["drift_ms_per_h"]) > LATENCY_DRIFT_ALERT_MS_PER_H
+            if drifting and not e["drift_alert"]:
+                _latency_alert(epic, "DRIFT", f"lokale Uhr driftet {e['drift_ms_per_h']:+.0f}ms/h gegenüber dem Feed")
+            elif not drifting and e["drift_alert"]:
+                _latency_alert(epic, "DRIFT_OK", "Uhrdrift wieder im Rahmen")
+            e["drift_alert"] = drifting
+
+    off_bad = abs(offset) > LATENCY_OFFSET_ALERT_MS
+    if off_bad and not e["offset_alert"]:
+        _latency_alert(epic, "OFFSET", f"Versatz Empfang↔Feed {offset:+.0f}ms (Uhr falsch gestellt?)")
+    elif not off_bad and e["offset_alert"]:
+        _latency_alert(epic, "OFFSET_OK", f"Versatz wieder im Rahmen ({offset:+.0f}ms)")
+    e["offset_alert"] = off_bad
+
+    # p95 ohne Versatz gegen die eigene Baseline
+    p95 = pct(0.95) - offset
+    base = e["base_p95_ms"]
+    if base is None:
+        e["base_p95_ms"] = p95
+        return
+    degraded = p95 > LATENCY_ALERT_MIN_MS and p95 > LATENCY_ALERT_MULT * max(base, 1.0)
+    if degraded and not e["degraded"]:
+        _latency_alert(epic, "DEGRADED", f"p95={p95:.0f}ms (Baseline {base:.0f}ms, n={n})")
+    elif not degraded and e["degraded"]:
+        _latency_alert(epic, "RECOVERED", f"p95={p95:.0f}ms wieder normal (Baseline {base:.0f}ms)")
+    e["degraded"] = degraded
+    if not degraded:
+        e["base_p95_ms"] = (1 - LATENCY_BASELINE_ALPHA) * base + LATENCY_BASELINE_ALPHA * p95
+
+
+def quote_age_ms(epic: str, ts_ms: int = None, raw: bool = None):
+    # Wie alt ist die Quote jetzt (None = unbekannt). raw=True (Default bei LATENCY_CLOCK_SYNCED): lokale Uhr
+    # minus Quote-Timestamp – ein Feed, der konstant 2 s hinterherläuft, ist 2 s alt. raw=False: bereinigt um
+    # den geschätzten Versatz (nur sinnvoll, wenn die lokale Uhr selbst falsch geht)
+    raw = LATENCY_CLOCK_SYNCED if raw is None else raw
+    e = _LATENCY["epics"].get(epic)
+    if ts_ms is None:
+        ts_ms = e["last_ts"] if e is not None else None
+    if ts_ms is None:
+        return None
+    offset = e["offset_ms"] if not raw and e is not None and e["offset_ms"] is not None else 0.0
+    return time.time() * 1000.0 - ts_ms - offset
+
+
+def _latency_flag_stale(epic: str, pos: dict) -> None:
+    # Vor dem Close einer Schutz-Regel: Entscheidung auf veralteter Quote → Grund im Trade-Log ergänzen
+    reason = pos.get("last_close_reason")
+    latest = _PIPE["latest"].get(epic)
+    if not reason or latest is None or "|STALE_QUOTE" in reason:
+        return
+    age = quote_age_ms(epic, latest[2])
+    if age is None or age <= LATENCY_STALE_QUOTE_MS:
+        return
+    pos["last_close_reason"] = f"{reason}|STALE_QUOTE {age:.0f}ms"
+    _latency_entry(epic)["stale_decisions"] += 1
+    print(f"⏱️ [LATENZ {epic}] {reason} auf {age:.0f}ms alter Quote entschieden")
+
+
+def latency_stats() -> dict:
+    # Pro Epic: letztes Fenster (roh und ohne Versatz), Versatz, Drift, Baseline, Alarmzustand
+    out = {}
+    for epic, e in _LATENCY["epics"].items():
+        last = e["windows"][-1] if e["windows"] else None
+        offset = e["offset_ms"] or 0.0
+        out[epic] = {
+            "windows": len(e["windows"]),
+            "offset_ms": e["offset_ms"],
+            "drift_ms_per_h": e["drift_ms_per_h"],
+            "min_age_ms": last[2] if last else None,
+            "p50_ms": (last[3] - offset) if last else None,
+            "p95_ms": (last[4] - offset) if last else None,
+            "p99_ms": (last[5] - offset) if last else None,
+            "base_p95_ms": e["base_p95_ms"],
+            "degraded": e["degraded"],
+            "current_age_ms": quote_age_ms(epic),
+            "stale_decisions": e["stale_decisions"],
         }
+    return {"epics": out, "alerts": [list(a) for a in list(_LATENCY["alerts"])[-20:]]}
+
+
+async def _latency_monitor():
+    while True:
+        await asyncio.sleep(LATENCY_STATS_INTERVAL_SEC)
+        for epic, st in latency_stats()["epics"].items():
+            if st["p95_ms"] is None:
+                continue
+            drift = f"{st['drift_ms_per_h']:+.0f}ms/h" if st["drift_ms_per_h"] is not None else "n/a"
+            print(
+                f"⏱️ [LATENZ {epic}] p50={st['p50_ms']:.0f}ms p95={st['p95_ms']:.0f}ms p99={st['p99_ms']:.0f}ms "
+                f"Versatz={st['offset_ms']:+.0f}ms Drift={drift} stale-Entscheidungen={st['stale_decisions']}"
+                + (" ⚠️ DEGRADED" if st["degraded"] else "")
+            )
 
-        states = {epic: {"minute": None, "bar": None} for epic in INSTRUMENTS}
 
-        print("🔌 Verbinde:", ws_url)
-        await asyncio.sleep(RECONNECT_DELAY)  # 🧭 kleiner Cooldown vor Neuverbindung, vermeidet Hektik bei Reconnects
+async def _admin_latency(params):
+    return latency_stats()
+
+
+_ADMIN_ROUTES[("GET", "/latency")] = _admin_latency
+
+
+# ==============================
+# TICK-PIPELINE mit Backpressure
+# Ingest (pro Quote, billig): PnL-Markierung, Tick-Log, TICK_RING, Candle-Aggregation
+#   (laufendes High/Low exakt pro Tick), frischeste Quote pro Epic merken.
+# Worker (so oft er hinterherkommt):
+#   1) Schutz-Regeln – immer zuerst und immer auf der frischesten Quote
+#   2) Candle-Closes (Signal + decide_and_trade) in Reihenfolge
+#   2b) Forming-Trend (evaluate_trend_signal auf der laufenden Candle) – jeder Zyklus, frischeste
+#      Quote, einmal pro neuem Candle-Stand. Zustand der Trend-Maschine hängt damit nicht an der Last;
+#      konflatierte Zwischen-Ticks sieht sie (wie die Schutz-Regeln) nicht einzeln
+#   3) Kosmetik (Forming-Candle-Anzeige, Chart, Regime-Log) – unter Last auf den
+#      letzten Stand konflatiert bzw. übersprungen (max. PIPELINE_COSMETIC_MAX_AGE_MS alt)
+# ==============================
+_PIPE = {
+    "latest": {},         # epic -> (bid, ask, ts_ms) – immer die frischeste Quote
+    "pending": {},        # epic -> Anzahl Quotes seit der letzten Verarbeitung
+    "closes": {},         # epic -> deque geschlossener Bars, die auf on_candle_close warten
+    "entries": {},        # epic -> (Trigger, bid, ask, ts_ms) – ausgelöste Intrabar-Entries
+    "last_cosmetic": {},  # epic -> time.monotonic() der letzten Anzeige
+    "trend": {},          # epic -> letzter Forming-Trend (für die Anzeige)
+    "trend_seen": {},     # epic -> (Minute, Ticks) der zuletzt ausgewerteten laufenden Candle
+    "wake": None,         # asyncio.Event – wird im laufenden Loop angelegt
+    "stats": {
+        "ingested": 0,          # Quotes im Ingest
+        "cycles": 0,            # Worker-Durchläufe
+        "conflated": 0,         # Quotes, die nie einzeln verarbeitet wurden (von neuerer überholt)
+        "out_of_order": 0,      # Quotes älter als die bereits übergebene (nur Archiv/Ring, nicht an den Worker)
+        "protection_runs": 0,
+        "cosmetic_runs": 0,
+        "cosmetic_skipped": 0,  # unter Last ausgelassene Anzeige-Updates
+        "closes": 0,
+    },
+    "last_report": time.monotonic(),
+}
+
+
+# ==============================
+# CANDLE-CLOSE (Tick- oder Timer-getrieben) + Close-Delay-Statistik
+# Close-Delay = Zeitpunkt on_candle_close − Minutengrenze (lokale Uhr)
+# ==============================
+_CANDLE_CLOSE = {
+    "delays": {"TIMER": deque(maxlen=CANDLE_CLOSE_STATS_LEN), "TICK": deque(maxlen=CANDLE_CLOSE_STATS_LEN)},
+    "late_ticks": 0,   # Ticks, die erst nach dem Timer-Close für ihre Minute ankamen (nur nicht mehr in der Candle)
+}
+
+
+def _close_bar(states, epic, trigger: str, ts_ms: int = None) -> None:
+    # Schließt die laufende Candle von epic und reiht sie für on_candle_close im Worker ein
+    st = states[epic]
+    bar = st["bar"]
+    if bar is None:
+        return
+
+    print(
+        f"\n✅ [{epic}] Closed 1m  {st['minute'].strftime('%d.%m.%Y %H:%M:%S %Z')}  "
+        f"O:{bar['open_ask']:.2f}/{bar['open_bid']:.2f}  "
+        f"H:{bar['high_ask']:.2f}/{bar['high_bid']:.2f}  "
+        f"L:{bar['low_ask']:.2f}/{bar['low_bid']:.2f}  "
+        f"C:{bar['close_ask']:.2f}/{bar['close_bid']:.2f}  "
+        f"tks:{bar['ticks']}  ({trigger})"
+    )
+
+    # Candle schließen
+    bar_to_close = bar.copy()          # ← Kopie, keine spätere Nebenwirkung
+    if ts_ms is not None:
+        bar_to_close.setdefault("timestamp", ts_ms)
+
+    if ts_ms is not None and 980 <= (ts_ms % 1000) <= 999:
+        print(f"[SK3 close] minute={st['minute'].strftime('%H:%M:%S')}  use_ts_ms={ts_ms}  bar_ts={bar_to_close.get('timestamp')}")
+
+    boundary_ms = int(st["minute"].timestamp() * 1000) + 60000
+    _PIPE["closes"].setdefault(epic, deque()).append((bar_to_close, boundary_ms))
+
+    # Nächste Candle startet mit dem nächsten Tick der Folgeminute
+    st["minute"] = local_minute_floor(boundary_ms)
+    st["bar"] = None
+
+
+def _record_close_delay(boundary_ms: int) -> None:
+    delay_ms = time.time() * 1000.0 - boundary_ms
+    _CANDLE_CLOSE["delays"][CANDLE_CLOSE_MODE].append(delay_ms)
+    s = candle_close_stats().get(CANDLE_CLOSE_MODE)
+    print(
+        f"⏱️ Close-Delay {delay_ms:.0f}ms ({CANDLE_CLOSE_MODE}) | "
+        f"p50={s['p50_ms']:.0f}ms p95={s['p95_ms']:.0f}ms max={s['max_ms']:.0f}ms n={s['n']} "
+        f"late_ticks={_CANDLE_CLOSE['late_ticks']}"
+    )
+
+
+def candle_close_stats() -> dict:
+    # Verteilung der Close-Delays je Modus (TICK = alt, TIMER = neu) – zum Vorher/Nachher-Vergleich
+    out = {}
+    for mode, dq in _CANDLE_CLOSE["delays"].items():
+        vals = sorted(dq)
+        if not vals:
+            continue
+        n = len(vals)
+        out[mode] = {
+            "n": n,
+            "p50_ms": vals[n // 2],
+            "p95_ms": vals[min(n - 1, int(round(0.95 * (n - 1))))],
+            "max_ms": vals[-1],
+        }
+    return out
+
+
+def _broker_clock_offset_ms() -> float:
+    # Gemessener Versatz lokale Uhr ↔ Broker-Timestamps (Latenz-Monitor), größter über alle Epics:
+    # die Minutengrenze der Bars liegt lokal erst bei Grenze + Versatz
+    offsets = [e["offset_ms"] for epic, e in _LATENCY["epics"].items()
+               if epic in INSTRUMENTS and e["offset_ms"] is not None]
+    return max(0.0, max(offsets)) if offsets else 0.0
+
+
+async def _candle_close_timer(states):
+    # Schließt jede Candle an der Minutengrenze der Broker-Zeit (+ Versatz + Grace für verspätete Ticks)
+    while True:
+        offset_ms = _broker_clock_offset_ms()
+        now_ms = time.time() * 1000.0
+        boundary_ms = (int(now_ms - offset_ms) // 60000 + 1) * 60000
+        await asyncio.sleep(max(0.0, (boundary_ms + offset_ms + CANDLE_CLOSE_GRACE_MS - now_ms) / 1000.0))
+
+        closed = False
+        for epic in INSTRUMENTS:
+            st = states.get(epic)
+            if not st or st["bar"] is None or st["minute"] is None:
+                continue
+            if int(st["minute"].timestamp() * 1000) + 60000 <= boundary_ms:
+                _close_bar(states, epic, trigger="timer")
+                closed = True
+        if closed:
+            _PIPE["wake"].set()
+
+
+_TICKLOG_BUF = {}  # filename -> [Zeilen] des aktuellen Empfangs-Batches
+
+
+def _flush_tick_log() -> None:
+    # Eine open/write pro Datei und Batch statt pro Tick
+    for filename, rows in _TICKLOG_BUF.items():
+        if not rows:
+            continue
         try:
-            async with websockets.connect(ws_url, ping_interval=None) as ws:
-                await ws.send(json.dumps(subscribe))
-                print("✅ Subscribed:", INSTRUMENTS)
+            with open(filename, "a", encoding="utf-8", newline="") as f:
+                f.write("".join(rows))
+        except Exception as e:
+            print(f"⚠️ Tick-Log-Fehler {filename}: {e}")
+        rows.clear()
 
-                # 🧭 Nach Reconnect: offene Positionen mit Server abgleichen
-                try:
-                    print(f"🧩 [DEBUG REST-Check] Tokens → CST: {bool(CST)}, XSEC: {bool(XSEC)}")
 
+def _ingest_quote(states, epic, bid, ask, ts_ms):
+    # --- Live-PnL nur im Tickpfad berechnen ---
+    pos = open_positions.get(epic)
+    if isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None:
+        entry = float(pos["entry_price"])
+        qty   = float(pos.get("size") or MANUAL_TRADE_SIZE)
 
-                    # 🕒 Kurze Pause nach Login, damit Capital-Server neue Tokens intern synchronisiert
-                    await asyncio.sleep(RECONNECT_DELAY)
+        if pos["direction"] == "BUY":
+            mark = bid              # LONG → Bewertung am Bid
+            pnl  = (mark - entry) * qty
+        else:  # SELL
+            mark = ask              # SHORT → Bewertung am Ask
+            pnl  = (entry - mark) * qty
 
-                    print(f"🧩 [DEBUG REST-Check] Tokens → CST: {bool(CST)}, XSEC: {bool(XSEC)}")
+        # In-place aktualisieren: Chart liest nur noch diese Felder
+        pos["mark_price"]     = mark
+        pos["unrealized_pnl"] = pnl
+        pos["last_tick_ms"]   = ts_ms
 
-                    # 🕒 Kurze Pause nach Login, damit Capital-Server neue Tokens intern synchronisiert
-                    await asyncio.sleep(RECONNECT_DELAY)
+    # ticks in datei schreiben (Bot-Ordner wie bot_log.csv – dort liest tick_archive, unabhängig vom CWD)
+    filename = os.path.join(BASE_DIR, f"ticks_{epic}.csv")
+    try:
+        # Position offen? -> volle Tickauflösung beibehalten
+        in_trade = isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None
 
-                    # 🧩 Positions-Sync nach Login / Reconnect
-                    try:
-                        sync_positions_with_broker(CST, XSEC, context="after_reconnect")
-                    except Exception as e:
-                        print(f"⚠️ [SYNC] Fehler im after_reconnect-Sync: {e}")
+        # Optional: letzter 1s jeder Minute auch voll loggen (für Candle-Close-Fidelity)
+        full_log = in_trade or ((ts_ms % 60000) >= 59000)
+
+        full_log = True  # TEMP: alle Ticks loggen
+
+        do_write = False
+        if full_log:
+            do_write = True
+        else:
+            sec = ts_ms // 1000
+            last_sec = _last_ticklog_sec.get(epic)
+            if last_sec != sec:
+                _last_ticklog_sec[epic] = sec
+                do_write = True
+
+        if do_write:
+            # gesammelt, geschrieben wird einmal pro Empfangs-Batch (_flush_tick_log)
+            _TICKLOG_BUF.setdefault(filename, []).append(f"{ts_ms};{bid};{ask}\n")
 
+    except Exception as e:
+        print(f"⚠️ Tick-Log-Fehler {epic}: {e}")
+    # datei ende
+
+    # Ringpuffer füttern (Mid) – im Ingest, damit die Regime-Range jeden Tick sieht
+    mid_price = (bid + ask) / 2.0
+    dq = TICK_RING.setdefault(epic, deque(maxlen=TICK_RING_MAXLEN))
+    dq.append((int(ts_ms), float(mid_price)))
+
+    minute_key = local_minute_floor(ts_ms)
+    st = states[epic]
+
+    # 🕒 Candle-Handling mit echten Marktseiten (Bid/Ask)
+    late = st["minute"] is not None and minute_key < st["minute"]
+    if late:
+        # Verspäteter Tick einer bereits (per Timer) geschlossenen Minute → nicht mehr in die Candle,
+        # Schutz-Regeln und Intrabar-Trigger sehen ihn aber trotzdem (unten)
+        _CANDLE_CLOSE["late_ticks"] += 1
+    else:
+        _ingest_bar(states, epic, bid, ask, ts_ms, minute_key)
+
+    _PIPE["stats"]["ingested"] += 1
+    latest = _PIPE["latest"].get(epic)
+    if latest is not None and ts_ms < latest[2]:
+        # Älter als die schon übergebene Quote (Out-of-Order vom Zweit-Feed) → darf die frischere nicht
+        # ersetzen; Schutz, Intrabar und Forming-Trend laufen weiter auf der neueren Quote
+        _PIPE["stats"]["out_of_order"] += 1
+        return
 
+    # Intrabar-Entry: O(1)-Vergleich gegen den vorab berechneten Confirm-Preis
+    trig = _INTRABAR.get(epic)
+    if trig is not None:
+        mid = (bid + ask) / 2.0
+        if (mid >= trig["price"]) if trig["dir"] == "LONG" else (mid <= trig["price"]):
+            del _INTRABAR[epic]
+            _PIPE["entries"][epic] = (trig, bid, ask, ts_ms)
+
+    # Übergabe an den Worker: nur die frischeste Quote zählt (Wecken einmal pro Batch im Aufrufer)
+    _PIPE["latest"][epic] = (bid, ask, ts_ms)
+    _PIPE["pending"][epic] = _PIPE["pending"].get(epic, 0) + 1
+
+
+def _ingest_bar(states, epic, bid, ask, ts_ms, minute_key):
+    # Laufende 1m-Candle fortschreiben (Close per Tick, falls der Timer noch nicht dran war)
+    st = states[epic]
+    if st["minute"] is not None and minute_key > st["minute"] and st["bar"] is not None:
+        if CANDLE_CLOSE_MODE == "TIMER":
+            # Erster Tick der neuen Minute war schneller als der Timer → sofort schließen,
+            # Close = letzter Tick der alten Minute
+            _close_bar(states, epic, trigger="tick")
+        else:
+            # Alt: Close-Werte = erster Tick der neuen Minute
+            st["bar"]["close_bid"] = bid
+            st["bar"]["close_ask"] = ask
+            _close_bar(states, epic, trigger="tick", ts_ms=ts_ms)
+
+    if st["bar"] is None:
+        # Neue Candle starten (erste Quote überhaupt bzw. erste nach einem Close)
+        st["minute"] = minute_key
+        st["bar"] = {
+            "open_bid": bid, "open_ask": ask,
+            "high_bid": bid, "low_bid": bid,
+            "high_ask": ask, "low_ask": ask,
+            "close_bid": bid, "close_ask": ask,
+            "ticks": 1,
+            "timestamp": ts_ms
+        }
+    else:
+        # Laufende Candle aktualisieren
+        b = st["bar"]
+        b["high_bid"] = max(b["high_bid"], bid)
+        b["low_bid"] = min(b["low_bid"], bid)
+        b["close_bid"] = bid
+        b["high_ask"] = max(b["high_ask"], ask)
+        b["low_ask"] = min(b["low_ask"], ask)
+        b["close_ask"] = ask
+        b["ticks"] += 1
+        b["timestamp"] = ts_ms
+
+
+def pipeline_stats() -> dict:
+    return dict(_PIPE["stats"])
+
+
+def _pipeline_maybe_report() -> None:
+    now = time.monotonic()
+    if now - _PIPE["last_report"] < PIPELINE_STATS_INTERVAL_SEC:
+        return
+    _PIPE["last_report"] = now
+    st = _PIPE["stats"]
+    print(
+        f"🚰 [PIPELINE] ingested={st['ingested']} cycles={st['cycles']} conflated={st['conflated']} "
+        f"out_of_order={st['out_of_order']} "
+        f"protection={st['protection_runs']} closes={st['closes']} "
+        f"cosmetic={st['cosmetic_runs']} skipped={st['cosmetic_skipped']}"
+    )
+
+
+def _close_feed_connections() -> None:
+    # Alle Feed-Verbindungen schließen → deren Reconnect-Schleifen bauen neu auf
+    for ws in list(_FEED["conns"].values()):
+        asyncio.create_task(ws.close())
+
+
+async def _tick_pipeline_worker(states):
+    global CST, XSEC
+
+    wake = _PIPE["wake"]
+    stats = _PIPE["stats"]
+
+    while True:
+        # Reader liefern ganze Batches (alles, was im Socket lag) → hier ist bereits konflatiert
+        await wake.wait()
+        wake.clear()
+
+        batch = {epic: n for epic, n in _PIPE["pending"].items() if n}
+        _PIPE["pending"].clear()
+        stats["cycles"] += 1
+
+        # === 1️⃣ Schutz-Regeln zuerst – immer auf der frischesten Quote
+        for epic, n in batch.items():
+            if n > 1:
+                stats["conflated"] += n - 1
+
+            bid, ask, ts_ms = _PIPE["latest"][epic]
+            # Spread immer live berechnen
+            spread = ask - bid
+            if spread <= 0:
+                continue
+            try:
+                # Regime-Log ist Kosmetik → unter Last (Rückstand) nur Zustand rechnen, nicht drucken
+                check_protection_rules(epic, bid, ask, spread, CST, XSEC, log_regime=(n == 1))
+                stats["protection_runs"] += 1
+            except Exception as e:
+                print(f"⚠️ [{epic}] Fehler in check_protection_rules: {e}")
+
+        # === 1️⃣b Intrabar-Entries (vor den Closes → State ist dann schon zurückgesetzt)
+        while _PIPE["entries"]:
+            epic, (trig, bid, ask, ts_ms) = _PIPE["entries"].popitem()
+            try:
+                _intrabar_fire(epic, trig, bid, ask, ts_ms)
+            except Exception as e:
+                print(f"⚠️ [{epic}] Fehler im Intrabar-Entry: {e}")
+                if _is_auth_error(e):
+                    CST, XSEC = None, None
+                    _close_feed_connections()
+
+        # === 2️⃣ Geschlossene Candles: Signal + Trade-Entscheidung
+        for epic, q in _PIPE["closes"].items():
+            while q:
+                bar_to_close, boundary_ms = q.popleft()
+                try:
+                    _record_close_delay(boundary_ms)
+                    on_candle_close(epic, bar_to_close)
+                    stats["closes"] += 1
                 except Exception as e:
-                    msg = str(e).lower()
-
-                    # 🧩 Tokenfehler: Session ist ungültig
-                    if "invalid.session.token" in msg or "error.invalid.session.token" in msg:
-                        invalid_token_streak += 1
-                        print(f"⚠️ Ungültiges Token (Versuch {invalid_token_streak}) → warte 5 Sekunden ...")
-
-                        # 🧠 Wenn zu viele Fehlversuche, Tokens hart zurücksetzen
-                        if invalid_token_streak >= 5:
-                            print("🚨 Zu viele Tokenfehler hintereinander → Session vollständig neu aufbauen.")
-                            CST = None
-                            XSEC = None
-                            invalid_token_streak = 0
-                            await asyncio.sleep(RECONNECT_DELAY)
-                        else:
-                            await asyncio.sleep(RECONNECT_DELAY)
-                        continue
+                    print(f"⚠️ [{epic}] Fehler in on_candle_close: {e}")
+                    if _is_auth_error(e):
+                        # Session ungültig → neu einloggen und Feed neu aufbauen
+                        CST, XSEC = None, None
+                        _close_feed_connections()
+
+        # === 2️⃣b Forming-Trend – immer, nicht Teil der Kosmetik (Zustandsmaschine!)
+        for epic in batch:
+            st = states[epic]
+            bar = st["bar"]
+            if bar is None:
+                continue
+            key = (st["minute"], bar["ticks"])
+            if _PIPE["trend_seen"].get(epic) == key:
+                continue   # nur verspätete Ticks → Candle unverändert
+            _PIPE["trend_seen"][epic] = key
+            try:
+                _PIPE["trend"][epic] = forming_trend(epic, bar)
+            except Exception as e:
+                print(f"⚠️ [{epic}] Fehler im Forming-Trend: {e}")
 
-                    # 🧩 Allgemeiner Fehler
-                    else:
-                        print(f"⚠️ Positionsabgleich nach Reconnect fehlgeschlagen: {e}")
-                        invalid_token_streak = 0
-                        await asyncio.sleep(RECONNECT_DELAY)
+        # === 3️⃣ Kosmetik – konflatiert auf den letzten Stand, unter Last ausgedünnt
+        now = time.monotonic()
+        for epic, n in batch.items():
+            last = _PIPE["last_cosmetic"].get(epic, 0.0)
+            if n > 1 and (now - last) * 1000.0 < PIPELINE_COSMETIC_MAX_AGE_MS:
+                stats["cosmetic_skipped"] += 1
+                continue
+            _PIPE["last_cosmetic"][epic] = now
+            stats["cosmetic_runs"] += 1
+
+            bid, ask, ts_ms = _PIPE["latest"][epic]
+            bar = states[epic]["bar"]
+            if bar is None:
+                continue
+            try:
+                # Hook: 🧩 Live-Chart-Update auf Tick-Ebene
+                charts.update(
+                    epic,
+                    ts_ms,
+                    {
+                        "bid": bid,
+                        "ask": ask,
+                        "open_bid": bar["open_bid"],
+                        "open_ask": bar["open_ask"],
+                        "high_bid": bar["high_bid"],
+                        "high_ask": bar["high_ask"],
+                        "low_bid": bar["low_bid"],
+                        "low_ask": bar["low_ask"],
+                        "close_bid": bid,
+                        "close_ask": ask,
+                        "ticks": bar["ticks"],
+                    },
+                    open_positions.get(epic, {})
+                )
 
-                last_ping = time.time()
+                # Während der Minute Chartdaten aktualisieren (Trend kommt aus 2️⃣b)
+                on_candle_forming(epic, bar, ts_ms, trend=_PIPE["trend"].get(epic, "-"))
+            except Exception as e:
+                print(f"⚠️ [{epic}] Fehler in der Anzeige (Forming/Chart): {e}")
 
-                while True:
-                    now = time.time()
-
-                    # --- alle PING_INTERVAL Sekunden ein Ping ---
-                    if now - last_ping > PING_INTERVAL:
-                        try:
-                            await ws.ping()
-                            # print("📡 Ping gesendet")
-                            last_ping = now
-
-                            # 💓 REST-Session aktiv halten (Ping)
-                            try:
-                                requests.get(
-                                    f"{BASE_REST}/api/v1/ping",
-                                    headers={"CST": CST, "X-SECURITY-TOKEN": XSEC},
-                                    timeout=5
-                                )
-                            except Exception as e:
-                                print(f"⚠️ REST-Ping fehlgeschlagen: {e}")
-
-                        except Exception as e:
-                            print("⚠️ Ping fehlgeschlagen:", e)
-                            break
+        _pipeline_maybe_report()
 
-                    try:
-                        raw = await asyncio.wait_for(ws.recv(), timeout=RECV_TIMEOUT)
-                        msg = json.loads(raw)
-                    except asyncio.TimeoutError:
-                        print("⚠️ Timeout → reconnect ...")
-                        break
-                    except Exception as e:
-                        print("⚠️ Fehler beim Empfangen:", e)
-                        if "invalid.session.token" in str(e).lower() or "force_reconnect" in str(e).lower():
-                            CST, XSEC = None, None
-
-                        # 🔧 Falls Verbindung unerwartet endet → Socket explizit schließen
-                        try:
-                            if "ws" in locals() and ws.open:
-                                await ws.close()
-                                print("🔌 WebSocket sauber geschlossen (nach Fehler)")
-                        except Exception:
-                            pass
-
-                        break
-
-
-                    # # 🧩 Debug: Zeige jede empfangene WebSocket-Nachricht (Rohdaten)
-                    # if "payload" in msg:
-                    #     try:
-                    #         epic = msg["payload"].get("epic", "N/A")
-                    #         print(f"\n📡 RAW MESSAGE [{epic}] → destination={msg.get('destination')}")
-                    #         print(json.dumps(msg["payload"], indent=2))
-                    #     except Exception as e:
-                    #         print("⚠️ Debug-Dump fehlgeschlagen:", e)
-                    
-                    if msg.get("destination") != "quote":
-                        continue
 
-                    p = msg.get("payload", {})
-                    epic = p.get("epic")
-                    if not epic or epic not in states:
-                        continue
+# ==============================
+# Empfangs-Helfer: gepufferte Frames zählen, Batch dekodieren
+# ==============================
+def _ws_buffered(ws) -> int:
+    # Anzahl bereits empfangener, noch nicht abgeholter Frames (websockets asyncio-Impl. bzw. legacy)
+    try:
+        assembler = getattr(ws, "recv_messages", None)
+        if assembler is not None:
+            return len(assembler.frames)
+        messages = getattr(ws, "messages", None)
+        if messages is not None:
+            return len(messages)
+    except Exception:
+        pass
+    return 0
 
-                    # --- Parse Tick-Felder robust ---
-                    try:
-                        bid   = float(p["bid"])
-                        ask   = float(p["ofr"])
-                        ts_ms = int(p["timestamp"])
-                        # if 980 <= (ts_ms % 1000) <= 999: # aktuelle tick zeit in local ausgebe
-                        #     print(f"[SK1 tick] ts_ms={ts_ms}  local={to_local_dt(ts_ms).strftime('%H:%M:%S.%f')[:-3]}")
 
-                    except Exception:
-                        continue
+def _decode_quotes(raws) -> list:
+    # Rohnachrichten → [(epic, bid, ask, ts_ms)]; alles andere (Pings, Acks, Müll) fällt raus
+    quotes = []
+    for raw in raws:
+        try:
+            msg = json.loads(raw)
+        except Exception:
+            continue
 
-                    # --- Live-PnL nur im Tickpfad berechnen ---
-                    pos = open_positions.get(epic)
-                    if isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None:
-                        entry = float(pos["entry_price"])
-                        qty   = float(pos.get("size") or MANUAL_TRADE_SIZE)
-
-                        if pos["direction"] == "BUY":
-                            mark = bid              # LONG → Bewertung am Bid
-                            pnl  = (mark - entry) * qty
-                        else:  # SELL
-                            mark = ask              # SHORT → Bewertung am Ask
-                            pnl  = (entry - mark) * qty
-
-                        # In-place aktualisieren: Chart liest nur noch diese Felder
-                        pos["mark_price"]     = mark
-                        pos["unrealized_pnl"] = pnl
-                        pos["last_tick_ms"]   = ts_ms
-
-                    # ticks in datei schreiben
-                    filename = f"ticks_{epic}.csv"
-                    try:
-                        # Position offen? -> volle Tickauflösung beibehalten
-                        in_trade = isinstance(pos, dict) and pos.get("direction") and pos.get("entry_price") is not None
+        # # 🧩 Debug: Zeige jede empfangene WebSocket-Nachricht (Rohdaten)
+        # if "payload" in msg:
+        #     epic = msg["payload"].get("epic", "N/A")
+        #     print(f"\n📡 RAW MESSAGE [{epic}] → destination={msg.get('destination')}")
+        #     print(json.dumps(msg["payload"], indent=2))
 
-                        # Optional: letzter 1s jeder Minute auch voll loggen (für Candle-Close-Fidelity)
-                        full_log = in_trade or ((ts_ms % 60000) >= 59000)
+        if msg.get("destination") != "quote":
+            continue
 
-                        full_log = True  # TEMP: alle Ticks loggen
+        p = msg.get("payload", {})
+        epic = p.get("epic")
+        if not epic or epic not in INSTRUMENTS:
+            continue
 
-                        do_write = False
-                        if full_log:
-                            do_write = True
-                        else:
-                            sec = ts_ms // 1000
-                            last_sec = _last_ticklog_sec.get(epic)
-                            if last_sec != sec:
-                                _last_ticklog_sec[epic] = sec
-                                do_write = True
+        # --- Parse Tick-Felder robust ---
+        try:
+            quotes.append((epic, float(p["bid"]), float(p["ofr"]), int(p["timestamp"])))
+        except Exception:
+            continue
+    return quotes
 
-                        if do_write:
-                            with open(filename, "a", encoding="utf-8", newline="") as f:
-                                f.write(f"{ts_ms};{bid};{ask}\n")
 
-                    except Exception as e:
-                        print(f"⚠️ Tick-Log-Fehler {epic}: {e}")
-                    # datei ende
-
-                    mid_price = (bid + ask) / 2.0
-                    spread = ask - bid
-                    minute_key = local_minute_floor(ts_ms)
-                    st = states[epic]
-
-                    # Hook: 🧩 Live-Chart-Update auf Tick-Ebene
-                    if st.get("bar") is not None:
-                        #print(f"[DEBUG Chart-Hook] {epic} | bid={bid:.2f} ask={ask:.2f} ts={ts_ms}")
-                        charts.update(
-                            epic,
-                            ts_ms,
-                            {
-                                "bid": bid,
-                                "ask": ask,
-                                "open_bid": st["bar"]["open_bid"],
-                                "open_ask": st["bar"]["open_ask"],
-                                "high_bid": st["bar"]["high_bid"],
-                                "high_ask": st["bar"]["high_ask"],
-                                "low_bid": st["bar"]["low_bid"],
-                                "low_ask": st["bar"]["low_ask"],
-                                "close_bid": bid,
-                                "close_ask": ask,
-                                "ticks": st["bar"]["ticks"],
-                            },
-                            open_positions.get(epic, {})
-                        )
-
-                    # 🕒 Candle-Handling mit echten Marktseiten (Bid/Ask)
-                    if st["minute"] is not None and minute_key > st["minute"] and st["bar"] is not None:
-                        bar = st["bar"]
-
-                        # Letzte Werte der alten Minute übernehmen
-                        bar["close_bid"] = bid
-                        bar["close_ask"] = ask
-
-                        print(
-                            f"\n✅ [{epic}] Closed 1m  {st['minute'].strftime('%d.%m.%Y %H:%M:%S %Z')}  "
-                            f"O:{bar['open_ask']:.2f}/{bar['open_bid']:.2f}  "
-                            f"H:{bar['high_ask']:.2f}/{bar['high_bid']:.2f}  "
-                            f"L:{bar['low_ask']:.2f}/{bar['low_bid']:.2f}  "
-                            f"C:{bar['close_ask']:.2f}/{bar['close_bid']:.2f}  "
-                            f"tks:{bar['ticks']}"
-                        )
-
-                        # Candle schließen
-                        bar_to_close = st["bar"].copy()          # ← Kopie, keine spätere Nebenwirkung
-                        bar_to_close.setdefault("timestamp", ts_ms)
-
-                        if 980 <= (ts_ms % 1000) <= 999:
-                            print(f"[SK3 close] minute={st['minute'].strftime('%H:%M:%S')}  use_ts_ms={ts_ms}  bar_ts={bar_to_close.get('timestamp')}")
-
-                        on_candle_close(epic, bar_to_close)
-
-                        # Neue Minute starten
-                        st["minute"] = minute_key
-                        st["bar"] = {
-                            "open_bid": bid, "open_ask": ask,
-                            "high_bid": bid, "low_bid": bid,
-                            "high_ask": ask, "low_ask": ask,
-                            "close_bid": bid, "close_ask": ask,
-                            "ticks": 1,
-                            "timestamp": ts_ms
-                        }
+# --- Keep-Alive als eigener Task: WS-Ping + REST-Ping (REST im Thread, blockiert den Loop nicht)
+async def _feed_keepalive(conn_id: int, ws, conn_state: dict):
+    while True:
+        await asyncio.sleep(PING_INTERVAL)
+        try:
+            await ws.ping()
+            # print("📡 Ping gesendet")
+        except Exception as e:
+            print(f"⚠️ [Feed #{conn_id}] Ping fehlgeschlagen:", e)
+            conn_state["reason"] = f"ping: {e}"
+            await ws.close()
+            return
+
+        # 💓 REST-Session aktiv halten (Ping) – einmal für alle Verbindungen
+        now = time.time()
+        if now - _FEED["last_rest_ping"] > PING_INTERVAL:
+            _FEED["last_rest_ping"] = now
+            try:
+                await asyncio.to_thread(
+                    broker_request,
+                    "GET",
+                    f"{BASE_REST}/api/v1/ping",
+                    headers={"CST": CST, "X-SECURITY-TOKEN": XSEC},
+                    timeout=5,
+                )
+            except Exception as e:
+                print(f"⚠️ REST-Ping fehlgeschlagen: {e}")
 
-                    else:
-                        # Neue Candle starten, falls noch keine existiert
-                        if st["minute"] is None:
-                            st["minute"] = minute_key
-                            st["bar"] = {
-                                "open_bid": bid, "open_ask": ask,
-                                "high_bid": bid, "low_bid": bid,
-                                "high_ask": ask, "low_ask": ask,
-                                "close_bid": bid, "close_ask": ask,
-                                "ticks": 1,
-                                "timestamp": ts_ms
-                            }
-                        else:
-                            # Laufende Candle aktualisieren
-                            b = st["bar"]
-                            b["high_bid"] = max(b["high_bid"], bid)
-                            b["low_bid"] = min(b["low_bid"], bid)
-                            b["close_bid"] = bid
-                            b["high_ask"] = max(b["high_ask"], ask)
-                            b["low_ask"] = min(b["low_ask"], ask)
-                            b["close_ask"] = ask
-                            b["ticks"] += 1
-                            b["timestamp"] = ts_ms
-
-                        # Während der Minute Trend- und Chartdaten aktualisieren
-                        on_candle_forming(epic, st["bar"], ts_ms)
-
-                        # 🛡️ Schutz-Regeln prüfen (Stop-Loss, Trailing, BE, TP)
-                        try:
-                            # Echtzeitwerte verwenden (nie aus bar, sondern Live-Tick)
-                            if bid is None or ask is None:
-                                print(f"⚠️ [{epic}] Kein gültiger Bid/Ask empfangen – Überspringe Schutzprüfung.")
-                                continue
-
-                            # Spread immer live berechnen
-                            spread = (ask - bid) if (ask is not None and bid is not None) else None
-                            if spread is None or spread <= 0:
-                                continue
-
-                            # 🔍 Debug-Log (optional)
-                            # print(f"[DEBUG] check_protection_rules({epic}) → bid={bid:.2f}, ask={ask:.2f}, spread={spread:.5f}")
-
-                            check_protection_rules(epic, bid, ask, spread, CST, XSEC)
-
-                        except Exception as e:
-                            print(f"⚠️ [{epic}] Fehler in check_protection_rules: {e}")
+
+# --- Empfangs-Timeout als eigener Task (statt wait_for pro Nachricht)
+async def _feed_recv_timeout(conn_id: int, ws, conn_state: dict):
+    while True:
+        await asyncio.sleep(1.0)
+        if time.monotonic() - conn_state["last_recv"] > RECV_TIMEOUT:
+            print(f"⚠️ [Feed #{conn_id}] Timeout → reconnect ...")
+            conn_state["reason"] = "recv_timeout"
+            await ws.close()
+            return
+
+
+# ==============================
+# Eine Quote-Verbindung mit eigener Reconnect-Schleife
+# Empfang: pro Aufwachen alle gepufferten Frames am Stück abholen und als Batch
+# dekodiert übergeben; Keep-Alive und Timeout laufen als eigene Tasks.
+# ==============================
+async def _run_feed_connection(conn_id: int, on_quotes):
+    global CST, XSEC
+
+    fail_streak = 0  # Fehlversuche dieser Verbindung in Folge
+
+    while True:
+        delay = _reconnect_backoff_delay(fail_streak)
+        if delay > 0:
+            print(f"⏳ [Feed #{conn_id}] Reconnect-Versuch {fail_streak + 1} in {delay:.2f}s ...")
+            await asyncio.sleep(delay)
+
+        async with _LOGIN_LOCK:
+            if not CST or not XSEC:
+                _RECONNECT["state"] = "LOGIN"
+                try:
+                    CST, XSEC = capital_login()
+                except requests.exceptions.RequestException as e:
+                    print(f"❌ Login fehlgeschlagen: {e}")
+                    CST, XSEC = None, None
+        if not CST or not XSEC:
+            fail_streak += 1
+            continue  # zurück an den Schleifenanfang, ohne zu crashen
+
+        ws_url = f"{BASE_STREAM}?CST={CST}&X-SECURITY-TOKEN={XSEC}"
+        subscribe = {
+            "destination": "marketData.subscribe",
+            "correlationId": f"candles-{conn_id}",
+            "cst": CST,
+            "securityToken": XSEC,
+            "payload": {"epics": INSTRUMENTS},
+        }
+
+        if not _FEED["live"]:
+            _RECONNECT["state"] = "CONNECTING"
+        print(f"🔌 [Feed #{conn_id}] Verbinde:", ws_url)
+        conn_state = {"last_recv": time.monotonic(), "reason": None}
+        healthy = False  # erst wenn wieder Quotes fließen, gilt die Verbindung als gesund
+        helpers = []
+        try:
+            async with websockets.connect(ws_url, ping_interval=None, max_queue=FEED_MAX_QUEUE) as ws:
+                await ws.send(json.dumps(subscribe))
+                print(f"✅ [Feed #{conn_id}] Subscribed:", INSTRUMENTS)
+                _FEED["conns"][conn_id] = ws
+                _feed_conn_up(conn_id)
+
+                helpers = [
+                    asyncio.create_task(_feed_keepalive(conn_id, ws, conn_state)),
+                    asyncio.create_task(_feed_recv_timeout(conn_id, ws, conn_state)),
+                ]
+
+                while True:
+                    # 1 Nachricht abwarten, dann alles abholen, was schon im Puffer liegt
+                    raws = [await ws.recv()]
+                    while len(raws) < FEED_MAX_BATCH and _ws_buffered(ws):
+                        raws.append(await ws.recv())
+                    conn_state["last_recv"] = time.monotonic()
+
+                    quotes = _decode_quotes(raws)
+                    if not quotes:
+                        continue
+
+                    if not healthy:
+                        # erste gültige Quote nach (Re)Connect → Fehlerserie beenden
+                        healthy = True
+                        fail_streak = 0
+
+                    on_quotes(conn_id, quotes)
 
                 # 🧠 Sauberer Abbruch per STRG + C
         except KeyboardInterrupt:
             print("🛑 Abbruch durch Benutzer (CTRL+C)")
-            break
+            raise
+
+        except websockets.ConnectionClosed as e:
+            # Grund ggf. schon vom Keep-Alive/Timeout-Task gesetzt
+            if not conn_state["reason"]:
+                print(f"⚠️ [Feed #{conn_id}] Fehler beim Empfangen:", e)
+                conn_state["reason"] = f"recv: {e}"
+            if _is_auth_error(e):
+                CST, XSEC = None, None
 
         except Exception as e:
-            print("❌ Verbindungsfehler:", e)
+            print(f"❌ [Feed #{conn_id}] Verbindungsfehler:", e)
+            conn_state["reason"] = f"error: {e}"
 
-            # Falls Session ungültig → Tokens zurücksetzen
-            if "invalid.session.token" in str(e).lower() or "force_reconnect" in str(e).lower():
+            # Nur bei ungültiger Session Tokens verwerfen → sonst Reconnect mit den alten Tokens
+            if _is_auth_error(e):
+                print("🔑 Session ungültig → Tokens verworfen, nächster Versuch mit neuem Login")
                 CST, XSEC = None, None
 
-            # 🔧 WebSocket sauber schließen, damit kein Zombie-Task hängen bleibt
-            try:
-                if "ws" in locals() and ws:
-                    await ws.close()
-            except Exception:
-                pass
+        finally:
+            for t in helpers:
+                t.cancel()
+            _FEED["conns"].pop(conn_id, None)
 
-            # 🔁 Wartezeit vor Neuverbindung
-            CST, XSEC = None, None  # Token sicher invalidieren
-            print(f"⏳ {RECONNECT_DELAY}s warten, dann neuer Versuch mit neuem Login ...")
-            await asyncio.sleep(RECONNECT_DELAY)
-            continue
+        # 🔁 Verbindung weg → Failover bzw. Zustand DOWN; Backoff nur, wenn die Verbindung gar nicht erst gesund wurde
+        _feed_conn_down(conn_id, conn_state["reason"] or "closed")
+        if not healthy:
+            fail_streak += 1
+
+
+async def run_candle_aggregator_per_instrument():
+    global _LOGIN_LOCK
+    _LOGIN_LOCK = asyncio.Lock()
+    _PIPE["wake"] = asyncio.Event()
+
+    # Candle-State überlebt Reconnects → laufende Minute geht bei kurzem Abriss nicht verloren
+    states = {epic: {"minute": None, "bar": None} for epic in INSTRUMENTS}
+
+    # Worker-Modus: Epics kommen vom Shard-Coordinator
+    if SHARD_COORDINATOR:
+        await _shard_start(states)
+
+    # Optional: Quotes für lokale Konsumenten (Chart, Recorder, Shadow-Strategien) in den Tick-Bus
+    bus = None
+    if TICK_BUS_NAME:
+        from tick_bus import TickBusWriter
+        bus = TickBusWriter(TICK_BUS_NAME, epics=INSTRUMENTS)
+        print(f"📡 Tick-Bus aktiv: shared_memory '{TICK_BUS_NAME}' (Kapazität {bus.capacity} Quotes)")
+
+    def on_quotes(conn_id, quotes):
+        # Batch: Dedup → Watchdog → Ingest; Tick-Log und Worker-Wecken einmal pro Batch
+        recv_ms = time.time() * 1000.0
+        for epic, bid, ask, ts_ms in quotes:
+            if _feed_accept_quote(conn_id, epic, bid, ask, ts_ms):
+                if bus is not None:
+                    bus.publish(epic, bid, ask, ts_ms)
+                _stale_record_arrival(epic)
+                _latency_record(epic, ts_ms, recv_ms)
+                _ingest_quote(states, epic, bid, ask, ts_ms)
+        _flush_tick_log()
+        _PIPE["wake"].set()
+        _feed_maybe_report()
+
+    n_conns = max(1, int(FEED_CONNECTIONS))
+    if n_conns > 1:
+        print(f"🔀 Redundanter Feed: {n_conns} parallele Quote-Verbindungen, First-Arrival-Dedup aktiv")
+
+    tasks = [_run_feed_connection(i, on_quotes) for i in range(n_conns)]
+    tasks.append(_tick_pipeline_worker(states))
+    if CANDLE_CLOSE_MODE == "TIMER":
+        tasks.append(_candle_close_timer(states))
+    tasks.append(_stale_feed_watchdog())
+    tasks.append(_latency_monitor())
+    tasks.append(_metadata_refresher())
+    tasks.append(_loop_lag_monitor())
+    if MEMTRACK_ENABLED:
+        tasks.append(_memtrack_monitor())
+    if ADMIN_HTTP_PORT:
+        tasks.append(_admin_server())
+    _install_signal_handlers()
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if bus is not None:
+            bus.close()
 
 
 
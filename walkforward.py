@@ -0,0 +1,223 @@
+# walkforward.py – Walk-Forward-Validierung: auf Fenster N optimieren, auf dem Folgefenster testen
+#
+# Ein In-Sample-Optimum für EMA_FAST/EMA_SLOW/Pullback sagt wenig über die nächste Woche. Hier:
+#   Archiv → rollierende Folds  [Train: WF_TRAIN_DAYS][Test: WF_TEST_DAYS], Versatz WF_STEP_DAYS
+#   pro Fold: optimizer.optimize() nur auf dem Train-Fenster → bester Satz → batch_eval auf dem Test-Fenster
+#   (Indikatoren mit WF_WARMUP_MIN Minuten Vorlauf; Signale im Vorlauf öffnen nichts → jeder Fold startet
+#   flach, gezählt werden nur Trades mit Entry im Test-Fenster)
+#   Train-Bewertung: Exits enden am Train-Ende ("END" am letzten Tick) → kein Test-Tick im In-Sample;
+#   Test-Trades dürfen bis max_hold über das Test-Ende hinaus ausklingen, höchstens bis zum Test-Start des
+#   nächsten Folds (dort "END") – so ist beim Fold-Wechsel nie eine Position des Vorgängers offen.
+#   Überlappen sich Test-Fenster (--step < --test), endet der Entry-Bereich eines Folds am nächsten Test-Start.
+# Die Folds laufen parallel in eigenen Prozessen; jeder öffnet den Tick-Store per memmap read-only
+# (geteilte Seiten im Page-Cache, keine Kopie pro Prozess). Jeder Fold hat seine eigene Resume-Datei.
+# Ergebnis: zusammengesetzte Out-of-Sample-Equity (nur Test-Trades, zeitlich hintereinander) und die
+# Stabilität der gewählten Parameter über die Folds (Mittel, Streuung, Variationskoeffizient).
+#
+# Aufruf:
+#   python walkforward.py --epic GOLD                                → 14 Tage Train / 7 Tage Test
+#   python walkforward.py --epic GOLD --train 10 --test 3 -n 81 --workers 4 --out wf_gold.png
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import batch_eval
+import optimizer
+import tradingbot_2 as bot
+from tick_archive import load_ticks
+
+WF_TRAIN_DAYS = 14.0
+WF_TEST_DAYS = 7.0
+WF_STEP_DAYS = None                  # None → = WF_TEST_DAYS (Test-Fenster lückenlos hintereinander)
+WF_WARMUP_MIN = 200                  # Candles Vorlauf vor dem Test-Fenster (wie candle_history maxlen)
+WF_CANDIDATES = 81                   # Kandidaten pro Fold (optimizer Stufe 0)
+WF_STATE_DIR = "walkforward_{epic}"  # Resume-Dateien pro Fold
+
+_DAY_MS = 86_400_000
+
+
+# ==============================
+# Folds
+# ==============================
+def make_folds(t_first: int, t_last: int, train_days: float, test_days: float, step_days: float = None) -> list:
+    # [(train0, train1, test0, test1)] – Fenster halboffen, letztes Test-Fenster endet spätestens am Archiv-Ende
+    step = (step_days or test_days) * _DAY_MS
+    train, test = train_days * _DAY_MS, test_days * _DAY_MS
+    out = []
+    s = t_first
+    while s + train + test <= t_last + 1:
+        out.append((int(s), int(s + train), int(s + train), int(s + train + test)))
+        s += step
+    return out
+
+
+# ==============================
+# Ein Fold (läuft im Worker-Prozess)
+# ==============================
+def run_fold(k: int, epic: str, tick_dir: str, fold: tuple, n: int, eta: int, min_days: float,
+             seed: int, space: dict, max_hold_sec: float, state_path: str = None,
+             next_test0: int = None) -> dict:
+    # next_test0 → Test-Start des Folgefolds: Entries nur davor, offene Trades dort geschlossen ("END")
+    train0, train1, test0, test1 = fold
+    if next_test0 is not None:
+        test1 = min(test1, next_test0)
+    opt = optimizer.optimize(epic, tick_dir, train0, train1, n=n, eta=eta, min_days=min_days, workers=1,
+                             state_path=state_path, seed=seed + k, space=space, max_hold_sec=max_hold_sec,
+                             verbose=False, update=False)
+    ticks = load_ticks(epic, update=False, tick_dir=tick_dir)
+    sets = batch_eval.sets_from_rows([opt["best"]])
+    res = batch_eval.evaluate(ticks, sets, test0 - WF_WARMUP_MIN * 60_000, test1, max_hold_sec,
+                              exit_cap_ms=next_test0, entry_min_ms=test0)
+    tr = res["trades"]
+    taken = tr["taken"][0]
+    return {
+        "fold": k,
+        "window": fold,
+        "params": opt["best"],
+        "train": opt["metrics"],
+        "open_ms": tr["open_ms"][taken].astype(np.int64),
+        "exit_ms": tr["exit_ms"][taken],
+        "pnl": tr["pnl"][taken],
+    }
+
+
+def _run_fold_job(args: tuple) -> dict:
+    return run_fold(*args)
+
+
+# ==============================
+# Auswertung
+# ==============================
+def stitch(folds: list) -> dict:
+    # Out-of-Sample-Trades aller Folds in Zeitfolge → Equity. Eine Position pro Epic wie im Bot: ein Trade,
+    # der vor dem Exit des vorherigen öffnet, fällt weg (mit Cap aus run_fold nur bei Fremd-Eingaben)
+    open_ms = np.concatenate([f["open_ms"] for f in folds]) if folds else np.empty(0, dtype=np.int64)
+    pnl = np.concatenate([f["pnl"] for f in folds]) if folds else np.empty(0)
+    exit_ms = np.concatenate([f["exit_ms"] for f in folds]) if folds else np.empty(0)
+    order = np.argsort(open_ms, kind="stable")
+    keep = []
+    busy_until = -np.inf
+    for i in order.tolist():
+        if open_ms[i] < busy_until:
+            continue
+        busy_until = exit_ms[i]
+        keep.append(i)
+    keep = np.array(keep, dtype=np.int64)
+    eq = np.cumsum(pnl[keep])
+    peak = np.maximum.accumulate(np.concatenate(([0.0], eq)))
+    return {
+        "open_ms": open_ms[keep],
+        "exit_ms": exit_ms[keep],
+        "pnl": pnl[keep],
+        "equity": eq,
+        "max_dd": float(np.max(peak - np.concatenate(([0.0], eq)))) if len(eq) else 0.0,
+        "win_rate": float((pnl[keep] > 0).mean()) if len(keep) else 0.0,
+        "dropped": len(order) - len(keep),
+    }
+
+
+def param_stability(folds: list, keys: list = None) -> dict:
+    # {KEY: (Mittel, Std, CV)} über die Folds – CV = Std/|Mittel| (bei Bool: Anteil True, Std)
+    keys = keys or [k for k in bot._PARAM_KEYS if k in optimizer.SEARCH_SPACE]
+    out = {}
+    for k in keys:
+        v = np.array([float(f["params"][k]) for f in folds])
+        if not len(v):
+            continue
+        mean, std = float(v.mean()), float(v.std())
+        out[k] = (mean, std, std / abs(mean) if mean else float("nan"))
+    return out
+
+
+def plot_equity(st: dict, folds: list, path: str, title: str = "") -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from datetime import datetime
+
+    def _local(ms):
+        return datetime.fromtimestamp(ms / 1000, bot.LOCAL_TZ).replace(tzinfo=None)
+
+    fig, ax = plt.subplots(figsize=(11, 4.5))
+    ax.step([_local(ms) for ms in st["exit_ms"]], st["equity"], where="post", color="tab:blue", lw=1.2)
+    for f in folds:
+        ax.axvline(_local(f["window"][2]), color="grey", lw=0.6, ls=":")
+    ax.axhline(0, color="black", lw=0.6)
+    ax.set_ylabel("OOS-PnL")
+    ax.set_title(title)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(path, dpi=110)
+    plt.close(fig)
+
+
+def walk_forward(epic: str, tick_dir: str = None, train_days: float = WF_TRAIN_DAYS,
+                 test_days: float = WF_TEST_DAYS, step_days: float = WF_STEP_DAYS, n: int = WF_CANDIDATES,
+                 eta: int = optimizer.OPT_ETA, min_days: float = optimizer.OPT_MIN_DAYS, workers: int = None,
+                 seed: int = 0, space: dict = None, max_hold_sec: float = batch_eval.BATCH_EVAL_MAX_HOLD_SEC,
+                 state_dir: str = None) -> list:
+    # Alle Folds parallel (ein Prozess pro Fold); Store wird vorher einmal aktualisiert, danach nur gelesen
+    ticks = load_ticks(epic, tick_dir=tick_dir)
+    if not len(ticks["ts"]):
+        raise ValueError(f"[{epic}] keine Ticks im Archiv")
+    folds = make_folds(int(ticks["ts"][0]), int(ticks["ts"][-1]), train_days, test_days, step_days)
+    if not folds:
+        raise ValueError(f"[{epic}] Archiv zu kurz für {train_days:g}+{test_days:g} Tage")
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    space = space or optimizer.SEARCH_SPACE
+    jobs = [(k, epic, tick_dir, f, n, eta, min_days, seed, space, max_hold_sec,
+             os.path.join(state_dir, f"fold_{k:03d}.json") if state_dir else None,
+             folds[k + 1][2] if k + 1 < len(folds) else None) for k, f in enumerate(folds)]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            out = list(pool.map(_run_fold_job, jobs))
+    else:
+        out = [_run_fold_job(j) for j in jobs]
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Walk-Forward: pro Fold optimieren (Train) und testen (Test)")
+    ap.add_argument("--epic", required=True)
+    ap.add_argument("--dir", default=None, help="Ordner mit ticks_{epic}.csv (Default: Bot-Ordner)")
+    ap.add_argument("--train", type=float, default=WF_TRAIN_DAYS, help="Train-Fenster (Tage)")
+    ap.add_argument("--test", type=float, default=WF_TEST_DAYS, help="Test-Fenster (Tage)")
+    ap.add_argument("--step", type=float, default=WF_STEP_DAYS, help="Versatz (Tage, Default = --test)")
+    ap.add_argument("-n", type=int, default=WF_CANDIDATES, help="Kandidaten pro Fold")
+    ap.add_argument("--eta", type=int, default=optimizer.OPT_ETA)
+    ap.add_argument("--min-days", type=float, default=optimizer.OPT_MIN_DAYS)
+    ap.add_argument("--workers", type=int, default=None, help="parallele Folds (Default: alle Kerne)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--space", action="append", default=[], help="KEY=a:b (Bereich) oder KEY=v (fest)")
+    ap.add_argument("--max-hold", type=float, default=batch_eval.BATCH_EVAL_MAX_HOLD_SEC)
+    ap.add_argument("--out", default=None, help="PNG der OOS-Equity")
+    args = ap.parse_args()
+
+    t_start = time.perf_counter()
+    state_dir = os.path.join(args.dir or bot.BASE_DIR, WF_STATE_DIR.format(epic=args.epic))
+    folds = walk_forward(args.epic, args.dir, args.train, args.test, args.step, args.n, args.eta, args.min_days,
+                         args.workers, args.seed, optimizer.parse_space(args.space), args.max_hold, state_dir)
+
+    print(f"🔁 [{args.epic}] {len(folds)} Folds à {args.train:g}/{args.test:g} Tage ({time.perf_counter() - t_start:.1f}s)")
+    for f in folds:
+        p = f["params"]
+        oos = float(f["pnl"].sum())
+        print(f"  Fold {f['fold']:2d}: Train PnL={f['train']['pnl']:9.2f} | Test PnL={oos:9.2f} Trades={len(f['pnl']):4d} "
+              f"| {'HMA' if p['USE_HMA'] else 'EMA'} {p['EMA_FAST']}/{p['EMA_SLOW']} SL={p['STOP_LOSS_PCT']:.4f} "
+              f"TP={p['TAKE_PROFIT_PCT']:.4f}")
+    st = stitch(folds)
+    pnl = float(st["equity"][-1]) if len(st["equity"]) else 0.0
+    print(f"📈 OOS gesamt: PnL={pnl:.2f} Trades={len(st['pnl'])} Win={st['win_rate'] * 100:.1f}% MaxDD={st['max_dd']:.2f}"
+          + (f" ({st['dropped']} überlappende Trades verworfen)" if st["dropped"] else ""))
+    print("🧭 Parameter-Stabilität über die Folds (Mittel ± Std, CV):")
+    for k, (mean, std, cv) in param_stability(folds).items():
+        print(f"  {k:40s} {mean:10.5g} ± {std:<10.4g} CV={cv:.2f}")
+    if args.out:
+        plot_equity(st, folds, args.out, title=f"Walk-Forward {args.epic}: OOS-Equity ({len(folds)} Folds)")
+        print(f"🖼️ OOS-Equity → {args.out}")